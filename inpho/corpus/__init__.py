@@ -7,5 +7,7 @@ path = inpho.config.get('corpus', 'path')
 occur_path = inpho.config.get_data_path('occur', 'corpus')
 fuzzy_path = inpho.config.get_data_path('fuzzy', 'corpus')
 sql_path = inpho.config.get_data_path('sql', 'corpus')
+sentence_path = inpho.config.get_data_path('sentence', 'corpus')
+body_path = inpho.config.get_data_path('body', 'corpus')
 
     
@@ -0,0 +1,97 @@
+"""
+Module containing the per-article caches of the InPhO data mining process.
+
+Each cache stores one file per SEP article under a corpus data path, together
+with the key the cached value was derived from. A lookup with a different key,
+such as after the article has been revised, is treated as a miss. Writes go
+through a temporary file, so that concurrent worker processes never read a
+partially written entry.
+"""
+
+import cPickle as pickle
+import hashlib
+import os
+import os.path
+
+import inpho.corpus
+
+def file_key(filename):
+    """
+    Returns a key identifying the current version of a file, based on its
+    modification time and size.
+    """
+    stat = os.stat(filename)
+    return (stat.st_mtime, stat.st_size)
+
+class ArticleCache(object):
+    """
+    Base class for a cache of values derived from SEP articles, stored as one
+    pickle per sep_dir under path.
+    """
+    suffix = '.pickle'
+
+    def __init__(self, path):
+        self.path = path
+
+    def _filename(self, sep_dir):
+        return os.path.join(self.path, sep_dir + self.suffix)
+
+    def dump(self, key, value, f):
+        pickle.dump((key, value), f, pickle.HIGHEST_PROTOCOL)
+
+    def load(self, f):
+        return pickle.load(f)
+
+    def get(self, sep_dir, key):
+        """
+        Returns the cached value for the article, or None if the entry is
+        missing or was stored under a different key.
+        """
+        try:
+            with open(self._filename(sep_dir), 'rb') as f:
+                cached_key, value = self.load(f)
+        except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+
+        if cached_key != key:
+            return None
+
+        return value
+
+    def set(self, sep_dir, key, value):
+        """ Stores the value for the article under the given key. """
+        filename = self._filename(sep_dir)
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmp_filename, 'wb') as f:
+            self.dump(key, value, f)
+        os.rename(tmp_filename, filename)
+
+class BodyCache(ArticleCache):
+    """
+    Content-addressed cache of extracted article bodies, stored as plain text
+    under the corpus body data path. Entries are keyed by a hash of the
+    article's sep_dir, modification time and size.
+    """
+    suffix = '.txt'
+
+    # bump to invalidate every entry when the extraction changes
+    version = 1
+
+    def __init__(self, path=None):
+        if path is None:
+            path = inpho.corpus.body_path
+        super(BodyCache, self).__init__(path)
+
+    def key(self, sep_dir, filename):
+        """ Returns the cache key of the article at filename. """
+        mtime, size = file_key(filename)
+        key = '%s:%d:%r:%d' % (sep_dir, self.version, mtime, size)
+        return hashlib.sha1(key).hexdigest()
+
+    def dump(self, key, value, f):
+        f.write(key + '\n')
+        f.write(value.encode('utf-8'))
+
+    def load(self, f):
+        key = f.readline().strip()
+        return key, f.read().decode('utf-8')
@@ -0,0 +1,232 @@
+"""
+Module containing the sparse co-occurrence counts of the InPhO data mining
+process.
+
+Rather than counting term pairs in nested dictionaries, the apriori baskets
+are loaded into a sparse basket by term incidence matrix X, holding the number
+of times each term occurs in each basket. The co-occurrence count of every
+pair of terms is then the sparse product X^T X. Likewise, the sentence
+occurrences of each term per article form a sparse article by term matrix.
+"""
+
+from array import array
+from collections import defaultdict
+from itertools import repeat
+
+import numpy as np
+from scipy.sparse import coo_matrix, triu as sp_triu
+
+from inpho.corpus.occurrences import OccurrenceReader, is_binary
+
+class SparseCounts(object):
+    """
+    Sparse matrix of counts, with rows keyed by strings and columns by
+    integer term IDs.
+    """
+    def __init__(self, matrix, rows, cols):
+        self.matrix = matrix.tocsr()
+        self.rows = list(rows)
+        self.cols = np.asarray(cols)
+        self.row_index = dict((key, i) for i, key in enumerate(self.rows))
+
+    def get(self, row_keys, col_ids):
+        """
+        Returns an array of the counts of each (row key, column ID) pair.
+        Missing rows or columns are counted as 0.
+        """
+        rows = np.array([self.row_index.get(key, -1) for key in row_keys],
+                        dtype=np.int_)
+        col_ids = np.asarray(col_ids, dtype=self.cols.dtype)
+        cols = np.searchsorted(self.cols, col_ids)
+        cols[cols >= len(self.cols)] = 0
+
+        valid = rows >= 0
+        if len(self.cols):
+            valid &= self.cols[cols] == col_ids
+        else:
+            valid[:] = False
+
+        counts = np.zeros(len(rows), dtype=self.matrix.dtype)
+        if valid.any():
+            counts[valid] = np.asarray(
+                self.matrix[rows[valid], cols[valid]]).ravel()
+
+        return counts
+
+    def to_dict(self):
+        """
+        Returns the counts as a dictionary of dictionaries, keyed by row key
+        and term ID string.
+        """
+        counts = defaultdict(lambda: defaultdict(int))
+        matrix = self.matrix.tocoo()
+        cols = [str(col) for col in self.cols.tolist()]
+        for row, col, count in zip(matrix.row.tolist(), matrix.col.tolist(),
+                                   matrix.data.tolist()):
+            if count:
+                counts[self.rows[row]][cols[col]] += count
+
+        return counts
+
+def _incidence(rows, ids, n_rows):
+    """
+    Returns the sparse row by term matrix of the (row, term ID) pairs, and
+    the sorted term IDs of its columns.
+    """
+    terms, cols = np.unique(ids, return_inverse=True)
+    data = np.ones(len(cols), dtype=np.int64)
+    matrix = coo_matrix((data, (rows, cols)), shape=(n_rows, len(terms)))
+    return matrix.tocsr(), terms
+
+def _as_array(values):
+    if len(values):
+        return np.frombuffer(values, dtype=np.int_)
+    return np.zeros(0, dtype=np.int_)
+
+def _read_baskets(graph_filename):
+    """
+    Returns the row and term ID arrays of the (basket, term ID) pairs in an
+    apriori input file, and the number of baskets.
+    """
+    rows = array('l')
+    ids = array('l')
+    n_rows = 0
+    with open(graph_filename) as f:
+        for line in f:
+            basket = [int(id) for id in line.split()]
+            rows.extend(repeat(n_rows, len(basket)))
+            ids.extend(basket)
+            n_rows += 1
+
+    return _as_array(rows), _as_array(ids), n_rows
+
+def graph_counts(graph_filename):
+    """
+    Returns the :class:`SparseCounts` of the co-occurrences of every pair of
+    terms in the baskets of an apriori input file. A term occurring twice in
+    a basket counts twice, and the diagonal holds the basket counts of each
+    term weighted likewise.
+    """
+    baskets, terms = _incidence(*_read_baskets(graph_filename))
+    graph = baskets.T * baskets
+    return SparseCounts(graph, [str(term) for term in terms.tolist()], terms)
+
+def pair_rules(graph_filename):
+    """
+    Returns the association rules between pairs of terms in the baskets of an
+    apriori input file, as arrays of the antecedent and consequent term IDs,
+    the confidence and the J-measure of each rule.
+
+    The rules are those of the apriori miner run with itemsets of size 2 and
+    negligible support and confidence thresholds: baskets are sets of terms,
+    empty baskets are not counted, and a rule is kept if both terms occur
+    together in more than one basket. Both rules of each pair are returned,
+    in the order the apriori miner writes them.
+    """
+    baskets, terms = _incidence(*_read_baskets(graph_filename))
+    baskets.data[:] = 1
+    n_baskets = (np.diff(baskets.indptr) > 0).sum()
+
+    support = np.asarray(baskets.sum(axis=0), dtype=np.float64).ravel()
+    pairs = sp_triu(baskets.T * baskets, k=1).tocoo()
+    keep = pairs.data > 1
+    a, b, union = pairs.row[keep], pairs.col[keep], pairs.data[keep]
+
+    # apriori numbers the terms by ascending support, then by ID, and walks
+    # the pairs in that order, writing the rule of the lower term first
+    order = np.lexsort((terms, support))
+    rank = np.empty(len(order), dtype=np.int_)
+    rank[order] = np.arange(len(order))
+    lower = np.where(rank[a] < rank[b], a, b)
+    upper = np.where(rank[a] < rank[b], b, a)
+    pair_order = np.lexsort((rank[upper], rank[lower]))
+    lower, upper, union = lower[pair_order], upper[pair_order], union[pair_order]
+
+    ante = np.column_stack((lower, upper)).ravel()
+    cons = np.column_stack((upper, lower)).ravel()
+    union = np.repeat(union, 2)
+
+    confidence, jweight = rule_measures(union, support[ante], support[cons],
+                                        n_baskets)
+    return terms[ante], terms[cons], confidence, jweight
+
+def rule_measures(union, supp_a, supp_b, n_baskets):
+    """
+    Returns the arrays of the confidence and J-measure of the rules A -> B,
+    given the number of baskets holding both A and B, A, and B, and the
+    number of non-empty baskets, as computed by the apriori miner.
+    """
+    union = np.asarray(union, dtype=np.float64)
+    supp_a = np.asarray(supp_a, dtype=np.float64)
+    n_baskets = float(n_baskets)
+
+    confidence = union / supp_a
+    p_a = supp_a / n_baskets
+    p_b = np.asarray(supp_b, dtype=np.float64) / n_baskets
+
+    # J-measure of each rule, without its second term at confidence 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        jweight = confidence * np.log(confidence / p_b)
+        partial = confidence < 1
+        jweight[partial] += (1 - confidence[partial]) *\
+            np.log((1 - confidence[partial]) / (1 - p_b[partial]))
+    jweight *= p_a
+
+    return confidence, jweight
+
+def occurrence_counts(occur_filename, doc_terms=None):
+    """
+    Returns the :class:`SparseCounts` of the sentence occurrences of each term
+    per article, from a text or binary occurrence file.
+
+    If doc_terms is given, the counts of each article are summed per document
+    term instead, with rows keyed by the ID of the entity.
+    """
+    if is_binary(occur_filename):
+        reader = OccurrenceReader(occur_filename)
+        articles = reader.articles
+        starts = reader.sentence_offsets[reader.article_offsets[:-1]]
+        ends = reader.sentence_offsets[reader.article_offsets[1:]]
+        rows = np.repeat(np.arange(len(articles)), ends - starts)
+        ids = reader.terms
+    else:
+        article_index = {}
+        articles = []
+        rows = array('l')
+        ids = array('l')
+        with open(occur_filename) as f:
+            for line in f:
+                lterms = line.split()
+                article = lterms[0]
+                if article not in article_index:
+                    article_index[article] = len(articles)
+                    articles.append(article)
+
+                rows.extend(repeat(article_index[article], len(lterms) - 1))
+                ids.extend(int(id) for id in lterms[1:])
+        rows = _as_array(rows)
+        ids = _as_array(ids)
+
+    counts, terms = _incidence(rows, ids, len(articles))
+
+    if doc_terms:
+        # map articles to the entities with the article as sep_dir
+        docs = {}
+        doc_rows = array('l')
+        doc_cols = array('l')
+        for i, article in enumerate(articles):
+            for doc in doc_terms.get(article, []):
+                key = str(doc.ID)
+                if key not in docs:
+                    docs[key] = len(docs)
+                doc_rows.append(docs[key])
+                doc_cols.append(i)
+
+        doc_matrix = coo_matrix(
+            (np.ones(len(doc_rows), dtype=np.int64),
+             (_as_array(doc_rows), _as_array(doc_cols))),
+            shape=(len(docs), len(articles))).tocsr()
+        keys = sorted(docs, key=docs.get)
+        return SparseCounts(doc_matrix * counts, keys, terms)
+
+    return SparseCounts(counts, articles, terms)
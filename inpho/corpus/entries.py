@@ -0,0 +1,149 @@
+"""
+Module containing the index of the SEP entries database.
+
+The flat files of the SEP database, ``entries.txt``, ``related_entries.txt``
+and ``pubpending.txt``, as well as the article logs, are parsed once per
+process into a :class:`FileIndex`, which is only parsed again when the file
+changes on disk. The lookup functions of :mod:`inpho.corpus.sep` share these
+indexes, so that bulk operations looking up every entry do not re-read the
+files.
+"""
+
+import os.path
+
+from inpho import config
+from inpho.corpus.cache import file_key
+
+class FileIndex(object):
+    """
+    Base class for an index parsed from a file. The file is parsed by
+    :meth:`parse` on first access and whenever its modification time or size
+    has changed since.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.key = None
+
+    def refresh(self):
+        """ Parses the file again if it has changed since the last parse. """
+        key = file_key(self.filename)
+        if key != self.key:
+            with open(self.filename) as f:
+                self.parse(f)
+            self.key = key
+
+        return self
+
+    def parse(self, f):
+        raise NotImplementedError
+
+class EntriesIndex(FileIndex):
+    """
+    Index of entries.txt, holding the sep_dirs of all entries in file order
+    and their titles and categories.
+    """
+    def parse(self, f):
+        sep_dirs = []
+        titles = {}
+        categories = {}
+        for line in f:
+            sep_dir, title, rest = line.split('::', 2)
+            sep_dirs.append(sep_dir)
+            titles[sep_dir] = title.replace(r"\'", "'")
+
+            category = line.split('::')[-3]
+            categories[sep_dir] = category.replace(r"\'", "'")
+
+        self.sep_dirs = sep_dirs
+        self.titles = titles
+        self.categories = categories
+
+class RelatedIndex(FileIndex):
+    """
+    Index of related_entries.txt, holding the list of related entries of each
+    sep_dir.
+    """
+    def parse(self, f):
+        related = {}
+        f.readline()
+        for line in f:
+            sep_dir, rest = line.split('::', 1)
+            related[sep_dir] = rest.split('|')
+
+        self.related = related
+
+class PubpendingIndex(FileIndex):
+    """ Index of pubpending.txt, holding the set of pending sep_dirs. """
+    def parse(self, f):
+        self.sep_dirs = set(line.strip() for line in f)
+
+class LogIndex(FileIndex):
+    """
+    Index of the status codes in the log file of an article. Status codes are
+    the two characters following a '::' separator, so that every code is
+    found in a single scan of the log.
+    """
+    def parse(self, f):
+        codes = set()
+        for line in f:
+            i = line.find('::')
+            while i != -1:
+                codes.add(line[i+2:i+4])
+                i = line.find('::', i + 1)
+
+        self.codes = codes
+
+    def has_status(self, code):
+        """ Checks if the log contains the given status code. """
+        if len(code) == 2:
+            return code in self.codes
+
+        with open(self.filename) as log:
+            return any(('::' + code) in line for line in log)
+
+# indexes shared by every lookup in this process, by filename
+_indexes = {}
+
+def _get_index(index_type, filename):
+    index = _indexes.get(filename)
+    if index is None:
+        index = _indexes[filename] = index_type(filename)
+
+    return index.refresh()
+
+def get_index(index_type, name, db_root=None):
+    """
+    Returns the up-to-date index of the given type for the file name in the
+    SEP database directory.
+    """
+    if db_root is None:
+        db_root = config.get('corpus', 'db_path')
+
+    return _get_index(index_type, os.path.join(db_root, name))
+
+def get_entries(db_root=None):
+    """ Returns the :class:`EntriesIndex` of entries.txt. """
+    return get_index(EntriesIndex, 'entries.txt', db_root)
+
+def get_related(db_root=None):
+    """ Returns the :class:`RelatedIndex` of related_entries.txt. """
+    return get_index(RelatedIndex, 'related_entries.txt', db_root)
+
+def get_pubpending(db_root=None):
+    """ Returns the :class:`PubpendingIndex` of pubpending.txt. """
+    return get_index(PubpendingIndex, 'pubpending.txt', db_root)
+
+def get_log(sep_dir, log_root=None):
+    """
+    Returns the :class:`LogIndex` of the log of the given article, or None if
+    the article has no log.
+    """
+    if log_root is None:
+        log_root = config.get('corpus', 'log_path')
+
+    filename = os.path.join(log_root, sep_dir)
+    if not os.path.exists(filename):
+        _indexes.pop(filename, None)
+        return None
+
+    return _get_index(LogIndex, filename)
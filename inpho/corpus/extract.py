@@ -0,0 +1,421 @@
+"""
+Module containing the article body extraction for the InPhO data mining
+process.
+
+Building a BeautifulSoup tree of an SEP article only to read the text of the
+``div#aueditable`` element is the most expensive part of preparing a document.
+The :class:`ArticleBodyParser` instead receives the parse events of the article
+and keeps only the strings inside ``div#aueditable``, marking the ranges of
+strings which fall in the Bibliography section as they are seen. Apart from
+the stack of open tags, it holds only the text of the aueditable divs.
+
+The parser is driven by the same :mod:`sgmllib` tokenizer and tag nesting rules
+as BeautifulSoup 3, so that the extracted text is identical to the text of the
+tree-based extraction, which is kept as :func:`extract_body_soup`. For the
+same reason the raw document is still read and decoded whole: the encoding is
+detected from the complete document, and BeautifulSoup's markup fixes are
+applied to it before parsing, so the memory bound only applies to the
+parser, not to the document.
+"""
+
+import logging
+import re
+from sgmllib import SGMLParser, SGMLParseError
+
+from BeautifulSoup import BeautifulSoup, UnicodeDammit
+
+class Reparse(Exception):
+    """
+    Raised when a meta tag declares a charset differing from the one used to
+    decode the document, which is then decoded and parsed again.
+    """
+    def __init__(self, encoding):
+        Exception.__init__(self, encoding)
+        self.encoding = encoding
+
+class ArticleBodyParser(SGMLParser):
+    """
+    Event-driven parser collecting the text of ``div#aueditable``, following
+    the tree building rules of BeautifulSoup without building the tree.
+
+    BeautifulSoup drops the h2 header of the last Bibliography string and all
+    of its following sibling tags. Whenever a Bibliography string is found,
+    the strings of the div read since its h2 opened are marked as removed,
+    and so is every later string inside the h2 or a following sibling, until
+    the parent of the h2 closes. A later Bibliography string replaces the
+    marks.
+    """
+    SELF_CLOSING_TAGS = BeautifulSoup.SELF_CLOSING_TAGS
+    QUOTE_TAGS = BeautifulSoup.QUOTE_TAGS
+    NESTABLE_TAGS = BeautifulSoup.NESTABLE_TAGS
+    RESET_NESTING_TAGS = BeautifulSoup.RESET_NESTING_TAGS
+    MARKUP_MASSAGE = BeautifulSoup.MARKUP_MASSAGE
+    CHARSET_RE = BeautifulSoup.CHARSET_RE
+
+    def __init__(self, original_encoding=None, declared_encoding=None):
+        SGMLParser.__init__(self)
+        self.original_encoding = original_encoding
+        self.declared_encoding = declared_encoding
+
+    def reset(self):
+        SGMLParser.reset(self)
+        self.current_data = []
+        self.quote_stack = []
+
+        # stack of open tags as (name, tag id, number of strings when opened),
+        # the root having id 0
+        self.tag_stack = [(None, 0, 0)]
+        self.tag_count = 0
+
+        # aueditable divs as [tag id, depth, first string, end of strings,
+        # removed], the number of them open, and their stripped strings
+        self.divs = []
+        self.open_divs = 0
+        self.strings = []
+
+        # nearest h2 ancestor of the last Bibliography string, None if it has
+        # no h2 ancestor and False if there is no Bibliography string
+        self.biblio_h2 = False
+
+        # (depth, tag id) of the parent of that h2 while it is open, and the
+        # [start, end) ranges of the removed strings
+        self.cut_parent = None
+        self.cut = []
+
+    def feed(self, markup):
+        """ Parses a complete unicode document. """
+        for fix, m in self.MARKUP_MASSAGE:
+            markup = fix.sub(m, markup)
+        SGMLParser.feed(self, markup)
+
+        self.flush_data()
+        while len(self.tag_stack) > 1:
+            self.pop_tag()
+
+    def in_cut(self):
+        """
+        Checks if the innermost open tag is the h2 of the last Bibliography
+        string or lies in it or one of its following siblings.
+        """
+        if self.cut_parent is None:
+            return False
+        depth, tag_id = self.cut_parent
+        return len(self.tag_stack) > depth + 1 and\
+            self.tag_stack[depth][1] == tag_id
+
+    def push_tag(self, name, attrs):
+        self.tag_count += 1
+        self.tag_stack.append((name, self.tag_count, len(self.strings)))
+
+        if name == 'div' and dict(attrs).get('id') == 'aueditable':
+            self.divs.append([self.tag_count, len(self.tag_stack) - 1,
+                              len(self.strings), None, self.in_cut()])
+            self.open_divs += 1
+
+    def pop_tag(self):
+        self.tag_stack.pop()
+        depth = len(self.tag_stack)
+        if self.open_divs:
+            for div in reversed(self.divs):
+                if div[3] is None and div[1] == depth:
+                    div[3] = len(self.strings)
+                    self.open_divs -= 1
+                    break
+        if self.cut_parent is not None and depth == self.cut_parent[0]:
+            self.cut_parent = None
+
+    def flush_data(self):
+        if not self.current_data:
+            return
+        data = u''.join(self.current_data)
+        self.current_data = []
+        self.add_string(data)
+
+    def start_cut(self):
+        """ Marks the strings read since the h2 of a Bibliography string. """
+        self.biblio_h2 = None
+        self.cut_parent = None
+        self.cut = []
+        for div in self.divs:
+            div[4] = False
+
+        for depth in range(len(self.tag_stack) - 1, 0, -1):
+            name, tag_id, start = self.tag_stack[depth]
+            if name == 'h2':
+                self.biblio_h2 = tag_id
+                self.cut_parent = (depth - 1, self.tag_stack[depth - 1][1])
+                if start < len(self.strings):
+                    self.cut.append([start, len(self.strings)])
+                # the divs opened since the h2 opened lie in the h2
+                for div in self.divs:
+                    div[4] = div[0] > tag_id
+                break
+
+    def add_string(self, data):
+        if data == u'Bibliography':
+            self.start_cut()
+
+        if self.open_divs:
+            if self.in_cut():
+                i = len(self.strings)
+                if self.cut and self.cut[-1][1] == i:
+                    self.cut[-1][1] = i + 1
+                else:
+                    self.cut.append([i, i + 1])
+            self.strings.append(data.strip())
+
+    def pop_to_tag(self, name, inclusive=True):
+        pops = 0
+        for i in range(len(self.tag_stack) - 1, 0, -1):
+            if name == self.tag_stack[i][0]:
+                pops = len(self.tag_stack) - i
+                break
+        if not inclusive:
+            pops = pops - 1
+
+        for i in range(0, pops):
+            self.pop_tag()
+
+    def smart_pop(self, name):
+        """ Implicitly closes open tags, see BeautifulSoup._smartPop. """
+        triggers = self.NESTABLE_TAGS.get(name)
+        nestable = triggers is not None
+        reset_nesting = self.RESET_NESTING_TAGS.has_key(name)
+
+        pop_to = None
+        inclusive = True
+        for i in range(len(self.tag_stack) - 1, 0, -1):
+            p = self.tag_stack[i][0]
+            if p == name and not nestable:
+                pop_to = name
+                break
+            if (triggers is not None and p in triggers) or\
+                (triggers is None and reset_nesting and
+                 self.RESET_NESTING_TAGS.has_key(p)):
+                pop_to = p
+                inclusive = False
+                break
+
+        if pop_to:
+            self.pop_to_tag(pop_to, inclusive)
+
+    def unknown_starttag(self, name, attrs):
+        if self.quote_stack:
+            attrs = ''.join([' %s="%s"' % (x, y) for x, y in attrs])
+            self.handle_data('<%s%s>' % (name, attrs))
+            return
+        self.flush_data()
+
+        self_closing = self.SELF_CLOSING_TAGS.has_key(name)
+        if not self_closing:
+            self.smart_pop(name)
+
+        if '&' in ''.join([value for key, value in attrs]):
+            attrs = [(key, self.convert_attr(value)) for key, value in attrs]
+
+        self.push_tag(name, attrs)
+        if self_closing:
+            self.pop_tag()
+        if name in self.QUOTE_TAGS:
+            self.quote_stack.append(name)
+            self.literal = 1
+
+    def unknown_endtag(self, name):
+        if self.quote_stack and self.quote_stack[-1] != name:
+            self.handle_data('</%s>' % name)
+            return
+        self.flush_data()
+        self.pop_to_tag(name)
+        if self.quote_stack and self.quote_stack[-1] == name:
+            self.quote_stack.pop()
+            self.literal = (len(self.quote_stack) > 0)
+
+    def start_meta(self, attrs):
+        """
+        Checks for a charset declared in a meta tag, see
+        BeautifulSoup.start_meta.
+        """
+        http_equiv = None
+        content_type = None
+        content_index = None
+        for i, (key, value) in enumerate(attrs):
+            key = key.lower()
+            if key == 'http-equiv':
+                http_equiv = value
+            elif key == 'content':
+                content_type = value
+                content_index = i
+
+        if http_equiv and content_type:
+            match = self.CHARSET_RE.search(content_type)
+            if not match:
+                pass
+            elif self.declared_encoding is not None or\
+                self.original_encoding is None:
+                # the charset is substituted, which shows in quoted text
+                def rewrite(match):
+                    return match.group(1) + "%SOUP-ENCODING%"
+                attrs[content_index] = (attrs[content_index][0],
+                    self.CHARSET_RE.sub(rewrite, content_type))
+            else:
+                charset = match.group(3)
+                if charset and charset != self.original_encoding:
+                    raise Reparse(charset)
+
+        self.unknown_starttag('meta', attrs)
+
+    def convert_attr(self, value):
+        """ Converts character references in attribute values. """
+        def convert(match):
+            x = match.group(1)
+            if x in BeautifulSoup.XML_ENTITIES_TO_SPECIAL_CHARS:
+                return u'&%s;' % x
+            elif len(x) > 0 and x[0] == '#':
+                if len(x) > 1 and x[1] == 'x':
+                    return unichr(int(x[2:], 16))
+                else:
+                    return unichr(int(x[1:]))
+            else:
+                return u'&%s;' % x
+        return re.sub("&(#\d+|#x[0-9a-fA-F]+|\w+);", convert, value)
+
+    def convert_charref(self, name):
+        try:
+            n = int(name)
+        except ValueError:
+            return
+        if not 0 <= n <= 127:
+            return
+        return self.convert_codepoint(n)
+
+    def handle_data(self, data):
+        self.current_data.append(data)
+
+    def handle_string(self, text):
+        self.flush_data()
+        self.handle_data(text)
+        self.flush_data()
+
+    def handle_pi(self, text):
+        if text[:3] == "xml":
+            text = u"xml version='1.0' encoding='%SOUP-ENCODING%'"
+        self.handle_string(text)
+
+    def handle_comment(self, text):
+        self.handle_string(text)
+
+    def handle_decl(self, data):
+        self.handle_string(data)
+
+    def handle_charref(self, ref):
+        self.handle_data(unichr(int(ref)))
+
+    def handle_entityref(self, ref):
+        self.handle_data("&%s;" % ref)
+
+    def parse_declaration(self, i):
+        j = None
+        if self.rawdata[i:i+9] == '<![CDATA[':
+            k = self.rawdata.find(']]>', i)
+            if k == -1:
+                k = len(self.rawdata)
+            data = self.rawdata[i+9:k]
+            j = k+3
+            self.handle_string(data)
+        else:
+            try:
+                j = SGMLParser.parse_declaration(self, i)
+            except SGMLParseError:
+                to_handle = self.rawdata[i:]
+                self.handle_data(to_handle)
+                j = i + len(to_handle)
+        return j
+
+    def body(self):
+        """
+        Returns the text of the first aueditable div outside of the
+        Bibliography section, or None if there is none.
+        """
+        for tag_id, depth, first, last, removed in self.divs:
+            if not removed:
+                break
+        else:
+            return None
+
+        kept = []
+        i = first
+        for start, end in self.cut:
+            kept.extend(self.strings[i:max(i, min(start, last))])
+            i = max(i, end)
+        kept.extend(self.strings[i:last])
+        return u''.join(kept)
+
+def parse_article(doc):
+    """ Returns an :class:`ArticleBodyParser` fed with the raw document. """
+    dammit = UnicodeDammit(doc, [None, None], smartQuotesTo=None, isHTML=True)
+    while True:
+        parser = ArticleBodyParser(dammit.originalEncoding,
+                                   dammit.declaredHTMLEncoding)
+        try:
+            if dammit.unicode:
+                parser.feed(dammit.unicode)
+            else:
+                parser.feed(u'')
+            return parser
+        except Reparse, e:
+            dammit = UnicodeDammit(doc, [None, e.encoding], smartQuotesTo=None,
+                                   isHTML=True)
+
+def extract_body(filename):
+    """
+    Extracts the article body from the SEP article at the given filename,
+    without building a document tree. Returns the empty string if the article
+    has no aueditable div.
+    """
+    with open(filename) as f:
+        doc = f.read()
+    parser = parse_article(doc)
+
+    if parser.biblio_h2 is None:
+        logging.error('Could not extract bibliography from %s' % filename)
+
+    body = parser.body()
+    if body is not None:
+        # remove HTML escaped characters
+        return re.sub("&\w+;", "", body)
+    else:
+        logging.error('Could not extract text from %s' % filename)
+
+        return ''
+
+def extract_body_soup(filename):
+    """
+    Extracts the article body by building a BeautifulSoup tree of the SEP
+    article. Kept as the reference for :func:`extract_body`.
+    """
+    f = open(filename)
+    doc = f.read()
+    soup = BeautifulSoup(doc, convertEntities=["xml", "html"])
+
+    # rip out bibliography
+    biblio_root = soup.findAll('h2', text='Bibliography')
+    if biblio_root:
+        biblio_root = biblio_root[-1].findParent('h2')
+        if biblio_root:
+            biblio = [biblio_root]
+            biblio.extend(biblio_root.findNextSiblings())
+            biblio = [elm.extract() for elm in biblio]
+        else:
+            logging.error('Could not extract bibliography from %s' % filename)
+
+    # grab modified body
+    body = soup.find("div", id="aueditable")
+    if body is not None:
+        # remove HTML escaped characters
+        body = re.sub("&\w+;", "", body.text)
+
+        return body
+    else:
+        logging.error('Could not extract text from %s' % filename)
+
+        return ''
@@ -12,50 +12,432 @@ particular sciences'.
 The methods in this file could use significant attention, as they are mostly
 extracted from their context in a legacy interface.
 """
+import cPickle as pickle
+from collections import defaultdict
+import hashlib
+import os
+import os.path
+import re
+
+from sqlalchemy import and_, select
+
 from inpho import config
 from inpho.lib.php import PHP
-from inpho.model import Session
-from inpho.model import Entity
+
+# common words removed from the strings, as in lib/fuzzymatch.php
+STOPPERS = ["the", "and", "a", "an", "as", "in", "at", "to", "of", "on",
+            "philosophy"]
+
+# maximum number of edits between two matching words
+WORD_EDIT_THRESHOLD = 2
+
+_stoppers = [re.compile(r'\b%s\b\s*' % stop, re.IGNORECASE)
+                 for stop in STOPPERS]
+_punctuation = re.compile(r'[!?:,]')
+_contraction = re.compile(r"n't\b", re.IGNORECASE)
+_possessive = re.compile(r"'s\b", re.IGNORECASE)
+_whitespace = re.compile(r'\s+')
+
+def regularize(string):
+    """
+    Returns the string without stop words, punctuation, contractions and
+    possessives, like regularize() in lib/fuzzymatch.php.
+    """
+    for stop in _stoppers:
+        string = stop.sub('', string)
+
+    string = _punctuation.sub('', string)
+    string = _contraction.sub(' not', string)
+    string = _possessive.sub('s', string)
+    return string
+
+def words(string):
+    """ Returns the list of words of the regularized string. """
+    return _whitespace.split(regularize(string))
+
+def _word_distance(w1, w2, i, j, err, threshold, memo):
+    """
+    Returns the edit distance between the suffixes w1[i:] and w2[j:] with err
+    edits so far, following fuzzy_word_recurse() in lib/fuzzymatch.php,
+    including its shortcuts: words whose lengths differ by more than 2 are
+    at their length difference, and branching stops over the threshold.
+    """
+    while True:
+        l1 = len(w1) - i
+        l2 = len(w2) - j
+        if abs(l1 - l2) > 2:
+            return abs(l1 - l2)
+        elif l1 == 0 or l2 == 0:
+            return err + l1 + l2
+        elif w1[i] == w2[j]:
+            i += 1
+            j += 1
+        else:
+            break
+
+    if err > threshold:
+        return err + 1
+
+    key = (i, j, err)
+    if key in memo:
+        return memo[key]
+
+    # substitution, insertion to w1, insertion to w2 and transposition
+    min_err = _word_distance(w1, w2, i + 1, j + 1, err + 1, threshold, memo)
+    if l1 > 1:
+        min_err = min(min_err, _word_distance(w1, w2, i + 1, j, err + 1,
+                                              threshold, memo))
+    if l2 > 1:
+        min_err = min(min_err, _word_distance(w1, w2, i, j + 1, err + 1,
+                                              threshold, memo))
+        if l1 > 1 and w1[i + 1] == w2[j] and w1[i] == w2[j + 1]:
+            min_err = min(min_err, _word_distance(w1, w2, i + 2, j + 2,
+                                                  err + 1, threshold, memo))
+
+    memo[key] = min_err
+    return min_err
+
+def fuzzy_word_match(word1, word2, threshold=WORD_EDIT_THRESHOLD):
+    """
+    Returns 1 plus the edit distance between two words if it is at most
+    threshold, 0 otherwise, like fuzzy_word_match() in lib/fuzzymatch.php.
+    """
+    distance = _word_distance(word1, word2, 0, 0, 0, threshold, {})
+    if distance <= threshold:
+        return distance + 1
+    return 0
+
+def match_words(words1, words2, threshold=WORD_EDIT_THRESHOLD, cache=None):
+    """
+    Returns the (confidence, distance) tuple of two lists of words, see
+    :func:`fuzzy_match()`. The word matches are kept in the dictionary cache,
+    if given, when matching one list of words against many.
+    """
+    match = 0
+    distance = 0
+    for word1 in words1:
+        for word2 in words2:
+            if cache is None:
+                result = fuzzy_word_match(word1, word2, threshold)
+            else:
+                result = cache.get((word1, word2))
+                if result is None:
+                    result = cache[(word1, word2)] =\
+                        fuzzy_word_match(word1, word2, threshold)
+            if result:
+                match += 1
+                distance += result - 1
+                break
+
+    if not match:
+        return (0.0, 0.0)
+
+    ratio = (float(match) / len(words1)) * (float(match) / len(words2))
+    # PHP prints floats with 14 significant digits
+    return (float('%.14G' % ratio), float(distance))
+
+def fuzzy_match(string1, string2, threshold=WORD_EDIT_THRESHOLD):
+    """
+    Compares two byte strings by fuzzy matching their words, like
+    fuzzy_match() in lib/fuzzymatch.php. Returns a (confidence, distance)
+    tuple: the product of the ratios of matched words to the number of words
+    of each string, and the total edit distance of the matched words.
+    """
+    return match_words(words(string1), words(string2), threshold)
+
+def _latin1(string):
+    """ Converts a string to ISO-8859-1 bytes, as utf8_decode() does. """
+    if isinstance(string, str):
+        string = string.decode('utf8')
+    return string.encode('latin-1', 'replace')
 
 def fuzzymatch(string1, string2):
     """
     Takes two strings and performs a fuzzymatch on them. 
     Returns a (confidence, distance) tuple.
     """
-    php = PHP("""set_include_path('%(lib_path)s'); 
-                 require 'fuzzymatch.php';""" % 
-                 {'lib_path': config.get('general', 'lib_path')})
+    return fuzzy_match(_latin1(string1), _latin1(string2))
 
+# workers running lib/fuzzymatch.php, started by the first php_fuzzymatch
+_php = None
 
-    code = '$string1 = utf8_decode("' + string1.encode('utf8') + '");'
-    code += '$string2 = utf8_decode("' + string2.encode('utf8') + '");'
+def _php_code(string1, string2):
+    code = '$string1 = utf8_decode(base64_decode("%s"));' %\
+        string1.encode('utf8').encode('base64').replace('\n', '')
+    code += '$string2 = utf8_decode(base64_decode("%s"));' %\
+        string2.encode('utf8').encode('base64').replace('\n', '')
     code += 'print fuzzy_match($string1, $string2, 2);'
+    return code
 
-    result = php.get_raw(code)
-    confidence,distance = map(float, result.split(','))
+def php_fuzzymatch_many(pairs):
+    """
+    Performs the fuzzymatch of each pair of strings with lib/fuzzymatch.php,
+    in batches sent to long-lived PHP workers. Returns the list of
+    (confidence, distance) tuples. Kept as the reference for
+    :func:`fuzzymatch()`.
+    """
+    global _php
+    if _php is None:
+        _php = PHP("""set_include_path('%(lib_path)s');
+                      require 'fuzzymatch.php';""" %
+                   {'lib_path': config.get('general', 'lib_path')},
+                   workers=2, timeout=60)
 
-    return (confidence, distance)
+    results = _php.get_raw_many([_php_code(string1, string2)
+                                     for string1, string2 in pairs])
+    return [tuple(map(float, result.split(','))) for result in results]
 
-def fuzzymatch_all(string1):
+def php_fuzzymatch(string1, string2):
+    """
+    Performs the fuzzymatch of two strings with lib/fuzzymatch.php. Kept as
+    the reference for :func:`fuzzymatch()`.
+    """
+    return php_fuzzymatch_many([(string1, string2)])[0]
+
+def deletions(word, depth=WORD_EDIT_THRESHOLD):
+    """
+    Returns the set of strings obtained by deleting up to depth characters
+    from word, including the word itself.
+    """
+    variants = set([word])
+    frontier = variants
+    for i in range(depth):
+        frontier = set(variant[:k] + variant[k + 1:]
+                       for variant in frontier for k in range(len(variant)))
+        variants |= frontier
+    return variants
+
+class CandidateIndex(object):
+    """
+    Index of the regularized words of entity labels, pruning the entities
+    compared to a title to those which may reach the confidence cutoff.
+
+    Two words are at most threshold edits apart, counting a transposition as
+    one edit, only if deleting at most threshold characters from each gives
+    the same string. Every word matched by :func:`fuzzy_word_match()` is
+    within threshold edits, so the words sharing a deletion variant with a
+    title word are a superset of its matching words. An entity can then only
+    reach the cutoff if enough title words have such a candidate among its
+    words, see :meth:`candidates`. The index is only exact for thresholds of
+    at most 2, as fuzzy_word_match() matches any words whose lengths differ
+    by 3 to threshold.
+    """
+    def __init__(self, threshold=WORD_EDIT_THRESHOLD):
+        self.threshold = threshold
+        self.labels = {}
+        self.words = {}
+        self.postings = defaultdict(set)
+        self.variants = defaultdict(set)
+        self._version = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getstate__(self):
+        # tuples unpickle much faster than sets
+        return (self.threshold, self.labels, self.words,
+                dict((word, tuple(IDs))
+                     for word, IDs in self.postings.iteritems()),
+                dict((variant, tuple(variant_words))
+                     for variant, variant_words in self.variants.iteritems()))
+
+    def __setstate__(self, state):
+        self.threshold, self.labels, self.words, postings, variants = state
+        self._version = None
+        self.postings = defaultdict(set)
+        for word, IDs in postings.iteritems():
+            self.postings[word] = set(IDs)
+        self.variants = defaultdict(set)
+        for variant, variant_words in variants.iteritems():
+            self.variants[variant] = set(variant_words)
+
+    @property
+    def version(self):
+        """
+        Digest of the indexed labels, changing whenever an entity is added,
+        relabeled or removed.
+        """
+        if self._version is None:
+            sha = hashlib.sha1()
+            for ID in sorted(self.labels):
+                sha.update(repr((ID, self.labels[ID])))
+            self._version = sha.hexdigest()
+        return self._version
+
+    def add(self, ID, label):
+        """ Adds or replaces the label of an entity. """
+        if ID in self.labels:
+            self.remove(ID)
+
+        self._version = None
+        self.labels[ID] = label
+        self.words[ID] = label_words = words(_latin1(label or u''))
+        for word in label_words:
+            if word not in self.postings:
+                for variant in deletions(word, self.threshold):
+                    self.variants[variant].add(word)
+            self.postings[word].add(ID)
+
+    def remove(self, ID):
+        """ Removes an entity from the index. """
+        self._version = None
+        del self.labels[ID]
+        for word in self.words.pop(ID):
+            postings = self.postings.get(word)
+            if postings is None:
+                continue
+            postings.discard(ID)
+            if not postings:
+                del self.postings[word]
+                for variant in deletions(word, self.threshold):
+                    self.variants[variant].discard(word)
+                    if not self.variants[variant]:
+                        del self.variants[variant]
+
+    def sync(self, labels):
+        """
+        Updates the index to the given (ID, label) pairs, adding, replacing
+        and removing entities as needed. Returns the number of changes.
+        """
+        labels = dict(labels)
+        changes = 0
+        for ID in set(self.labels).difference(labels):
+            self.remove(ID)
+            changes += 1
+        for ID, label in labels.iteritems():
+            if ID not in self.labels or self.labels[ID] != label:
+                self.add(ID, label)
+                changes += 1
+        return changes
+
+    def candidate_words(self, word):
+        """ Returns the set of indexed words which may match word. """
+        candidates = set()
+        for variant in deletions(word, self.threshold):
+            candidates.update(self.variants.get(variant, ()))
+        return candidates
+
+    def candidates(self, title_words, cutoff=0.5):
+        """
+        Returns the IDs of the entities which may reach the cutoff confidence
+        with the given title words. A title word counts towards the matches
+        of an entity if one of its candidate words is in the label.
+        """
+        counts = defaultdict(int)
+        for word in title_words:
+            IDs = set()
+            for candidate in self.candidate_words(word):
+                IDs.update(self.postings[candidate])
+            for ID in IDs:
+                counts[ID] += 1
+
+        n_words = len(title_words)
+        return [ID for ID, count in counts.iteritems()
+                    if count * count >= cutoff * n_words * len(self.words[ID])]
+
+    def match(self, string, cutoff=0.5):
+        """
+        Returns the sorted list of (ID, confidence) pairs of the entities
+        whose fuzzymatch with the string reaches the cutoff.
+        """
+        title_words = words(_latin1(string))
+        cache = {}
+        matches = []
+        for ID in sorted(self.candidates(title_words, cutoff)):
+            confidence, distance = match_words(title_words, self.words[ID],
+                                               self.threshold, cache)
+            if confidence >= cutoff:
+                matches.append((ID, confidence))
+        return matches
+
+    def save(self, filename):
+        """ Pickles the index to filename. """
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmp_filename, 'wb') as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_filename, filename)
+
+    @staticmethod
+    def load(filename):
+        """ Loads the index saved by :meth:`save`. """
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+
+def select_labels(min_ID=None):
+    """
+    Returns the (ID, label) pairs of every entity which is neither a node nor
+    a journal, with a single column-level query. If min_ID is given, only the
+    entities with an ID of at least min_ID are returned.
+    """
+    from inpho.model import Session, entity_table
+
+    typeID = entity_table.c.typeID
+    clause = and_(typeID != 2, typeID != 4)
+    if min_ID is not None:
+        clause = and_(clause, entity_table.c.ID >= min_ID)
+    return Session.execute(select([entity_table.c.ID, entity_table.c.label],
+                                  clause)).fetchall()
+
+# index shared by every fuzzymatch in this process
+_index = None
+
+def get_index(filename=None):
+    """
+    Returns the :class:`CandidateIndex` of the entity labels, loaded from
+    filename, defaulting to index.pickle in the fuzzy data path.
+
+    The first call of a process brings the index up to date with the whole
+    entity table. Later calls only add the entities created since, so that
+    matching a batch of titles does not read the entity table again. The
+    index is saved whenever it has changed.
+    """
+    global _index
+
+    if filename is None:
+        import inpho.corpus
+        filename = os.path.join(inpho.corpus.fuzzy_path, 'index.pickle')
+
+    if _index is None:
+        try:
+            index = CandidateIndex.load(filename)
+        except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+            index = CandidateIndex()
+        changes = index.sync(select_labels())
+        _index = index
+    else:
+        changes = 0
+        for ID, label in select_labels(max(_index.labels or [0]) + 1):
+            _index.add(ID, label)
+            changes += 1
+
+    if changes:
+        _index.save(filename)
+    return _index
+
+def fuzzymatch_all(string1, index=None):
     """
     Takes a string and returns all potential fuzzymatches from the Entity
     database. Matches are returned as a list of (entity,confidence) tuples.
+
+    Only the entities which may reach the confidence cutoff are compared,
+    see :class:`CandidateIndex`. If index is not given, the index returned
+    by :func:`get_index()` is used.
     """
-    # construct Entity query  
-    entities = Session.query(Entity)
-    entities = entities.filter(Entity.typeID != 2) # exclude nodes
-    entities = entities.filter(Entity.typeID != 4) # exclude journals
-
-    # initialize result object
-    matches = []
-   
-    # build results
-    for entity in entities:
-        confidence, distance = fuzzymatch(string1, entity.label)
-        if confidence >= 0.5:
-            matches.append((entity,confidence))
+    from inpho.model import Session
+    from inpho.model import Entity
+
+    if index is None:
+        index = get_index()
+    matches = index.match(string1)
+    if not matches:
+        return []
+
+    IDs = [ID for ID, confidence in matches]
+    entities = Session.query(Entity).filter(Entity.ID.in_(IDs))
+    entities = dict((entity.ID, entity) for entity in entities)
     
-    return matches
+    return [(entities[ID], confidence) for ID, confidence in matches
+                if ID in entities]
 
 def convertSS(choicestring, ioru):
     """
@@ -0,0 +1,276 @@
+"""
+Module containing the persistent counts of the incremental InPhO data mining
+process.
+
+Every edge of the graph is derived from a few counts: the number of non-empty
+apriori baskets, the number of baskets holding each term and each pair of
+terms, and the sentence occurrences of each term in the articles of each
+document term. :class:`MiningCounts` keeps these totals as sparse matrices
+indexed by term ID, along with the contribution of every article, so that a
+revised article is mined by subtracting its old contribution and adding the
+new one. Only the edges touching a term of the article are then recomputed,
+see :meth:`MiningCounts.edges`.
+
+Edges not touching the article keep the jweight computed with the previous
+number of baskets, which a complete mining run brings up to date.
+"""
+
+import cPickle as pickle
+import logging
+import os
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+
+from inpho.corpus.cooccurrence import occurrence_counts, rule_measures
+from inpho.corpus.stats import article_baskets, node_entropy
+
+class Contribution(object):
+    """
+    Contribution of an article to the :class:`MiningCounts`: its baskets, as
+    sorted tuples of term IDs, the (term ID, count) pairs of its sentence
+    occurrences and the IDs of its document terms.
+    """
+    __slots__ = ('baskets', 'occurrences', 'docs')
+
+    def __init__(self, baskets=(), occurrences=(), docs=()):
+        self.baskets = list(baskets)
+        self.occurrences = list(occurrences)
+        self.docs = list(docs)
+
+    def __getstate__(self):
+        return (self.baskets, self.occurrences, self.docs)
+
+    def __setstate__(self, state):
+        self.baskets, self.occurrences, self.docs = state
+
+    def terms(self):
+        """ Returns the set of term IDs in the baskets. """
+        terms = set()
+        for basket in self.baskets:
+            terms.update(basket)
+        return terms
+
+def contributions(occur_filename, terms, doc_terms=None):
+    """
+    Returns a dictionary of the :class:`Contribution` of each article in a
+    text or binary occurrence file, keeping the given terms in the baskets.
+    """
+    baskets = article_baskets(occur_filename, terms, doc_terms)
+    counts = occurrence_counts(occur_filename)
+    matrix = counts.matrix
+    cols = counts.cols.tolist()
+
+    result = {}
+    for i, article in enumerate(counts.rows):
+        start, end = matrix.indptr[i], matrix.indptr[i + 1]
+        occurrences = zip([cols[j] for j in matrix.indices[start:end]],
+                          matrix.data[start:end].tolist())
+        docs = []
+        if doc_terms:
+            docs = [doc.ID for doc in doc_terms.get(article, [])]
+        result[article] = Contribution(baskets.get(article, []), occurrences,
+                                       docs)
+
+    return result
+
+def _square(rows, cols, data, size):
+    """ Returns the square CSR matrix of the given entries. """
+    return coo_matrix((data, (rows, cols)), shape=(size, size)).tocsr()
+
+class MiningCounts(object):
+    """
+    Totals of the contributions of every article:
+
+    ``n_baskets``
+        the number of non-empty baskets
+    ``pairs``
+        sparse matrix of the number of baskets holding each pair of term IDs,
+        whose diagonal holds the number of baskets holding each term
+    ``occurs``
+        sparse matrix of the sentence occurrences of each term ID, in the
+        articles of each document term ID
+    ``entropies``
+        array of the entropy of each term ID, 0 for terms without edges
+    """
+    def __init__(self, size=0):
+        self.n_baskets = 0
+        self.pairs = csr_matrix((size, size), dtype=np.int64)
+        self.occurs = csr_matrix((size, size), dtype=np.int64)
+        self.entropies = np.zeros(size, dtype=np.float64)
+        self.articles = {}
+
+    @classmethod
+    def from_contributions(cls, contributions):
+        """ Returns the counts of a dictionary of contributions. """
+        counts = cls()
+        counts.articles = dict(contributions)
+        counts._add(counts.articles.values(), 1)
+        counts.update_entropies(np.arange(counts.size))
+        return counts
+
+    @property
+    def size(self):
+        return self.pairs.shape[0]
+
+    @property
+    def max_entropy(self):
+        return self.entropies.max() if self.size else 0.0
+
+    def _resize(self, size):
+        if size <= self.size:
+            return
+
+        entropies = np.zeros(size, dtype=np.float64)
+        entropies[:self.size] = self.entropies
+        self.entropies = entropies
+
+        for name in ('pairs', 'occurs'):
+            matrix = getattr(self, name).tocoo()
+            setattr(self, name, _square(matrix.row, matrix.col, matrix.data,
+                                        size))
+
+    def _add(self, contributions, sign):
+        """
+        Adds the contributions to the counts, or subtracts them if sign is -1.
+        """
+        rows, ids = [], []
+        occur_rows, occur_cols, occur_data = [], [], []
+        n_baskets = 0
+        for contribution in contributions:
+            for basket in contribution.baskets:
+                if basket:
+                    rows.extend([n_baskets] * len(basket))
+                    ids.extend(basket)
+                    n_baskets += 1
+
+            for doc in contribution.docs:
+                for term, count in contribution.occurrences:
+                    occur_rows.append(doc)
+                    occur_cols.append(term)
+                    occur_data.append(count)
+
+        size = max([self.size] + [id + 1 for id in ids] +
+                   [id + 1 for id in occur_rows + occur_cols])
+        self._resize(size)
+
+        baskets = coo_matrix((np.ones(len(ids), dtype=np.int64), (rows, ids)),
+                             shape=(n_baskets, size)).tocsr()
+        self.pairs = self.pairs + sign * (baskets.T * baskets)
+        self.pairs.eliminate_zeros()
+        self.n_baskets += sign * n_baskets
+
+        occurs = _square(occur_rows, occur_cols,
+                         np.array(occur_data, dtype=np.int64), size)
+        self.occurs = self.occurs + sign * occurs
+        self.occurs.eliminate_zeros()
+
+    def update_article(self, article, contribution):
+        """
+        Replaces the contribution of an article, None removing the article.
+        Returns the sorted array of affected term IDs, those whose counts,
+        edges or occurrences may have changed.
+        """
+        old = self.articles.pop(article, None)
+        affected = set()
+        if old is not None:
+            affected.update(old.terms(), old.docs)
+            self._add([old], -1)
+        if contribution is not None:
+            affected.update(contribution.terms(), contribution.docs)
+            self._add([contribution], 1)
+            self.articles[article] = contribution
+
+        affected = np.array(sorted(affected), dtype=np.int_)
+        self.update_entropies(affected)
+        return affected
+
+    def _rules(self, terms):
+        """
+        Returns the arrays of the antecedents and consequents of the rules
+        with one of the given terms as antecedent.
+        """
+        terms = np.asarray(terms, dtype=np.int64)
+        if not len(terms):
+            return terms, terms
+
+        rows = self.pairs[terms].tocoo()
+        ante = terms[rows.row]
+        cons = rows.col.astype(np.int64)
+        keep = (rows.data > 1) & (ante != cons)
+        return ante[keep], cons[keep]
+
+    def _lookup(self, matrix, rows, cols):
+        """ Returns the array of the entries of matrix at (rows, cols). """
+        if not len(rows):
+            return np.zeros(0, dtype=matrix.dtype)
+        return np.asarray(matrix[rows, cols]).ravel()
+
+    def update_entropies(self, terms):
+        """
+        Recomputes the entropy of the given terms, see
+        :func:`inpho.corpus.stats.node_entropy()`.
+        """
+        if self.size == 0:
+            return
+
+        ante, cons = self._rules(terms)
+        union = self._lookup(self.pairs, ante, cons)
+        support = self.pairs.diagonal().astype(np.float64)
+
+        self.entropies[terms] = 0.0
+        if len(ante):
+            nodes, entropies = node_entropy(ante, union / support[ante])
+            self.entropies[nodes] = entropies
+
+    def edges(self, terms):
+        """
+        Returns the edges with one of the given terms as antecedent or
+        consequent, as a dictionary of parallel columns like
+        :func:`inpho.corpus.stats.edge_table()`, with their weight.
+        """
+        ante, cons = self._rules(terms)
+
+        # add the reverse of every rule, once
+        keys = np.unique(np.concatenate((ante * self.size + cons,
+                                         cons * self.size + ante)))
+        ante, cons = keys // self.size, keys % self.size
+
+        if self.size:
+            support = self.pairs.diagonal()
+        else:
+            support = np.zeros(0, dtype=np.int64)
+        union = self._lookup(self.pairs, ante, cons)
+        confidence, jweight = rule_measures(union, support[ante],
+                                            support[cons], self.n_baskets)
+
+        entropy_diff = self.entropies[ante] - self.entropies[cons]
+        if self.max_entropy:
+            weight = jweight * (entropy_diff / self.max_entropy)
+        else:
+            if len(ante):
+                logging.warning("all term entropies are 0, edge weights "
+                                "set to 0")
+            weight = np.zeros(len(ante), dtype=np.float64)
+
+        occurs_in = self._lookup(self.occurs, ante, cons)
+
+        return {'ante': [str(id) for id in ante.tolist()],
+                'cons': [str(id) for id in cons.tolist()],
+                'confidence': confidence,
+                'jweight': jweight,
+                'weight': weight,
+                'occurs_in': occurs_in}
+
+    def save(self, filename):
+        """ Pickles the counts to filename. """
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmp_filename, 'wb') as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_filename, filename)
+
+    @staticmethod
+    def load(filename):
+        """ Loads the counts saved by :meth:`save`. """
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
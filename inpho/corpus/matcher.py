@@ -0,0 +1,233 @@
+"""
+Module containing the multi-pattern term matcher for the InPhO data mining
+process.
+
+Scanning a document once per search pattern makes occurrence mining cost
+O(articles * terms * patterns) full-text scans. A :class:`TermMatcher` is built
+once from the term list and compiles every literal search pattern into a single
+Aho-Corasick automaton, so that each document is scanned in one pass. Patterns
+which use alternation or grouping cannot be expressed as literals and are kept
+in a fallback bucket of regular expressions.
+"""
+
+from bisect import bisect_right
+from collections import defaultdict, deque
+
+class Automaton(object):
+    """
+    Aho-Corasick automaton over a set of literal strings. Each literal is
+    associated with a value, which is reported whenever the literal occurs.
+
+    Literals are added with :meth:`add`, then :meth:`finalize` must be called
+    before scanning any text.
+    """
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+    def __len__(self):
+        return len(self._goto)
+
+    def add(self, literal, value):
+        """ Adds a literal string to the automaton. """
+        state = 0
+        for char in literal:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+
+        self._out[state].append((len(literal), value))
+
+    def finalize(self):
+        """
+        Computes the failure links of the automaton with a breadth-first
+        traversal of the trie, merging the outputs of each failure state.
+        """
+        queue = deque(self._goto[0].itervalues())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].iteritems():
+                queue.append(next_state)
+
+                # follow failure links until a state can consume char
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+
+                self._fail[next_state] = fail
+                self._out[next_state] = self._out[next_state] + self._out[fail]
+
+    def _states(self, text):
+        """ Generates (position, state) pairs for every state with output. """
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                yield i, state
+
+    def values_in(self, text):
+        """ Returns the set of values whose literals occur in text. """
+        visited = set(state for i, state in self._states(text))
+        visited.add(0)
+
+        values = set()
+        for state in visited:
+            values.update(value for length, value in self._out[state])
+
+        return values
+
+    def finditer(self, text):
+        """
+        Generates (start, end, value) triples for every occurrence of every
+        literal in text, including overlapping occurrences.
+        """
+        for i, state in self._states(text):
+            for length, value in self._out[state]:
+                yield i - length + 1, i + 1, value
+
+class TermMatcher(object):
+    """
+    Compiled matcher for the search patterns of a list of terms.
+
+    The matcher is built once, typically from the result of
+    :func:`inpho.corpus.sep.select_terms()`, and can then be reused for every
+    article in the corpus. Terms must provide a ``compiled_patterns`` bundle,
+    see :class:`inpho.corpus.patterns.CompiledPatterns`.
+    """
+    def __init__(self, terms):
+        self.terms = list(terms)
+
+        self._literals = Automaton()
+        self._literal_terms = []
+        self._bounded = []
+        self._regexes = []
+
+        for index, term in enumerate(self.terms):
+            compiled = term.compiled_patterns
+            for regex in compiled.regexes:
+                self._regexes.append((index, regex))
+            for literal, sentence_literal in zip(compiled.literals, 
+                                                 compiled.sentence_literals):
+                # bounded literals only match between spaces or at the edges
+                # of a sentence, and can be located from document offsets
+                bounded = bool(literal) and\
+                    sentence_literal == u' ' + literal + u' '
+
+                self._literals.add(literal, len(self._literal_terms))
+                self._literal_terms.append(index)
+                self._bounded.append(bounded)
+
+        self._literals.finalize()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def document_occurrences(self, document):
+        """
+        Returns a list of terms occuring in the document, in the order of the
+        term list used to build the matcher.
+        """
+        document = document.lower()
+
+        found = set(self._literal_terms[literal] for literal in 
+                    self._literals.values_in(u' ' + document + u' '))
+        for index, regex in self._regexes:
+            if index not in found and regex.search(document):
+                found.add(index)
+
+        return [self.terms[index] for index in sorted(found)]
+
+    def sentence_occurrences(self, document, spans, terms_present=None):
+        """
+        Returns a list of lists representing the terms occuring in each
+        sentence of the document, given the (start, end) offsets of each
+        sentence. If terms_present is given, only those terms are reported.
+
+        Rather than rescanning every sentence, the document is scanned once
+        and the offset of each literal match is mapped to its sentence with a
+        binary search over the sentence boundaries. Regular expression
+        patterns are searched in the document, and only the sentences in which
+        a document-level match starts are searched again.
+        """
+        spans = list(spans)
+        if not spans:
+            return []
+
+        document = document.lower()
+        starts = [start for start, end in spans]
+
+        allowed = None
+        if terms_present is not None:
+            allowed = set(index for index, term in enumerate(self.terms)
+                              if term in terms_present)
+
+        found = defaultdict(set)
+        unbounded = set()
+
+        for start, end, literal in self._literals.finditer(document):
+            index = self._literal_terms[literal]
+            if allowed is not None and index not in allowed:
+                continue
+            elif not self._bounded[literal]:
+                unbounded.add(index)
+                continue
+
+            i = bisect_right(starts, start) - 1
+            if i < 0:
+                continue
+            sent_start, sent_end = spans[i]
+
+            # the sentence-level check drops the last character of the
+            # sentence and pads it with spaces
+            if end > sent_end - 1:
+                continue
+            if start != sent_start and document[start - 1] != u' ':
+                continue
+            if end != sent_end - 1 and document[end] != u' ':
+                continue
+
+            found[i].add(index)
+
+        for index, regex in self._regexes:
+            if allowed is not None and index not in allowed:
+                continue
+
+            pos = 0
+            while True:
+                match = regex.search(document, pos)
+                if match is None:
+                    break
+
+                i = max(bisect_right(starts, match.start()) - 1, 0)
+                sent_start, sent_end = spans[i]
+                if index not in found[i] and\
+                    regex.search(document[sent_start:sent_end]):
+                    found[i].add(index)
+
+                if i + 1 >= len(spans):
+                    break
+                pos = spans[i + 1][0]
+
+        # literals without word breaks at both ends fall back to a rescan
+        for index in unbounded:
+            literals = self.terms[index].compiled_patterns.sentence_literals
+            for i, (sent_start, sent_end) in enumerate(spans):
+                padded = u' ' + document[sent_start:sent_end - 1] + u' '
+                if any(literal in padded for literal in literals):
+                    found[i].add(index)
+
+        return [[self.terms[index] for index in sorted(found[i])]
+                    for i in xrange(len(spans))]
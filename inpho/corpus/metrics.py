@@ -0,0 +1,205 @@
+"""
+Module containing the instrumentation of the InPhO data mining process.
+
+Stages of a mining run are timed with :func:`stage`, which records their wall
+and CPU time and peak resident memory. The occurrence extraction reports the
+time spent extracting, tokenizing and matching each article with
+:func:`article`, and the utilization of its worker pool with :func:`pool`.
+Every measurement is kept for the :func:`summary` table printed at the end of
+a run, and written as a JSON line to the file given to :func:`configure`.
+
+A single article can be profiled with :func:`profile`.
+"""
+
+from contextlib import contextmanager
+import cProfile
+import json
+import os
+import pstats
+import resource
+import sys
+import time
+
+# JSON-lines output and the records of this run
+_output = None
+_records = []
+_depth = [0]
+
+def configure(filename=None):
+    """
+    Starts a new run, writing its metrics as JSON lines to filename, if
+    given.
+    """
+    global _output
+    if _output is not None:
+        _output.close()
+    _output = open(filename, 'a') if filename else None
+    del _records[:]
+
+def record(event, **fields):
+    """ Records a measurement of the given event. """
+    fields['event'] = event
+    fields['time'] = time.time()
+    _records.append(fields)
+
+    if _output is not None:
+        _output.write(json.dumps(fields, sort_keys=True) + '\n')
+        _output.flush()
+
+def _reset_peak_rss():
+    """ Resets the peak RSS of this process, if the kernel supports it. """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+def peak_rss():
+    """
+    Returns the peak resident set size of this process in megabytes, since
+    the last reset of the peak or since it started.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except (IOError, OSError):
+        pass
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on Mac OS X
+    if sys.platform == 'darwin':
+        return maxrss / (1024.0 * 1024.0)
+    return maxrss / 1024.0
+
+def children_peak_rss():
+    """
+    Returns the largest peak resident set size of the terminated child
+    processes, such as pool workers, in megabytes.
+    """
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == 'darwin':
+        return maxrss / (1024.0 * 1024.0)
+    return maxrss / 1024.0
+
+@contextmanager
+def stage(name):
+    """
+    Context manager timing a stage of the mining process. The peak RSS is
+    measured from the start of the outermost stage.
+    """
+    if not _depth[0]:
+        _reset_peak_rss()
+    _depth[0] += 1
+
+    start = time.time()
+    start_cpu = time.clock()
+    status = 'failed'
+    try:
+        yield
+        status = 'ok'
+    finally:
+        _depth[0] -= 1
+        record('stage', name=name, status=status,
+               seconds=time.time() - start,
+               cpu_seconds=time.clock() - start_cpu,
+               peak_rss_mb=peak_rss(),
+               children_peak_rss_mb=children_peak_rss())
+
+class Timer(object):
+    """ Accumulates the time spent in named steps. """
+    def __init__(self):
+        self.times = {}
+
+    @contextmanager
+    def __call__(self, step):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.times[step] = self.times.get(step, 0.0) + time.time() - start
+
+def article(name, times, terms=0, sentences=0, pid=None):
+    """
+    Records the processing of an article, given the seconds spent in each
+    step and the number of term occurrences and sentences found.
+    """
+    match = times.get('match', 0.0)
+    record('article', name=name, pid=pid or os.getpid(),
+           terms=terms, sentences=sentences,
+           terms_per_second=terms / match if match else None,
+           seconds=sum(times.values()),
+           **dict(('%s_seconds' % step, seconds)
+                      for step, seconds in times.iteritems()))
+
+def pool(name, processes, seconds, busy_seconds):
+    """
+    Records the utilization of a worker pool, the fraction of the available
+    worker time spent processing.
+    """
+    available = processes * seconds
+    record('pool', name=name, processes=processes, seconds=seconds,
+           busy_seconds=busy_seconds,
+           utilization=busy_seconds / available if available else None)
+
+def summary(out=None):
+    """
+    Prints a table of the stages, articles and pools recorded in this run.
+    """
+    if out is None:
+        out = sys.stdout
+
+    stages = [r for r in _records if r['event'] == 'stage']
+    if stages:
+        out.write("%-28s %8s %10s %10s %10s %7s\n" %
+                  ('stage', 'status', 'seconds', 'cpu', 'rss MB', 'kids MB'))
+        for r in stages:
+            out.write("%-28s %8s %10.2f %10.2f %10.1f %7.1f\n" %
+                      (r['name'][:28], r['status'], r['seconds'],
+                       r['cpu_seconds'], r['peak_rss_mb'],
+                       r['children_peak_rss_mb']))
+
+    articles = [r for r in _records if r['event'] == 'article']
+    if articles:
+        steps = sorted(set(key for r in articles for key in r
+                           if key.endswith('_seconds') and key != 'seconds'))
+        totals = dict((step, sum(r.get(step, 0.0) for r in articles))
+                      for step in steps)
+        terms = sum(r['terms'] for r in articles)
+        match = totals.get('match_seconds', 0.0)
+        slowest = max(articles, key=lambda r: r['seconds'])
+
+        out.write("\n%d articles, %d sentences, %d term occurrences\n" %
+                  (len(articles), sum(r['sentences'] for r in articles),
+                   terms))
+        for step in steps:
+            out.write("  %-20s %10.2f s\n" % (step[:-len('_seconds')],
+                                              totals[step]))
+        if match:
+            out.write("  %-20s %10.0f\n" % ('terms per second',
+                                            terms / match))
+        out.write("  %-20s %10.2f s (%s)\n" % ('slowest article',
+                                               slowest['seconds'],
+                                               slowest['name']))
+
+    for r in _records:
+        if r['event'] == 'pool':
+            out.write("\npool %s: %d processes, %.1f%% utilization\n" %
+                      (r['name'], r['processes'],
+                       100.0 * (r['utilization'] or 0.0)))
+
+def profile(filename, func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) under cProfile, saving the statistics to
+    filename and printing the most expensive calls. Returns the result of
+    func.
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(filename)
+        stats = pstats.Stats(filename)
+        stats.sort_stats('cumulative').print_stats(25)
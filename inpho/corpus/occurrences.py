@@ -0,0 +1,190 @@
+"""
+Module containing the binary occurrence file format of the InPhO data mining
+process.
+
+The text occurrence file has one line per sentence, holding the sep_dir of the
+article followed by the IDs of the terms occurring in the sentence. The binary
+format stores the same data in compressed sparse row form:
+
+    header          magic, version and the number of articles, sentences
+                    and term occurrences
+    terms           int32 term IDs of every sentence, concatenated
+    sentences       int64 offsets of each sentence into terms, plus the end
+    articles        int64 offsets of each article into sentences, plus the end
+    names           newline-separated sep_dirs of the articles
+
+All integers are little-endian and the arrays are aligned to 8 bytes, so that
+:class:`OccurrenceReader` can map them with :class:`numpy.memmap` instead of
+parsing the file.
+"""
+
+from itertools import chain
+import struct
+
+import numpy as np
+
+MAGIC = 'INPHOOCC'
+VERSION = 1
+
+_header = struct.Struct('<8s4q')
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+def is_binary(filename):
+    """ Checks if the file at filename is a binary occurrence file. """
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+class OccurrenceWriter(object):
+    """
+    Writer of binary occurrence files. Articles are written one at a time
+    with :meth:`write_article`, term IDs going straight to the file, and the
+    offsets and article names are written by :meth:`close`.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.f = open(filename, 'wb')
+        self.f.write(_header.pack(MAGIC, VERSION, 0, 0, 0))
+
+        self.articles = []
+        self.article_offsets = [0]
+        self.sentence_offsets = [np.zeros(1, dtype='<i8')]
+        self.n_sentences = 0
+        self.n_terms = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def write_article(self, article, sentences):
+        """
+        Writes the occurrences of an article, given as a list with the list
+        of term IDs of each sentence.
+        """
+        lengths = np.array([len(sentence) for sentence in sentences],
+                           dtype='<i8')
+        ids = np.fromiter(chain.from_iterable(sentences), dtype='<i4',
+                          count=int(lengths.sum()))
+        self.f.write(ids.tostring())
+
+        self.sentence_offsets.append(self.n_terms + np.cumsum(lengths))
+        self.n_terms += len(ids)
+        self.n_sentences += len(sentences)
+
+        self.articles.append(article)
+        self.article_offsets.append(self.n_sentences)
+
+    def close(self):
+        """ Writes the offsets, article names and header. """
+        if self.f.closed:
+            return
+
+        f = self.f
+        f.write('\0' * (_align(f.tell()) - f.tell()))
+        f.write(np.concatenate(self.sentence_offsets).astype('<i8').tostring())
+        f.write(np.array(self.article_offsets, dtype='<i8').tostring())
+        f.write('\n'.join(self.articles))
+
+        f.seek(0)
+        f.write(_header.pack(MAGIC, VERSION, len(self.articles),
+                             self.n_sentences, self.n_terms))
+        f.close()
+
+class OccurrenceReader(object):
+    """
+    Reader of binary occurrence files. The term IDs and offsets are exposed as
+    read-only arrays mapped from the file:
+
+    ``terms``
+        term IDs of every sentence, concatenated
+    ``sentence_offsets``
+        start of each sentence in ``terms``, followed by the end
+    ``article_offsets``
+        start of each article in ``sentence_offsets``, followed by the end
+    ``articles``
+        the sep_dir of each article
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            magic, version, n_articles, n_sentences, n_terms =\
+                _header.unpack(f.read(_header.size))
+            if magic != MAGIC:
+                raise ValueError("%s is not an occurrence file" % filename)
+            if version != VERSION:
+                raise ValueError("%s has unsupported version %d" %
+                                 (filename, version))
+
+            offset = _header.size
+            self.terms = self._map('<i4', offset, n_terms)
+            offset = _align(offset + 4 * n_terms)
+            self.sentence_offsets = self._map('<i8', offset, n_sentences + 1)
+            offset += 8 * (n_sentences + 1)
+            self.article_offsets = self._map('<i8', offset, n_articles + 1)
+            offset += 8 * (n_articles + 1)
+
+            f.seek(offset)
+            names = f.read()
+            self.articles = names.split('\n') if n_articles else []
+
+    def _map(self, dtype, offset, length):
+        if not length:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.filename, dtype=dtype, mode='r', offset=offset,
+                         shape=(length,))
+
+    def __len__(self):
+        return len(self.articles)
+
+    def article_terms(self, i):
+        """
+        Returns the term IDs and the sentence offsets, relative to the term
+        IDs, of the i-th article.
+        """
+        start, end = self.article_offsets[i], self.article_offsets[i + 1]
+        offsets = self.sentence_offsets[start:end + 1]
+        ids = self.terms[offsets[0]:offsets[-1]]
+        return ids, offsets - offsets[0]
+
+    def iterarticles(self):
+        """
+        Generates (sep_dir, ids, offsets) triples for every article, see
+        :meth:`article_terms`.
+        """
+        for i, article in enumerate(self.articles):
+            ids, offsets = self.article_terms(i)
+            yield article, ids, offsets
+
+    def __iter__(self):
+        """ Generates (sep_dir, ids) pairs for every sentence. """
+        for article, ids, offsets in self.iterarticles():
+            offsets = offsets.tolist()
+            for start, end in zip(offsets[:-1], offsets[1:]):
+                yield article, ids[start:end]
+
+    def export(self, filename):
+        """ Writes the occurrences to filename in the text format. """
+        with open(filename, 'w') as f:
+            for article, ids in self:
+                f.write('%s %s\n' % (article, ' '.join(map(str, ids.tolist()))))
+
+def convert(text_filename, binary_filename):
+    """ Converts a text occurrence file to the binary format. """
+    with open(text_filename) as f:
+        with OccurrenceWriter(binary_filename) as writer:
+            article = None
+            sentences = []
+            for line in f:
+                ids = line.split()
+                if ids[0] != article:
+                    if sentences:
+                        writer.write_article(article, sentences)
+                    article = ids[0]
+                    sentences = []
+                sentences.append([int(id) for id in ids[1:]])
+
+            if sentences:
+                writer.write_article(article, sentences)
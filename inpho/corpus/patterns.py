@@ -0,0 +1,46 @@
+"""
+Module containing the compiled form of the search patterns of a term, kept
+apart from the ORM so that the data mining can run without a database.
+"""
+
+import logging
+import re
+
+class CompiledPatterns(object):
+    """
+    Compiled form of an entity's search patterns, as used by the data mining.
+
+    Patterns containing alternation or grouping are compiled to regular
+    expressions. The literal forms of every pattern are kept both for document
+    level matching, which ignores word breaks, and sentence level matching,
+    which replaces them by spaces. Patterns which fail to compile are recorded
+    in ``failed`` and logged once, when the bundle is built.
+    """
+    def __init__(self, patterns, label=None, source=None, ID=None):
+        self.patterns = list(patterns)
+        self.label = label
+        self.source = source
+
+        self.regexes = []
+        self.literals = []
+        self.sentence_literals = []
+        self.failed = []
+
+        for pattern in self.patterns:
+            if '|' in pattern or '(' in pattern:
+                try:
+                    self.regexes.append(re.compile(pattern, re.IGNORECASE))
+                except re.error:
+                    logging.warning('Term %s (%s) pattern "%s" failed' % 
+                                    (ID, label, pattern))
+                    self.failed.append(pattern)
+                    continue
+
+            self.literals.append(pattern.replace('\\b', '').lower())
+            self.sentence_literals.append(pattern.replace('\\b', ' ').lower())
+
+    def __getstate__(self):
+        # the source collection is only used to detect stale bundles
+        state = self.__dict__.copy()
+        state['source'] = None
+        return state
@@ -0,0 +1,172 @@
+"""
+Module containing the staged runner of the InPhO data mining process.
+
+A :class:`Pipeline` is a graph of :class:`Stage` objects, each declaring the
+files it reads and the files it writes. Stages run in dependency order, and
+once a stage completes, the content hashes of its inputs and outputs are
+checkpointed to a manifest, and its metrics recorded with
+:func:`inpho.corpus.metrics.stage`. A later run skips every stage whose inputs,
+parameters and outputs still match the manifest, so that a failed run resumes
+after the last completed stage, and a stage whose inputs are unchanged is not
+run again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import os.path
+
+from inpho.corpus import metrics
+from inpho.corpus.cache import file_key
+
+def file_hash(filename):
+    """ Returns the SHA-1 hex digest of the contents of a file. """
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), ''):
+            sha.update(block)
+    return sha.hexdigest()
+
+class Stage(object):
+    """
+    Step of a :class:`Pipeline`, calling func(*args, **kwargs) to write the
+    outputs from the inputs. The arguments are part of the checkpoint, so they
+    should have a stable repr, such as filenames and flags.
+
+    Volatile stages, such as snapshots of the database, are run every time.
+    If their outputs are unchanged, the following stages are still skipped.
+    """
+    def __init__(self, name, func, inputs=(), outputs=(), args=(),
+                 kwargs=None, volatile=False):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.volatile = volatile
+
+    @property
+    def params(self):
+        return repr((self.func.__name__, self.args,
+                     sorted(self.kwargs.iteritems())))
+
+    def run(self):
+        return self.func(*self.args, **self.kwargs)
+
+class Pipeline(object):
+    """
+    Runner of a graph of stages, checkpointing completed stages to the JSON
+    manifest at manifest_filename.
+    """
+    def __init__(self, manifest_filename):
+        self.manifest_filename = manifest_filename
+        self.stages = []
+        self.hashes = {}
+
+        try:
+            with open(manifest_filename) as f:
+                self.manifest = json.load(f)
+        except (IOError, ValueError):
+            self.manifest = {}
+
+    def add(self, stage):
+        """ Adds a stage to the pipeline and returns it. """
+        self.stages.append(stage)
+        return stage
+
+    def order(self):
+        """
+        Returns the stages in dependency order, a stage following the stages
+        writing its inputs, and otherwise in the order they were added.
+        """
+        producers = {}
+        for stage in self.stages:
+            for output in stage.outputs:
+                producers[output] = stage
+
+        ordered = []
+        visiting = set()
+        def visit(stage):
+            if stage in ordered:
+                return
+            if stage in visiting:
+                raise ValueError("Cycle in pipeline at stage %s" % stage.name)
+            visiting.add(stage)
+            for input in stage.inputs:
+                if input in producers:
+                    visit(producers[input])
+            visiting.remove(stage)
+            ordered.append(stage)
+
+        for stage in self.stages:
+            visit(stage)
+        return ordered
+
+    def hash(self, filename):
+        """
+        Returns the content hash of a file, hashing it again only if its
+        modification time or size has changed during this run.
+        """
+        key = file_key(filename)
+        cached = self.hashes.get(filename)
+        if cached is None or cached[0] != key:
+            cached = self.hashes[filename] = (key, file_hash(filename))
+        return cached[1]
+
+    def save(self):
+        """ Writes the manifest. """
+        tmp_filename = '%s.%d.tmp' % (self.manifest_filename, os.getpid())
+        with open(tmp_filename, 'w') as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.rename(tmp_filename, self.manifest_filename)
+
+    def is_current(self, stage, inputs):
+        """
+        Checks if a stage has completed with the given input hashes and its
+        current parameters, and its outputs are unchanged since.
+        """
+        record = self.manifest.get(stage.name)
+        if stage.volatile or record is None:
+            return False
+        if record['inputs'] != inputs or record['params'] != stage.params:
+            return False
+        if sorted(record['outputs']) != sorted(stage.outputs):
+            return False
+
+        return all(os.path.exists(output) and self.hash(output) == digest
+                   for output, digest in record['outputs'].iteritems())
+
+    def run(self, force=False):
+        """
+        Runs every stage which is not current, or every stage if force is set.
+        """
+        for stage in self.order():
+            missing = [input for input in stage.inputs
+                           if not os.path.exists(input)]
+            if missing:
+                raise IOError("Missing input of stage %s: %s" %
+                              (stage.name, ', '.join(missing)))
+
+            inputs = dict((input, self.hash(input)) for input in stage.inputs)
+            if not force and self.is_current(stage, inputs):
+                print "skipping %s..." % stage.name
+                continue
+
+            print "running %s..." % stage.name
+            logging.info("running stage %s" % stage.name)
+
+            # a failed stage must not be taken as completed by the next run
+            if self.manifest.pop(stage.name, None) is not None:
+                self.save()
+
+            with metrics.stage(stage.name):
+                stage.run()
+
+            self.manifest[stage.name] = {
+                'inputs': inputs,
+                'outputs': dict((output, self.hash(output))
+                                    for output in stage.outputs),
+                'params': stage.params}
+            self.save()
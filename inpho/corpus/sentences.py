@@ -0,0 +1,126 @@
+"""
+Module containing the sentence segmentation for the InPhO data mining process.
+
+Constructing a Punkt tokenizer from a document retrains the Punkt parameters on
+that document before splitting it. Instead, the parameters can be trained once
+on the whole SEP corpus with :func:`train_tokenizer()` and pickled under the
+corpus data path, from which :func:`get_tokenizer()` loads them once per
+process. Sentence boundaries are cached per article by :class:`SpanCache`, so
+that re-mining an unchanged corpus does not pay for segmentation again.
+"""
+
+import cPickle as pickle
+import logging
+import os
+import os.path
+
+# http://nltk.googlecode.com/svn/trunk/doc/api/nltk.tokenize.punkt.PunktSentenceTokenizer-class.html
+from nltk.tokenize.punkt import PunktSentenceTokenizer as Tokenizer
+from nltk.tokenize.punkt import PunktTrainer
+
+import inpho.corpus
+from inpho.corpus.cache import ArticleCache
+
+# default location of the pickled Punkt parameters
+params_filename = os.path.join(inpho.corpus.sentence_path, 'punkt.pickle')
+
+def train_tokenizer(documents, filename=None):
+    """
+    Trains the Punkt parameters on an iterable of documents and pickles them
+    to filename, defaulting to :data:`params_filename`. Returns a tokenizer
+    using the trained parameters.
+    """
+    if filename is None:
+        filename = params_filename
+
+    trainer = PunktTrainer()
+    for document in documents:
+        trainer.train(document, finalize=False)
+    trainer.finalize_training()
+
+    params = trainer.get_params()
+    with open(filename, 'wb') as f:
+        pickle.dump(params, f, pickle.HIGHEST_PROTOCOL)
+
+    return Tokenizer(params)
+
+# tokenizer shared by every article processed in this process
+_tokenizer = None
+_tokenizer_version = None
+
+def get_tokenizer(filename=None):
+    """
+    Returns the pre-trained tokenizer, loading the pickled parameters once per
+    process. Returns None if no parameters have been trained.
+
+    Loading the tokenizer before creating a multiprocessing Pool shares it with
+    all of the worker processes.
+    """
+    global _tokenizer, _tokenizer_version
+
+    if filename is None:
+        filename = params_filename
+
+    if _tokenizer is None and os.path.exists(filename):
+        logging.info("loading Punkt parameters from %s" % filename)
+        with open(filename, 'rb') as f:
+            _tokenizer = Tokenizer(pickle.load(f))
+        _tokenizer_version = os.path.getmtime(filename)
+
+    return _tokenizer
+
+def get_tokenizer_version():
+    """
+    Returns a version stamp for the tokenizer returned by
+    :func:`get_tokenizer()`, or None if documents are tokenized with
+    parameters trained on the document itself.
+    """
+    get_tokenizer()
+    return _tokenizer_version
+
+def sentence_spans(document, tokenizer=None):
+    """
+    Returns a list of (start, end) offsets of the sentences in the document.
+    Uses the pre-trained tokenizer if available, otherwise trains the Punkt
+    parameters on the document.
+    """
+    if tokenizer is None:
+        tokenizer = get_tokenizer()
+    if tokenizer is None:
+        tokenizer = Tokenizer(document)
+
+    return list(tokenizer.span_tokenize(document))
+
+class SpanCache(ArticleCache):
+    """
+    Cache of sentence boundary offsets, stored as one pickle per article under
+    the corpus sentence data path.
+
+    Entries are keyed by sep_dir and the mtime of the article file. The length
+    of the document and the tokenizer version are checked as well, so that
+    changes to the body extraction or the Punkt parameters invalidate the
+    cache.
+    """
+    suffix = '.spans'
+
+    def __init__(self, path=None):
+        if path is None:
+            path = inpho.corpus.sentence_path
+        super(SpanCache, self).__init__(path)
+
+    def key(self, mtime, document):
+        """ Returns the cache key for a document. """
+        return (mtime, len(document), get_tokenizer_version())
+
+    def spans(self, sep_dir, mtime, document):
+        """
+        Returns the sentence spans for the article, segmenting the document
+        only if the cache is missing or stale.
+        """
+        key = self.key(mtime, document)
+        spans = self.get(sep_dir, key)
+        if spans is None:
+            spans = sentence_spans(document)
+            self.set(sep_dir, key, spans)
+
+        return spans
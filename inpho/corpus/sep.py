@@ -1,19 +1,34 @@
 from collections import defaultdict
+import cPickle as pickle
 import csv
+from itertools import izip
+import json
 import logging
-from multiprocessing import Pool
+from multiprocessing import Pool, cpu_count
 import os.path
-import re
 import subprocess
+import time
 
 from BeautifulSoup import BeautifulSoup
 from sqlalchemy.orm import subqueryload
 from sqlalchemy import and_, or_, not_
 
 from inpho import config
-from inpho.corpus.fuzzymatch import fuzzymatch_all as fuzzymatch
+from inpho.corpus.fuzzymatch import get_index
+from inpho.corpus.cache import BodyCache, file_key
+from inpho.corpus import entries, metrics
+from inpho.corpus.extract import extract_body
+from inpho.corpus.incremental import MiningCounts, contributions
+from inpho.corpus.matcher import TermMatcher
+from inpho.corpus.occurrences import OccurrenceReader, OccurrenceWriter
+from inpho.corpus.pipeline import Pipeline, Stage
+from inpho.corpus.sentences import SpanCache, get_tokenizer
+import inpho.corpus.sentences
+import inpho.corpus.terms
 import inpho.corpus.stats as dm
 from inpho.model import Idea, Thinker, Entity, Session 
+from inpho.model import idea_graph_edges_table, thinker_graph_edges_table,\
+    idea_thinker_graph_edges_table
 import HTMLParser
 
 def getStyleBibliography(biblioList):
@@ -35,33 +50,32 @@ def extract_article_body(filename):
     Extracts the article body from the SEP article at the given filename. Some
     error handling is done to guarantee that this function returns at least the
     empty string. Check the error log.
+
+    The body is extracted by streaming the parse events of the article through
+    an :class:`inpho.corpus.extract.ArticleBodyParser`, which yields the same
+    text as :func:`inpho.corpus.extract.extract_body_soup`.
     """
-    f = open(filename)
-    doc = f.read()
-    soup = BeautifulSoup(doc, convertEntities=["xml", "html"])
-
-    # rip out bibliography
-    biblio_root = soup.findAll('h2', text='Bibliography')
-    if biblio_root:
-        biblio_root = biblio_root[-1].findParent('h2')
-        if biblio_root:
-            biblio = [biblio_root]
-            biblio.extend(biblio_root.findNextSiblings())
-            biblio = [elm.extract() for elm in biblio]
-        else:
-            logging.error('Could not extract bibliography from %s' % filename)
+    return extract_body(filename)
 
-    # grab modified body 
-    body = soup.find("div", id="aueditable")
-    if body is not None:
-        # remove HTML escaped characters
-        body = re.sub("&\w+;", "", body.text)
-    
-        return body
-    else:
-        logging.error('Could not extract text from %s' % filename)
+def article_body(sep_dir, filename=None):
+    """
+    Returns the extracted body of the given article. Bodies are read from the
+    :class:`inpho.corpus.cache.BodyCache` and only re-extracted when the
+    article has changed since it was cached.
+    """
+    if filename is None:
+        filename = article_path(sep_dir)
+
+    cache = BodyCache()
+    key = cache.key(sep_dir, filename)
+
+    body = cache.get(sep_dir, key)
+    if body is None:
+        body = extract_article_body(filename)
+        cache.set(sep_dir, key, body)
+
+    return body
 
-        return ''
 def extract_bibliography(filename):
 	f = open(filename)
         doc = f.read()
@@ -78,20 +92,57 @@ def extract_bibliography(filename):
         return bib
 
 def article_path(sep_dir):
-    if pending(sep_dir):
-        corpus_root = config.get('corpus', 'edit_path')
-        path = os.path.join(corpus_root, sep_dir, 'index.html')
-    elif published(sep_dir):
-        corpus_root = config.get('corpus', 'path')
-        path = os.path.join(corpus_root, sep_dir, 'index.html')
-    elif copy_edit(sep_dir):
-        corpus_root = config.get('corpus', 'edit_path')
-        path = os.path.join(corpus_root, sep_dir, 'index.html')
-        logging.info('Processing unpublished article ' + sep_dir)
-    else:
-        path = ''
+    return article_paths([sep_dir])[sep_dir]
 
-    return path
+def article_paths(sep_dirs):
+    """
+    Returns a dictionary of { sep_dir : path } pairs, resolving the status of
+    every article in one batch. The path is the empty string for articles
+    which are neither pending, published nor in copy edit.
+    """
+    paths = {}
+    for sep_dir, status in article_statuses(sep_dirs).iteritems():
+        is_pending, is_published, is_copy_edit = status
+        if is_pending:
+            corpus_root = config.get('corpus', 'edit_path')
+            path = os.path.join(corpus_root, sep_dir, 'index.html')
+        elif is_published:
+            corpus_root = config.get('corpus', 'path')
+            path = os.path.join(corpus_root, sep_dir, 'index.html')
+        elif is_copy_edit:
+            corpus_root = config.get('corpus', 'edit_path')
+            path = os.path.join(corpus_root, sep_dir, 'index.html')
+            logging.info('Processing unpublished article ' + sep_dir)
+        else:
+            path = ''
+        paths[sep_dir] = path
+
+    return paths
+
+def article_statuses(sep_dirs, db_root=None, log_root=None):
+    """
+    Returns a dictionary of { sep_dir : (pending, published, copy_edit) }
+    pairs. pubpending.txt is read once and the log of each article is scanned
+    once for all status codes. Articles whose log cannot be read are reported
+    with no status.
+    """
+    pubpending = entries.get_pubpending(db_root).sep_dirs
+
+    statuses = {}
+    for sep_dir in sep_dirs:
+        try:
+            log = entries.get_log(sep_dir, log_root)
+        except IOError:
+            logging.warning('Could not read log of %s' % sep_dir)
+            log = None
+
+        if log is None:
+            statuses[sep_dir] = (sep_dir in pubpending, False, False)
+        else:
+            statuses[sep_dir] = (sep_dir in pubpending, 
+                                 log.has_status('eP'), log.has_status('eq'))
+
+    return statuses
 
 def published(sep_dir, log_root=None):
     """
@@ -111,93 +162,41 @@ def pending(sep_dir, db_root=None):
     Checks if the given article is in the list of 
     pending publications.
     """
-    if db_root is None:
-        db_root = config.get('corpus', 'db_path')
-
-    pubpending = os.path.join(db_root, 'pubpending.txt')
-    with open(pubpending) as db:
-        for line in db:
-            if sep_dir == line.strip():
-                return True
-
-    return False
+    return sep_dir in entries.get_pubpending(db_root).sep_dirs
 
 def get_status_code(sep_dir, code, log_root=None):
     """
     Checks if the given article has the given status code.
     """
-    if log_root is None:
-        log_root = config.get('corpus', 'log_path')
-
-    log_path = os.path.join(log_root, sep_dir)
-    if os.path.exists(log_path):
-        with open(log_path) as log:
-            for line in log:
-                #use the published flag 
-                if ('::' + code) in line:
-                    return True
-
-    return False
+    log = entries.get_log(sep_dir, log_root)
+    return log is not None and log.has_status(code)
 
 def get_titles():
     """
     Returns a dictionary of { sep_dir : title } pairs.
     """
-    entries = os.path.join(config.get('corpus', 'db_path'), 'entries.txt')
-    
-    titles = {}
-    with open(entries) as f:
-        for line in f:
-            sep_dir, title, rest = line.split('::', 2)
-            title = title.replace(r"\'", "'")
-            titles[sep_dir] = title
-
-    return titles
+    return dict(entries.get_entries().titles)
 
 def get_categories():
     """
     Returns a dictionary of { sep_dir : title } pairs.
     """
-    entries = os.path.join(config.get('corpus', 'db_path'), 'entries.txt')
-    
-    categories = {}
-    with open(entries) as f:
-        for line in f:
-            sep_dir, rest = line.split('::', 1)
-            category = line.split('::')[-3]
-            category = category.replace(r"\'", "'")
-            categories[sep_dir] = category
-
-    return categories 
+    return dict(entries.get_entries().categories)
 
 def get_related():
     """
     Returns a dictionary of { sep_dir : related } pairs.
     """
-    entries = os.path.join(config.get('corpus', 'db_path'), 'related_entries.txt')
-    
-    related = {}
-    with open(entries) as f:
-        f.readline()
-        for line in f:
-            sep_dir, rest = line.split('::', 1)
-            related[sep_dir] = rest.split('|')
-
-    return related
+    return dict(entries.get_related().related)
 
 def get_title(sep_dir):
     """
     Returns the title for the given sep_dir
     """
-    entries = os.path.join(config.get('corpus', 'db_path'), 'entries.txt')
-    
-    with open(entries) as f:
-        for line in f:
-            dir, title, rest = line.split('::', 2)
-            if dir == sep_dir:
-                return title.replace(r"\'", "'")
-
-    raise KeyError("Invalid sep_dir")
+    try:
+        return entries.get_entries().titles[sep_dir]
+    except KeyError:
+        raise KeyError("Invalid sep_dir")
 
 def new_entries():
     """
@@ -206,23 +205,20 @@ def new_entries():
 
     # get list of all entries in database
     sep_dirs = Session.query(Entity.sep_dir).filter(Entity.sep_dir!='').all()
-    sep_dirs = [row[0] for row in sep_dirs]
+    sep_dirs = set(row[0] for row in sep_dirs)
 
-    # get list of all entries in the SEP database
-    entries = os.path.join(config.get('corpus', 'db_path'), 'entries.txt')
+    # build list of new entries from all entries in the SEP database,
+    # entries whose logs cannot be read have no status and are skipped
+    candidates = [sep_dir for sep_dir in entries.get_entries().sep_dirs
+                      if sep_dir not in sep_dirs]
+    statuses = article_statuses(candidates)
 
-    # build list of new entries
     new_sep_dirs = []
-    with open(entries) as f:
-        for line in f:
-            sep_dir = line.split('::', 1)[0]
-            try:
-                if sep_dir not in sep_dirs and copy_edit(sep_dir):
-                    # published entry not in database, add to list of entries
-                    new_sep_dirs.append(sep_dir)
-            except IOError:
-                # skip IOErrors, as these indicate potential entries w/o logs
-                continue
+    for sep_dir in candidates:
+        is_pending, is_published, is_copy_edit = statuses[sep_dir]
+        if is_copy_edit:
+            # published entry not in database, add to list of entries
+            new_sep_dirs.append(sep_dir)
 
     # remove the sample entry
     try:
@@ -265,43 +261,129 @@ def unescape(s):
         es = u""
     return es.join(list)
 
-def fuzzymatch_new():
+def entry_title(title):
+    """
+    Returns a UTF-8 title of entries.txt as unicode, with its character
+    references resolved.
+    """
+    if '&#' in title:
+        title = unescape(title)
+    return title.decode('utf8')
+
+def write_fuzzymatches(filename, matches, labels):
+    """
+    Writes the (ID, confidence) pairs of matches as a CSV file of entity ID,
+    label and confidence rows.
+    """
+    with open(filename, 'wb') as f:
+        writer = csv.writer(f)
+        for ID, prob in matches:
+            writer.writerow([ID, unidecode(labels[ID]), prob])
+
+def load_scored(filename):
+    """
+    Returns the set of (sep_dir, title, version) triples recorded by
+    :func:`fuzzymatch_new()` in the JSON-lines file filename.
+    """
+    scored = set()
+    try:
+        with open(filename) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # line cut short by an interrupted run
+                    continue
+                scored.add((record['sep_dir'], record['title'],
+                            record['version']))
+    except IOError:
+        pass
+    return scored
+
+# candidate index shared by the worker processes of fuzzymatch_new
+_fuzzy_index = None
+
+def init_fuzzy_worker(index):
     """
-    Writes the fuzzymatch data to the cache specified in the config file.
+    Initializer for the worker processes of :func:`fuzzymatch_new()`, storing
+    the candidate index of the entity labels.
     """
-    fuzzy_path = config.get('corpus', 'fuzzy_path')
-    titles = get_titles()
-    for entry in new_entries():
-        print entry
-        if '&#' in titles[entry]:
-            print unescape(titles[entry])
-            matches = fuzzymatch(unescape(titles[entry]).decode('utf8'))
+    global _fuzzy_index
+    _fuzzy_index = index
+
+def fuzzy_wrapper(args):
+    """
+    Wrapper function for fuzzymatching, taking a (sep_dir, title) pair for
+    multiprocessing support.
+    """
+    sep_dir, title = args
+    return sep_dir, _fuzzy_index.match(title)
+
+def fuzzymatch_new(sep_dirs=None, processes=None, force=False):
+    """
+    Writes the fuzzymatches of the given entries, defaulting to the new
+    entries, to the fuzzy data path, one CSV file per entry.
+
+    Titles are scored in parallel against the candidate index of the entity
+    labels, see :class:`inpho.corpus.fuzzymatch.CandidateIndex`, and each file
+    is written as soon as its entry completes. Every scored entry is
+    recorded in scored.txt with its title and the version of the entity set,
+    and skipped by later runs until either changes, unless force is set.
+    """
+    titles = entries.get_entries().titles
+    if sep_dirs is None:
+        sep_dirs = new_entries()
+
+    index = get_index()
+    Session.close()
+    labels = index.labels
+    version = index.version
+
+    scored_filename = os.path.join(inpho.corpus.fuzzy_path, 'scored.txt')
+    scored = set() if force else load_scored(scored_filename)
+
+    todo = []
+    for sep_dir in sep_dirs:
+        title = entry_title(titles[sep_dir])
+        filename = os.path.join(inpho.corpus.fuzzy_path, sep_dir)
+        if (sep_dir, title, version) in scored and\
+                os.path.exists(filename):
+            print "skipping %s" % sep_dir
         else:
-            matches = fuzzymatch(titles[entry])
-        with open(os.path.join(fuzzy_path, entry), 'wb') as f:
-            writer = csv.writer(f)
-            for match, prob in matches:
-                writer.writerow([match.ID, unidecode(match.label), prob])
-        
+            todo.append((sep_dir, title))
+    titles = dict(todo)
 
-def single_fuzz(entry):
-    fuzzy_path = config.get('corpus', 'fuzzy_path')
-    titles = get_titles()
-    print titles[entry]
-    if '&#' in titles[entry]:
-        print unescape(titles[entry])
-        matches = fuzzymatch(unescape(titles[entry]).decode('utf8'))
+    if len(todo) > 1:
+        p = Pool(processes, initializer=init_fuzzy_worker, initargs=(index,))
+        results = p.imap_unordered(fuzzy_wrapper, todo)
     else:
-        matches = fuzzymatch(titles[entry])
-    with open(os.path.join(fuzzy_path, entry), 'wb') as f:
-        writer = csv.writer(f)
-        for match, prob in matches:
-            writer.writerow([match.ID, unidecode(match.label), prob])
+        p = None
+        init_fuzzy_worker(index)
+        results = (fuzzy_wrapper(args) for args in todo)
+
+    with open(scored_filename, 'a') as scored_file:
+        for sep_dir, matches in results:
+            print sep_dir
+            write_fuzzymatches(os.path.join(inpho.corpus.fuzzy_path, sep_dir),
+                               matches, labels)
+            scored_file.write(json.dumps({'sep_dir': sep_dir,
+                                          'title': titles[sep_dir],
+                                          'version': version}) + '\n')
+            scored_file.flush()
+
+    if p is not None:
+        p.close()
+        p.join()
+
+def single_fuzz(entry):
+    fuzzymatch_new([entry], force=True)
 
 
 def select_terms(entity_type=Idea):
     """
-    Returns a list of all terms of a given entity type.
+    Returns a list of all terms of a given entity type. The mining functions
+    use the lightweight records of :func:`inpho.corpus.terms.select_terms()`
+    instead.
     """
 
     # process entities
@@ -312,83 +394,243 @@ def select_terms(entity_type=Idea):
     return ideas.all()
      
 
+def select_articles():
+    """
+    Returns a list of the sep_dirs of all articles with an InPhO Entity.
+    """
+    articles = Session.query(Entity.sep_dir).filter(Entity.sep_dir!=None)
+    articles = articles.filter(Entity.sep_dir!='')
+    articles = articles.distinct().all()
+    return [a[0] for a in articles]
+
+def train_tokenizer(articles=None):
+    """
+    Trains the Punkt sentence tokenizer on the bodies of the given articles,
+    defaulting to every article in the corpus. The parameters are saved to
+    :data:`inpho.corpus.sentences.params_filename` and used by all
+    subsequent mining runs.
+    """
+    if articles is None:
+        articles = select_articles()
+        Session.close()
+
+    paths = article_paths(articles)
+
+    def documents():
+        for article in articles:
+            filename = paths[article]
+            if filename and os.path.isfile(filename):
+                yield article_body(article, filename)
+
+    return inpho.corpus.sentences.train_tokenizer(documents())
+
+def warm_article(article, filename=None):
+    """
+    Extracts the body of a single article into the body cache. Returns the
+    sep_dir if the article was found.
+    """
+    if filename is None:
+        filename = article_path(article)
+    if filename and os.path.isfile(filename):
+        article_body(article, filename)
+        return article
+    else:
+        logging.warning("BAD SEP_DIR: %s" % article)
+
+def warm_wrapper(args):
+    """
+    Wrapper function for :func:`warm_article()`, taking a (sep_dir, filename)
+    pair for multiprocessing support.
+    """
+    return warm_article(*args)
+
+def warm_cache(articles=None):
+    """
+    Populates the body cache for the given articles, defaulting to every
+    article in the corpus, so that subsequent mining runs only extract the
+    articles changed since.
+    """
+    if articles is None:
+        articles = select_articles()
+        Session.close()
+
+    paths = article_paths(articles)
+
+    p = Pool()
+    warmed = p.map(warm_wrapper,
+                   [(article, paths[article]) for article in articles])
+    p.close()
+
+    return [article for article in warmed if article]
+
 def process_article(article, terms=None, entity_type=Idea, output_filename=None,
-                    corpus_root='corpus/'):
+                    corpus_root='corpus/', matcher=None, single_pass=False,
+                    filename=None, binary=False, timer=None):
     """
-    Processes a single article for apriori input.
+    Processes a single article for apriori input. A prebuilt
+    :class:`TermMatcher` for terms may be passed to avoid recompiling the
+    search patterns for every article. If single_pass is set, sentence
+    occurrences are located from the document scan, see
+    :func:`inpho.corpus.stats.get_sentence_occurrences()`. The path of the
+    article is resolved from its status, unless given as filename.
+
+    The time spent extracting the body, finding the sentences and matching
+    the terms is added to the given :class:`inpho.corpus.metrics.Timer`.
+
+    Returns the lines of the text occurrence file, or the list of term IDs of
+    each sentence if binary is set.
     """
     if terms is None:
-        terms = select_terms(entity_type)
+        terms = inpho.corpus.terms.select_terms(entity_type)
     
 
     lines = []
+    if timer is None:
+        timer = metrics.Timer()
 
-    filename = article_path(article)
-    article_terms = Session.query(entity_type)
-    article_terms = article_terms.filter(entity_type.sep_dir==article)
-    article_terms = article_terms.all()
+    if filename is None:
+        filename = article_path(article)
     if filename and os.path.isfile(filename):
         logging.info("processing: %s %s" % (article, filename))
-        doc = extract_article_body(filename)
-        lines = dm.occurrences(doc, terms, title=article,
-                               remove_overlap=False,
-                               format_for_file=True,
-                               output_filename=output_filename)
+        with timer('parse'):
+            doc = article_body(article, filename)
+        with timer('sentences'):
+            spans = SpanCache().spans(article, os.path.getmtime(filename), doc)
+        with timer('match'):
+            lines = dm.occurrences(doc, terms, title=article,
+                                   remove_overlap=False,
+                                   format_for_file=not binary,
+                                   output_filename=output_filename,
+                                   matcher=matcher,
+                                   single_pass=single_pass,
+                                   spans=spans)
+        if binary:
+            lines = [[term.ID for term in sentence] for sentence in lines]
     else:
         logging.warning("BAD SEP_DIR: %s" % article)
 
     return lines
 
-def process_wrapper(args):
+# term matcher, article paths and options shared by the worker processes of
+# process_articles
+_matcher = None
+_paths = {}
+_options = {}
+
+def init_worker(matcher, paths=None, options=None):
+    """
+    Initializer for the worker processes of :func:`process_articles()`. Stores
+    the term matcher, so it is built and sent to each worker once per run
+    instead of once per article, the article paths resolved by
+    :func:`article_paths()` and the keyword arguments of
+    :func:`process_article()`.
+    """
+    global _matcher, _paths, _options
+    _matcher = matcher
+    _paths = paths or {}
+    _options = options or {}
+
+def process_wrapper(article):
     """
     Wrapper function for article processing. Necessary for multiprocessing
     module support. See: http://docs.python.org/library/multiprocessing.html#multiprocessing.pool.multiprocessing.Pool.map
     """
-    return process_article(*args)
+    start = time.time()
+    timer = metrics.Timer()
+    lines = process_article(article, _matcher.terms, matcher=_matcher,
+                            filename=_paths.get(article), timer=timer,
+                            **_options)
+    return article, lines, (os.getpid(), timer.times, time.time() - start)
 
 def process_articles(entity_type=Entity, output_filename='output-all.txt',
-                     corpus_root='corpus/'):
-    terms = select_terms(entity_type)
+                     corpus_root='corpus/', single_pass=False, ordered=False,
+                     chunksize=None, terms=None, binary=False):
+    """
+    Processes every article for apriori input, writing the occurrences to
+    output_filename. Articles are dispatched to the worker processes in
+    chunks of chunksize, and the lines of each article are written as soon
+    as it completes. If ordered is set, the articles are written in the order
+    of :func:`select_articles()`, otherwise in order of completion. If binary
+    is set, the occurrences are written in the binary format of
+    :mod:`inpho.corpus.occurrences`.
+
+    Terms are selected as :class:`inpho.corpus.terms.Term` records, unless a
+    list of records is given, such as one loaded with
+    :func:`inpho.corpus.terms.load_terms()`.
+    """
+    if terms is None:
+        terms = inpho.corpus.terms.select_terms(entity_type)
+    matcher = TermMatcher(terms)
     
-    Session.expunge_all()
     Session.close()
     
-    articles = Session.query(Entity.sep_dir).filter(Entity.sep_dir!=None)
-    articles = articles.filter(Entity.sep_dir!='')
-    articles = articles.distinct().all()
-    articles = [a[0] for a in articles]
+    articles = select_articles()
    
+    # resolve the status of every article at once
+    paths = article_paths(articles)
+
+    # load the pre-trained sentence tokenizer, shared with the workers
+    get_tokenizer()
+
+    processes = cpu_count()
+    if chunksize is None:
+        # same heuristic as Pool.map
+        chunksize = max(1, len(articles) // (processes * 4))
+
     # parallel processing of articles
-    p = Pool()
-    args = [(title, terms, entity_type, None, corpus_root) for title in articles]
-    doc_lines = p.map(process_wrapper, args)
-    p.close()
+    options = dict(entity_type=entity_type, corpus_root=corpus_root,
+                   single_pass=single_pass, binary=binary)
+    start = time.time()
+    p = Pool(processes, initializer=init_worker,
+             initargs=(matcher, paths, options))
+    if ordered:
+        doc_lines = p.imap(process_wrapper, articles, chunksize)
+    else:
+        doc_lines = p.imap_unordered(process_wrapper, articles, chunksize)
 
     #serial processing for tests
     '''
-    doc_lines = []
-    for title in articles:
-        lines = process_article(title, terms, entity_type, None, corpus_root)
-        doc_lines.append(lines)
+    init_worker(matcher, paths, options)
+    doc_lines = (process_wrapper(title) for title in articles)
     '''
 
-    # write graph output to file
+    # write graph output to file as articles complete
     print output_filename
-    with open(output_filename, 'w') as f:
-        for lines in doc_lines:
-            f.writelines(lines)
+    busy = [0.0]
+    def measured(doc_lines):
+        for article, lines, (pid, times, seconds) in doc_lines:
+            if binary:
+                n_terms = sum(len(sentence) for sentence in lines)
+            else:
+                n_terms = sum(len(line.split()) - 1 for line in lines)
+            metrics.article(article, times, terms=n_terms,
+                            sentences=len(lines), pid=pid)
+            busy[0] += seconds
+            yield article, lines
+
+    with metrics.stage('process_articles'):
+        if binary:
+            with OccurrenceWriter(output_filename) as writer:
+                for article, sentences in measured(doc_lines):
+                    if sentences:
+                        writer.write_article(article, sentences)
+        else:
+            with open(output_filename, 'w') as f:
+                for article, lines in measured(doc_lines):
+                    f.writelines(lines)
+
+        p.close()
+        p.join()
+
+    metrics.pool('process_articles', processes, time.time() - start, busy[0])
 
 def filter_apriori_input(occur_filename, output_filename, entity_type=Idea,
                          doc_terms=None):
     #select terms
-    terms = select_terms(entity_type)
-    Session.expunge_all()
+    terms = inpho.corpus.terms.select_terms(entity_type)
     Session.close()
 
-    lines = dm.prepare_apriori_input(occur_filename, terms, doc_terms)
-    
-    with open(output_filename, 'w') as f:
-        f.writelines(lines)
+    dm.write_apriori_input(occur_filename, output_filename, terms, doc_terms)
 
 def doc_terms_list():
     articles = Session.query(Entity)
@@ -405,56 +647,244 @@ def doc_terms_list():
 
 def complete_mining(entity_type=Idea, filename='graph.txt', root='./',
                     corpus_root='corpus/', update_entropy=False,
-                    update_occurrences=False, update_db=False): 
-    occur_filename = os.path.abspath(root + "occurrences.txt")
-    graph_filename = os.path.abspath(root + "graph-" + filename)
-    edge_filename = os.path.abspath(root + "edge-" + filename)
-    sql_filename = os.path.abspath(root + "sql-" + filename)
+                    update_occurrences=False, update_db=False,
+                    single_pass=False, ordered=False, binary=False,
+                    miner='apriori', save_counts=False, force=False): 
+    """
+    Mines the graph of an entity type, running the stages of
+    :func:`mining_pipeline()` whose inputs have changed since the last run,
+    or every stage if force is set.
+    """
+    pipeline = mining_pipeline([(entity_type, filename)], root=root,
+                               corpus_root=corpus_root,
+                               update_entropy=update_entropy,
+                               update_occurrences=update_occurrences,
+                               update_db=update_db, single_pass=single_pass,
+                               ordered=ordered, binary=binary, miner=miner,
+                               save_counts=save_counts)
+    pipeline.run(force)
+
+def mining_pipeline(graphs, root='./', corpus_root='corpus/',
+                    update_entropy=False, update_occurrences=False,
+                    update_db=False, single_pass=False, ordered=False,
+                    binary=False, miner='apriori', save_counts=False):
+    """
+    Returns the :class:`inpho.corpus.pipeline.Pipeline` mining the graph of
+    each (entity type, filename) pair in graphs, checkpointed to
+    pipeline.json under root. The graphs share the snapshot of the document
+    terms and, if update_occurrences is set, one occurrence extraction over
+    the terms of every entity type. The entropies of the first graph are
+    used if update_entropy is set.
+
+    Unordered occurrence files differ from run to run, so that stages
+    following the extraction are only skipped if ordered is set.
+    """
+    def path(name):
+        return os.path.abspath(root + name)
 
-    doc_terms = doc_terms_list()
+    if binary:
+        occur_filename = path("occurrences.bin")
+    else:
+        occur_filename = path("occurrences.txt")
+    doc_terms_filename = path("doc-terms.pickle")
+
+    pipeline = Pipeline(path("pipeline.json"))
+    pipeline.add(Stage('doc-terms', save_doc_terms_snapshot,
+                       outputs=[doc_terms_filename],
+                       args=(doc_terms_filename,), volatile=True))
 
     if update_occurrences:
-        print "processing articles..."
-        process_articles(entity_type, occur_filename, corpus_root=corpus_root)
+        corpus_filename = path("corpus.txt")
+        occur_terms_filename = path("terms-occurrences.pickle")
+        pipeline.add(Stage('corpus', save_corpus_snapshot,
+                           outputs=[corpus_filename],
+                           args=(corpus_filename,), volatile=True))
+        pipeline.add(Stage('terms-occurrences', save_terms_snapshot,
+                           outputs=[occur_terms_filename],
+                           args=(Entity, occur_terms_filename),
+                           volatile=True))
+        pipeline.add(Stage('occurrences', extract_occurrences,
+                           inputs=[corpus_filename, occur_terms_filename],
+                           outputs=[occur_filename],
+                           args=(occur_terms_filename, occur_filename),
+                           kwargs=dict(corpus_root=corpus_root,
+                                       single_pass=single_pass,
+                                       ordered=ordered, binary=binary)))
+
+    for i, (entity_type, filename) in enumerate(graphs):
+        terms_filename = path("terms-" + filename + ".pickle")
+        graph_filename = path("graph-" + filename)
+        edge_filename = path("edge-" + filename)
+        sql_filename = path("sql-" + filename)
+        entropy_filename = path("entropy-" + filename + ".pickle")
+        counts_filename = path("counts-" + filename)
+
+        pipeline.add(Stage('terms-' + filename, save_terms_snapshot,
+                           outputs=[terms_filename],
+                           args=(entity_type, terms_filename), volatile=True))
+        pipeline.add(Stage('graph-' + filename, filter_occurrences,
+                           inputs=[occur_filename, terms_filename,
+                                   doc_terms_filename],
+                           outputs=[graph_filename],
+                           args=(occur_filename, graph_filename,
+                                 terms_filename, doc_terms_filename)))
+        pipeline.add(Stage('edge-' + filename, mine_edges,
+                           inputs=[graph_filename],
+                           outputs=[edge_filename],
+                           args=(graph_filename, edge_filename, miner)))
+        pipeline.add(Stage('sql-' + filename, weigh_edges,
+                           inputs=[graph_filename, edge_filename,
+                                   occur_filename, doc_terms_filename],
+                           outputs=[sql_filename, entropy_filename],
+                           args=(graph_filename, edge_filename,
+                                 occur_filename, doc_terms_filename,
+                                 sql_filename, entropy_filename)))
+
+        if save_counts:
+            pipeline.add(Stage('counts-' + filename, save_mining_counts,
+                               inputs=[occur_filename, terms_filename,
+                                       doc_terms_filename],
+                               outputs=[counts_filename],
+                               args=(occur_filename, terms_filename,
+                                     doc_terms_filename, counts_filename)))
+
+        if update_entropy and i == 0:
+            pipeline.add(Stage('update-entropy-' + filename,
+                               update_entropy_snapshot,
+                               inputs=[entropy_filename],
+                               args=(entropy_filename,)))
+
+        if update_db:
+            pipeline.add(Stage('update-db-' + filename, update_graph,
+                               inputs=[sql_filename],
+                               args=(entity_type, sql_filename)))
+
+    return pipeline
+
+def save_doc_terms_snapshot(filename):
+    """ Saves the document terms of every article to filename. """
+    inpho.corpus.terms.save_doc_terms(
+        inpho.corpus.terms.select_doc_terms(), filename)
+    Session.close()
 
-    print "filtering occurrences..."
-    filter_apriori_input(
-        occur_filename, graph_filename, entity_type, doc_terms)
+def save_terms_snapshot(entity_type, filename):
+    """ Saves the terms of an entity type to filename. """
+    inpho.corpus.terms.save_terms(
+        inpho.corpus.terms.select_terms(entity_type), filename)
+    Session.close()
 
-    print "running apriori miner..."
-    dm.apriori(graph_filename, edge_filename)
-    
-    print "processing edges..."
-    edges = dm.process_edges(
-        graph_filename, edge_filename, occur_filename, doc_terms)
-    ents = dm.calculate_node_entropy(edges)
-    edges = dm.calculate_edge_weight(edges, ents)
-    
-    print "creating sql files..."
+def save_corpus_snapshot(filename):
+    """
+    Writes the path, modification time and size of every article to filename,
+    so that occurrences are extracted again when an article changes.
+    """
+    articles = sorted(select_articles())
+    Session.close()
+    paths = article_paths(articles)
+
+    with open(filename, 'w') as f:
+        for article in articles:
+            path = paths.get(article)
+            if path and os.path.isfile(path):
+                mtime, size = file_key(path)
+                f.write("%s::%s::%r::%d\n" % (article, path, mtime, size))
+            else:
+                f.write("%s::\n" % article)
+
+def extract_occurrences(terms_filename, occur_filename, corpus_root='corpus/',
+                        single_pass=False, ordered=False, binary=False):
+    """
+    Extracts the occurrences of the terms saved at terms_filename in every
+    article, see :func:`process_articles()`.
+    """
+    terms = inpho.corpus.terms.load_terms(terms_filename)
+    process_articles(Entity, occur_filename, corpus_root=corpus_root,
+                     single_pass=single_pass, ordered=ordered, terms=terms,
+                     binary=binary)
 
-    with open(sql_filename, 'w') as f:
-        for edge, props in edges.iteritems():
-            ante,cons = edge
-            row = "%s::%s" % edge
-            row += ("::%(confidence)s::%(jweight)s::%(weight)s"
-                    "::%(occurs_in)s\n" % props)
-            f.write(row)
+def filter_occurrences(occur_filename, graph_filename, terms_filename,
+                       doc_terms_filename):
+    """
+    Writes the apriori input for the terms and document terms saved at
+    terms_filename and doc_terms_filename, see
+    :func:`inpho.corpus.stats.write_apriori_input()`.
+    """
+    terms = inpho.corpus.terms.load_terms(terms_filename)
+    doc_terms = inpho.corpus.terms.load_doc_terms(doc_terms_filename)
+    dm.write_apriori_input(occur_filename, graph_filename, terms, doc_terms)
 
-    if update_entropy:
-        print "updating term entropy..."
+def mine_edges(graph_filename, edge_filename, miner='apriori'):
+    """
+    Mines the association rules of the apriori input, with the apriori binary
+    or, if miner is 'pairs', with :func:`inpho.corpus.stats.mine_pairs()`.
+    """
+    if miner == 'pairs':
+        dm.mine_pairs(graph_filename, edge_filename)
+    else:
+        dm.apriori(graph_filename, edge_filename)
 
-        for term_id, entropy in ents.iteritems():
-            term = Session.query(Idea).get(term_id)
-            if term:
-                term.entropy = entropy
+def weigh_edges(graph_filename, edge_filename, occur_filename,
+                doc_terms_filename, sql_filename, entropy_filename):
+    """
+    Computes the occurrences, entropies and weights of the mined edges,
+    writing the edges to sql_filename and the term entropies to
+    entropy_filename.
+    """
+    doc_terms = inpho.corpus.terms.load_doc_terms(doc_terms_filename)
+    edges = dm.edge_table(
+        graph_filename, edge_filename, occur_filename, doc_terms)
+    nodes, entropies = dm.node_entropy(edges['ante'], edges['confidence'])
+    ents = dm.entropy_dict(nodes, entropies, edges['cons'])
+    if ents:
+        edges['weight'] = dm.edge_weights(edges['ante'], edges['cons'],
+                                          edges['jweight'], nodes, entropies)
+    else:
+        print "ERROR PROCESSING EDGES. NO ENTROPY VALUES."
+        edges['weight'] = edges['jweight']
 
-        Session.flush()
-        Session.commit()
-        Session.close()
+    write_sql(edges, sql_filename)
+    with open(entropy_filename, 'wb') as f:
+        pickle.dump(sorted(ents.iteritems()), f, pickle.HIGHEST_PROTOCOL)
 
-    if update_db:
-        print "updating the database..."
-        update_graph(entity_type, sql_filename)
+def save_mining_counts(occur_filename, terms_filename, doc_terms_filename,
+                       counts_filename):
+    """
+    Saves the :class:`inpho.corpus.incremental.MiningCounts` used by
+    :func:`mine_article()`.
+    """
+    terms = inpho.corpus.terms.load_terms(terms_filename)
+    doc_terms = inpho.corpus.terms.load_doc_terms(doc_terms_filename)
+    counts = MiningCounts.from_contributions(
+        contributions(occur_filename, terms, doc_terms))
+    counts.save(counts_filename)
+
+def update_entropy_snapshot(entropy_filename):
+    """ Updates the term entropies saved by :func:`weigh_edges()`. """
+    with open(entropy_filename, 'rb') as f:
+        update_term_entropy(dict(pickle.load(f)))
+
+def write_sql(edges, sql_filename):
+    """
+    Writes the edges, given as columns like
+    :func:`inpho.corpus.stats.edge_table()` with their weight, to the sql file
+    loaded by :func:`update_graph()`.
+    """
+    fields = ['confidence', 'jweight', 'weight', 'occurs_in']
+    columns = [edges[field].tolist() for field in fields]
+    with open(sql_filename, 'w') as f:
+        for row in izip(edges['ante'], edges['cons'], *columns):
+            f.write("%s::%s::%s::%s::%s::%s\n" % row)
+
+def update_term_entropy(ents):
+    """ Updates the entropy of each term ID in the dictionary ents. """
+    for term_id, entropy in ents.iteritems():
+        term = Session.query(Idea).get(term_id)
+        if term:
+            term.entropy = entropy
+
+    Session.flush()
+    Session.commit()
+    Session.close()
 
 
 def update_graph(entity_type, sql_filename):
@@ -495,8 +925,10 @@ def mine_article(article, entity_type=Idea, filename='graph.txt', root='./',
                  corpus_root='corpus/', update_entropy=False,
                  update_occurrences=False, update_db=False): 
     """
-    Performs the data mining for a single article. Does not generate edge data
-    using the frequent itemset mining algorithm or term entropy. 
+    Performs the data mining for a single article, updating the counts saved
+    by a complete mining run with save_counts set. Only the edges touching a
+    term of the article are recomputed, see
+    :mod:`inpho.corpus.incremental`.
     """
     logging.info("mining article: %s" % article)
 
@@ -504,49 +936,92 @@ def mine_article(article, entity_type=Idea, filename='graph.txt', root='./',
         os.path.join(inpho.corpus.occur_path, article))
     sql_filename = os.path.abspath(
         os.path.join(inpho.corpus.sql_path, article))
+    counts_filename = os.path.abspath(root + "counts-" + filename)
+
+    if not os.path.exists(counts_filename):
+        print "ERROR: NO COUNTS AT %s. RUN COMPLETE MINING WITH --save-counts."\
+            % counts_filename
+        return
 
     doc_terms = doc_terms_list()
+    terms = inpho.corpus.terms.select_terms(entity_type)
    
     print "processing " + article + "..."
-    process_article(article, entity_type=entity_type,
-                    output_filename=occur_filename, corpus_root=corpus_root)
+    if os.path.exists(occur_filename):
+        os.remove(occur_filename)
+    timer = metrics.Timer()
+    with metrics.stage('process_article'):
+        lines = process_article(article, terms, entity_type=entity_type,
+                                output_filename=occur_filename,
+                                corpus_root=corpus_root, timer=timer)
+    metrics.article(article, timer.times,
+                    terms=sum(len(line.split()) - 1 for line in lines),
+                    sentences=len(lines))
+
+    # an article without occurrences is removed from the counts
+    contribution = None
+    if os.path.exists(occur_filename):
+        contribution = contributions(occur_filename, terms,
+                                     doc_terms).get(article)
+
+    print "updating counts..."
+    with metrics.stage('update_counts'):
+        counts = MiningCounts.load(counts_filename)
+        max_entropy = counts.max_entropy
+        affected = counts.update_article(article, contribution)
+        edges = counts.edges(affected)
+        counts.save(counts_filename)
+
+    print "creating sql file..."
+    write_sql(edges, sql_filename)
 
-    # This will create a python dictionary of dictionary from the occur file.
-    occurrences = dm.occurs_in(occur_filename, doc_terms)
+    if update_entropy:
+        print "updating term entropy..."
+        update_term_entropy(dict(zip(affected.tolist(),
+                                     counts.entropies[affected].tolist())))
 
-    update_partial_graph(entity_type, occurrences)
+    if update_db:
+        print "updating the database..."
+        scale = 1.0
+        if max_entropy and counts.max_entropy:
+            scale = max_entropy / counts.max_entropy
+        with metrics.stage('update_partial_graph'):
+            update_partial_graph(entity_type, edges, affected, scale)
 
-def update_partial_graph(entity_type, occurrences):
+def update_partial_graph(entity_type, edges, affected, scale=1.0):
     """
-    Takes an entity type and a SQL filename and only updates part of the graph.
-    For use with single article statistical information.
+    Updates the part of the database graph touching the affected term IDs
+    with the edges computed by :meth:`MiningCounts.edges`, replacing every
+    edge with an affected antecedent or consequent. The weights of the other
+    edges are multiplied by scale, to follow a change of the maximum entropy.
     """
-    raise NotImplementedError
-
-    # Import SQL statements
     if entity_type == Idea:
-        table = "idea_graph_edges"
-        type = IdeaGraphEdge
+        table = idea_graph_edges_table
     elif entity_type == Thinker:
-        table = "thinker_graph_edges"
-        type = ThinkerGraphEdge
+        table = thinker_graph_edges_table
     else:
-        table = "idea_thinker_graph_edges"
-        type = IdeaThinkerGraphEdge
+        table = idea_thinker_graph_edges_table
 
-    edges = Session.query(type)
-    # filter edges query to only the key term
+    affected = affected.tolist()
+    fields = ['confidence', 'jweight', 'weight', 'occurs_in']
+    columns = [edges[field].tolist() for field in fields]
+    rows = [dict(zip(['ante_id', 'cons_id'] + fields, row))
+                for row in izip(edges['ante'], edges['cons'], *columns)]
 
-    for ante, occurs in occurrences.iteritems():
-        for cons, occurs_in in occurs.iteritems():
-            # select the proper edge from result set
-            # if edge does not exist, create it and add to session
-            
-            #update edge
-            edge.occurs_in = occurs_in
+    connection = Session.connection()
+    if scale != 1.0:
+        connection.execute(table.update().values(
+            weight=table.c.weight * scale))
+    if affected:
+        connection.execute(table.delete().where(
+            or_(table.c.ante_id.in_(affected),
+                table.c.cons_id.in_(affected))))
+    if rows:
+        connection.execute(table.insert(), rows)
 
     # commit changes
     Session.commit()
+    Session.close()
 
 if __name__ == "__main__":
     # grab the corpus path
@@ -561,6 +1036,7 @@ if __name__ == "__main__":
                         update_entropy=False,
                         update_occurrences=False,
                         update_db=False,
+                        single_pass=False,
                         article=None)
     parser.add_argument("-a", "--all",
                         action="store_const",
@@ -582,6 +1058,16 @@ if __name__ == "__main__":
                         dest='mode',
                         const='complete',
                         help="complete data mining process [default]")
+    parser.add_argument("--all-graphs",
+                        action="store_const",
+                        dest='mode',
+                        const='all_graphs',
+                        help="mine the all, idea and thinker graphs, sharing "
+                             "one occurrence extraction")
+    parser.add_argument("--force",
+                        action="store_true",
+                        dest='force',
+                        help="run every mining stage, even if up to date")
     parser.add_argument("--update-db",
                         action="store_true",
                         dest='update_db',
@@ -594,11 +1080,47 @@ if __name__ == "__main__":
                         action="store_true",
                         dest='update_occurrences',
                         help="data mining, with occurrence file generation")
+    parser.add_argument("--single-pass",
+                        action="store_true",
+                        dest='single_pass',
+                        help="map sentence occurrences from the document scan")
+    parser.add_argument("--ordered",
+                        action="store_true",
+                        dest='ordered',
+                        help="write occurrences in article order")
+    parser.add_argument("--miner",
+                        choices=['apriori', 'pairs'],
+                        default='apriori',
+                        help="association rule miner: the apriori binary "
+                             "[default] or the in-process pair miner")
+    parser.add_argument("--save-counts",
+                        action="store_true",
+                        dest='save_counts',
+                        help="save the counts for single article mining")
     parser.add_argument("--occur",
                         action="store_const",
                         dest='mode',
                         const='occur',
                         help="occurrence file generation")
+    parser.add_argument("--binary",
+                        action="store_true",
+                        dest='binary',
+                        help="use the binary occurrence file occurrences.bin")
+    parser.add_argument("--export-occur",
+                        action="store_const",
+                        dest='mode',
+                        const='export_occur',
+                        help="export occurrences.bin to occurrences.txt")
+    parser.add_argument("--train-tokenizer",
+                        action="store_const",
+                        dest='mode',
+                        const='train_tokenizer',
+                        help="train the sentence tokenizer on the corpus")
+    parser.add_argument("--warm-cache",
+                        action="store_const",
+                        dest='mode',
+                        const='warm_cache',
+                        help="extract article bodies into the body cache")
     parser.add_argument("--load",
                         action="store_const",
                         dest='mode',
@@ -618,7 +1140,15 @@ if __name__ == "__main__":
     parser.add_argument("--entry",
                         dest='article',
                         help="process a single article")
+    parser.add_argument("--metrics",
+                        dest='metrics',
+                        help="write the run metrics as JSON lines to METRICS")
+    parser.add_argument("--profile",
+                        dest='profile',
+                        help="with --entry, save the cProfile statistics of "
+                             "the article to PROFILE")
     options = parser.parse_args()
+    metrics.configure(options.metrics)
 
     filename_root = options.type
 
@@ -641,21 +1171,56 @@ if __name__ == "__main__":
                         corpus_root=corpus_root, 
                         update_entropy=options.update_entropy,
                         update_occurrences=options.update_occurrences,
-                        update_db=options.update_db)
+                        update_db=options.update_db,
+                        single_pass=options.single_pass,
+                        ordered=options.ordered,
+                        binary=options.binary,
+                        miner=options.miner,
+                        save_counts=options.save_counts,
+                        force=options.force)
+    elif options.mode == 'all_graphs':
+        graphs = [(Entity, 'all'), (Idea, 'idea'), (Thinker, 'thinker')]
+        pipeline = mining_pipeline(
+            graphs, corpus_root=corpus_root,
+            update_entropy=options.update_entropy,
+            update_occurrences=options.update_occurrences,
+            update_db=options.update_db,
+            single_pass=options.single_pass,
+            ordered=options.ordered,
+            binary=options.binary,
+            miner=options.miner,
+            save_counts=options.save_counts)
+        pipeline.run(options.force)
     elif options.mode == 'single':
-        mine_article(options.article,
-                     entity_type,
-                     filename=filename_root, 
-                     corpus_root=corpus_root, 
-                     update_entropy=options.update_entropy,
-                     update_occurrences=options.update_occurrences,
-                     update_db=options.update_db)
+        kwargs = dict(filename=filename_root, 
+                      corpus_root=corpus_root, 
+                      update_entropy=options.update_entropy,
+                      update_occurrences=options.update_occurrences,
+                      update_db=options.update_db)
+        if options.profile:
+            metrics.profile(options.profile, mine_article, options.article,
+                            entity_type, **kwargs)
+        else:
+            mine_article(options.article, entity_type, **kwargs)
     elif options.mode == 'load':
         sql_filename = os.path.abspath("./sql-" + filename_root)
         update_graph(entity_type, sql_filename)
     elif options.mode == 'occur':
-        occur_filename = os.path.abspath("./occurrences.txt")
-        process_articles(entity_type, occur_filename, corpus_root=corpus_root)
+        if options.binary:
+            occur_filename = os.path.abspath("./occurrences.bin")
+        else:
+            occur_filename = os.path.abspath("./occurrences.txt")
+        process_articles(entity_type, occur_filename, corpus_root=corpus_root,
+                         single_pass=options.single_pass,
+                         ordered=options.ordered,
+                         binary=options.binary)
+    elif options.mode == 'export_occur':
+        OccurrenceReader(os.path.abspath("./occurrences.bin")).export(
+            os.path.abspath("./occurrences.txt"))
+    elif options.mode == 'warm_cache':
+        warm_cache()
+    elif options.mode == 'train_tokenizer':
+        train_tokenizer()
     elif options.mode == 'new_entries':
         fuzzymatch_new()
     elif options.mode == 'fuzzy':
@@ -663,3 +1228,6 @@ if __name__ == "__main__":
     elif options.mode == 'categories':
         for article, category in get_categories().iteritems():
             print "%s::%s" % (article, category)
+
+    # print the stages, articles and pools measured in this run
+    metrics.summary()
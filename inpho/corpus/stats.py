@@ -3,87 +3,81 @@ Module containing statistical methods for the InPhO data mining process.
 """
 
 import logging
-import re
+from math import log
 import subprocess
 from collections import defaultdict
+from itertools import imap, izip
+from operator import itemgetter
 
-# http://nltk.googlecode.com/svn/trunk/doc/api/nltk.tokenize.punkt.PunktSentenceTokenizer-class.html
-from nltk.tokenize import PunktSentenceTokenizer as Tokenizer
+import numpy as np
 
 from inpho import config
+from inpho.corpus.cooccurrence import graph_counts, occurrence_counts,\
+    pair_rules
+from inpho.corpus.matcher import TermMatcher
+from inpho.corpus.occurrences import OccurrenceReader, is_binary
+from inpho.corpus.sentences import sentence_spans
 
-def get_document_occurrences(document, terms):
+def get_document_occurrences(document, terms, matcher=None):
     """
     Returns a list of terms occuring in the document. 
     Semantically equivalent to [term for term in terms if term in document]
 
+    A prebuilt :class:`inpho.corpus.matcher.TermMatcher` for terms can be passed
+    as matcher, so that the search patterns are compiled once per mining run
+    rather than once per document.
+
     Primarily used by :func:`get_sentence_occurrences()`.
     """
-    occurrences = []
-    
-    document = document.lower()
-    # iterate over terms to be scanned
-    for term in terms:
-        # build list of search patterns starting with label
-        for pattern in term.patterns:
-            try:
-                if ('|' in pattern or '(' in pattern)\
-                    and re.search(pattern, document, flags=re.IGNORECASE):
-                    occurrences.append(term)
-                    break
-                elif pattern.replace('\\b','').lower() in u' ' + document + u' ':
-                    # in the document level ignore word breaks
-                    occurrences.append(term)
-                    break
-            except re.error:
-                logging.warning('Term %d (%s) pattern "%s" failed' % 
-                                (term.ID, term.label, pattern))
+    if matcher is None:
+        matcher = TermMatcher(terms)
 
-    return occurrences
+    return matcher.document_occurrences(document)
 
 def get_sentence_occurrences(document, terms, terms_present=None, 
-                             remove_overlap=False, remove_duplicates=False):
+                             remove_overlap=False, remove_duplicates=False,
+                             matcher=None, single_pass=False, spans=None):
     """
     Returns a list of lists representing the terms occuring in each sentence.
     Semantically equivalent to: 
     [[term for term in terms if term in sent] for sent in document]
 
+    If single_pass is set, sentences are not rescanned for every term.
+    Instead, the document is scanned once by the matcher, building one from
+    terms if necessary, and each match is mapped to its sentence by offset.
+    See :meth:`inpho.corpus.matcher.TermMatcher.sentence_occurrences()`.
+
+    Precomputed (start, end) sentence offsets can be passed as spans,
+    otherwise they are found by :func:`inpho.corpus.sentences.sentence_spans()`.
+
     Order of optional operations is: remove duplicates, remove overlap, 
     add doc terms, remove duplicate doc terms
     """
-    # get list of terms in the document to narrow sentence-level search
-    if terms_present is None:
-        terms_present = set(get_document_occurrences(document, terms))
+    # Use the Punkt tokenizer from NLTK to build a sentence list
+    if spans is None:
+        spans = sentence_spans(document)
+
+    if single_pass:
+        if matcher is None:
+            matcher = TermMatcher(terms)
 
-    # Use a Tokenizer from NLTK to build a sentence list
-    tokenizer = Tokenizer(document)
-    sentences = tokenizer.tokenize(document)
-    logging.info("scanning %d sentences for %d terms" % (len(sentences), len(terms)))
+        logging.info("mapping %d sentences for %d terms" % (len(spans), len(terms)))
+        sentences = matcher.sentence_occurrences(document, spans, terms_present)
+    else:
+        # get list of terms in the document to narrow sentence-level search
+        if terms_present is None:
+            terms_present = set(get_document_occurrences(document, terms, 
+                                                         matcher))
+
+        sentences = [document[start:end] for start, end in spans]
+        logging.info("scanning %d sentences for %d terms" % (len(sentences), len(terms)))
+        sentences = [_scan_sentence(sentence, terms_present) 
+                         for sentence in sentences]
     
     # Create a list of lists containing the collection of terms which cooccurr
     # in a sentence
     occurrences = []
-    for sentence in sentences:
-        sentence_occurrences = [] 
-        sentence = sentence.lower()
-
-        for term in terms_present:
-            # build list of search patterns starting with label
-            for pattern in term.patterns:
-                try:
-                    # search for any occurrence of term, stop when found
-                    if ('|' in pattern or '(' in pattern)\
-                        and re.search(pattern, sentence, flags=re.IGNORECASE):
-                        sentence_occurrences.append(term)
-                        break
-                    elif pattern.replace('\\b',' ').lower() in u' ' + sentence[:-1] + u' ':
-                        # in the sentences case keep spaces
-                        sentence_occurrences.append(term)
-                        break
-                except re.error:
-                    logging.warning('Term %d (%s) pattern "%s" failed' % 
-                                    (term.ID, term.label, pattern))
-
+    for sentence_occurrences in sentences:
         # remove duplicates
         if remove_duplicates:
             sentence_occurrences = list(set(sentence_occurrences))
@@ -109,16 +103,44 @@ def get_sentence_occurrences(document, terms, terms_present=None,
     
     return occurrences
 
+def _scan_sentence(sentence, terms):
+    """
+    Returns a list of the terms occuring in the given sentence.
+    """
+    sentence_occurrences = [] 
+    sentence = sentence.lower()
+
+    for term in terms:
+        compiled = term.compiled_patterns
+
+        # search for any occurrence of term, stop when found
+        if any(regex.search(sentence) for regex in compiled.regexes):
+            sentence_occurrences.append(term)
+        elif compiled.sentence_literals:
+            # in the sentences case keep spaces
+            padded = u' ' + sentence[:-1] + u' '
+            if any(literal in padded 
+                   for literal in compiled.sentence_literals):
+                sentence_occurrences.append(term)
+
+    return sentence_occurrences
+
 def occurrences(document, terms, title=None, remove_overlap=False,
-                format_for_file=False, output_filename=None):
-    # grab document-level occurrences, reused in sentence occurrences and
-    # summary sentence
-    occurrences = set(get_document_occurrences(document, terms))
+                format_for_file=False, output_filename=None, matcher=None,
+                single_pass=False, spans=None):
+    if single_pass:
+        # document-level occurrences are found in the same pass
+        occurrences = None
+    else:
+        # grab document-level occurrences, reused in sentence occurrences and
+        # summary sentence
+        occurrences = set(get_document_occurrences(document, terms, matcher))
 
     # grab sentence occurrences
     sentence_occurrences = get_sentence_occurrences(
         document, terms, terms_present=occurrences,
-        remove_overlap=remove_overlap, remove_duplicates=True)
+        remove_overlap=remove_overlap, remove_duplicates=True,
+        matcher=matcher, single_pass=single_pass, spans=spans)
 
 
     if not format_for_file:
@@ -145,14 +167,97 @@ def occurrences(document, terms, title=None, remove_overlap=False,
 def prepare_apriori_input(occurrence_filename, terms, doc_terms=None):
     '''
     Prepares "shopping basket" input for the apriori miner from a file of
-    sentence-lvel occurrences.
+    sentence-lvel occurrences, in either the text or the binary format of
+    :mod:`inpho.corpus.occurrences`. Returns the list of lines, see
+    :func:`apriori_baskets()`.
+    '''
+    return [basket_line(basket) for basket in 
+                apriori_baskets(occurrence_filename, terms, doc_terms)]
+
+def write_apriori_input(occurrence_filename, output_filename, terms,
+                        doc_terms=None):
+    """
+    Writes the apriori input for the occurrences to output_filename, one
+    basket at a time.
+    """
+    with open(output_filename, 'w') as f:
+        for basket in apriori_baskets(occurrence_filename, terms, doc_terms):
+            f.write(basket_line(basket))
+
+def basket_line(basket):
+    """ Formats a basket as a line of apriori input. """
+    return ' '.join(basket + ['\n'])
+
+def apriori_baskets(occurrence_filename, terms, doc_terms=None):
+    '''
+    Generates the "shopping baskets" of the apriori miner, as lists of term
+    ID strings. Every sentence with more than one of the given terms is a
+    basket, followed by one summary basket per article, holding all of the
+    terms of its sentences.
+
+    If doc_terms is given, the terms of the entities whose sep_dir is the
+    article are added to each non-empty sentence.
     '''
-    # build up terms, as they will occur in the file
-    terms = [str(term.ID) for term in terms]
     summary = defaultdict(set)
 
+    for article, line in _sentences(occurrence_filename, terms, doc_terms):
+        # update the document summary line
+        summary[article].update(line)
+
+        # do not add blank or singleton lines
+        if len(line) > 1:
+            yield line
+
+    for line in summary.itervalues():
+        yield list(line)
+
+def article_baskets(occurrence_filename, terms, doc_terms=None):
+    """
+    Returns a dictionary of the apriori baskets of each article, as sorted
+    tuples of term IDs, see :func:`apriori_baskets()`. Articles without any
+    of the given terms have no baskets.
+    """
+    baskets = defaultdict(list)
+    summary = defaultdict(set)
+
+    for article, line in _sentences(occurrence_filename, terms, doc_terms):
+        summary[article].update(line)
+        if len(line) > 1:
+            baskets[article].append(tuple(sorted(set(map(int, line)))))
+
+    for article, line in summary.iteritems():
+        if line:
+            baskets[article].append(tuple(sorted(map(int, line))))
+
+    return baskets
+
+def _sentences(occurrence_filename, terms, doc_terms=None):
+    """
+    Generates (sep_dir, terms) pairs for every sentence of a text or binary
+    occurrence file, keeping only the given terms.
+    """
+    if is_binary(occurrence_filename):
+        return _binary_sentences(OccurrenceReader(occurrence_filename),
+                                 terms, doc_terms)
+    else:
+        return _text_sentences(occurrence_filename, terms, doc_terms)
+
+def _doc_term_ids(doc_terms, article, term_ids):
+    """ Returns the IDs of the doc terms of an article in term_ids. """
+    return [term.ID for term in doc_terms.get(article, [])
+                if term.ID in term_ids]
+
+def _text_sentences(occurrence_filename, terms, doc_terms=None):
+    """
+    Generates (sep_dir, terms) pairs for every sentence of a text occurrence
+    file, keeping only the given terms.
+    """
+    # build up terms, as they will occur in the file
+    term_ids = set(term.ID for term in terms)
+    terms = set(str(id) for id in term_ids)
+    key_terms = {}
+
     with open(occurrence_filename) as f:
-        lines = []
         for line in f:
             # get the list of terms, saving the article head for later addition
             # of document terms
@@ -170,27 +275,54 @@ def prepare_apriori_input(occurrence_filename, terms, doc_terms=None):
             # append doc_terms
             if line and doc_terms is not None:
                 # search for doc terms, remove duplicates, add to line
-                key_terms = [str(term.ID) for term in doc_terms[first]]
-                key_terms = [term for term in key_terms 
-                                 if term not in lterms and term in terms]
+                if first not in key_terms:
+                    key_terms[first] = [str(id) for id in 
+                        _doc_term_ids(doc_terms, first, term_ids)]
+                if key_terms[first]:
+                    lterms = set(lterms)
+                    line.extend(term for term in key_terms[first]
+                                    if term not in lterms)
 
-                if key_terms:
-                    line.extend(key_terms)
+            yield first, line
 
-            # update the document summary line
-            summary[first].update(line)
+def _lookup_array(term_ids, ids):
+    """
+    Returns a boolean array indexed by term ID, which is True for the IDs in
+    term_ids. The array covers every ID in the array ids.
+    """
+    size = max(max(term_ids) if term_ids else 0, ids.max() if len(ids) else 0)
+    lookup = np.zeros(size + 1, dtype=bool)
+    lookup[list(term_ids)] = True
+    return lookup
 
-            # do not add blank or singleton lines
-            if len(line) > 1:
-                line.append('\n')
-                lines.append(' '.join(line))
+def _binary_sentences(reader, terms, doc_terms=None):
+    """
+    Generates (sep_dir, terms) pairs for every sentence of an
+    :class:`OccurrenceReader`, keeping only the given terms. The terms of each
+    article are filtered at once with a boolean lookup array.
+    """
+    term_ids = set(term.ID for term in terms)
+    lookup = _lookup_array(term_ids, reader.terms)
 
-    for line in summary.itervalues():
-        line = list(line)
-        line.append('\n')
-        lines.append(' '.join(line))
-    
-    return lines
+    for article, ids, offsets in reader.iterarticles():
+        keep = lookup[ids]
+        kept = ids[keep].tolist()
+        kept_offsets = np.concatenate(([0], np.cumsum(keep)))[offsets].tolist()
+        all_ids = ids.tolist()
+        offsets = offsets.tolist()
+
+        if doc_terms is not None:
+            key_ids = _doc_term_ids(doc_terms, article, term_ids)
+
+        for i in xrange(len(offsets) - 1):
+            line = [str(id) for id in kept[kept_offsets[i]:kept_offsets[i+1]]]
+
+            # append doc_terms
+            if line and doc_terms is not None and key_ids:
+                sentence = set(all_ids[offsets[i]:offsets[i+1]])
+                line.extend(str(id) for id in key_ids if id not in sentence)
+
+            yield article, line
 
 def apriori(input_filename='output.txt', output_filename='edges.txt'):
     apriori_bin = config.get('corpus', 'apriori_bin')
@@ -198,76 +330,179 @@ def apriori(input_filename='output.txt', output_filename='edges.txt'):
             '0.00000000000000001', '0.00000000000000001']
     return subprocess.call(args)
 
-
-def process_edges(graph_filename='output.txt', edges_filename='edges.txt',
-                  occur_filename='occurrences.txt', doc_terms=None):
+def mine_pairs(input_filename='output.txt', output_filename='edges.txt'):
+    """
+    Mines the association rules between pairs of terms in process, writing
+    them to output_filename in the format of :func:`apriori()`. See
+    :func:`inpho.corpus.cooccurrence.pair_rules()`.
+    """
+    antes, conses, confidences, jweights = pair_rules(input_filename)
+    with open(output_filename, 'w') as f:
+        for rule in zip(antes.tolist(), conses.tolist(),
+                        confidences.tolist(), jweights.tolist()):
+            f.write('%d %d %g %g\n' % rule)
+
+def edge_table(graph_filename='output.txt', edges_filename='edges.txt',
+               occur_filename='occurrences.txt', doc_terms=None):
+    """
+    Returns the edges in the apriori output as a dictionary of parallel
+    columns: the ante and cons lists, and the confidence, jweight, occurs_in
+    and graph arrays. The graph and occurrence counts are computed as sparse
+    matrices, see :mod:`inpho.corpus.cooccurrence`.
+    """
     # process occurrence and cooccurrence data
-    graph = defaultdict(lambda: defaultdict(int))
-    with open(graph_filename) as f:
-        for line in f:
-            ids = line.split()
+    graph = graph_counts(graph_filename)
+    occurrences = occurrence_counts(occur_filename, doc_terms)
 
-            for ante in ids:
-                for cons in ids:
-                    graph[ante][cons] += 1
-    
-    occurrences = occurs_in(occur_filename, doc_terms)
-
-    edges = defaultdict(dict)
+    antes = []
+    conses = []
+    values = []
     with open(edges_filename) as f:
         for line in f:
             ante,cons,confidence,jweight = line.split()
-            edges[(ante,cons)] = {'confidence':float(confidence), 
-                                  'jweight':float(jweight),
-                                  'occurs_in':occurrences[ante][cons],
-                                  'graph':graph[ante][cons]}
+            antes.append(ante)
+            conses.append(cons)
+            values.append((float(confidence), float(jweight)))
+
+    values = np.array(values, dtype=np.float64).reshape(-1, 2)
+    cons_ids = [int(ID) for ID in conses]
+    return {'ante': antes,
+            'cons': conses,
+            'confidence': values[:, 0],
+            'jweight': values[:, 1],
+            'occurs_in': occurrences.get(antes, cons_ids),
+            'graph': graph.get(antes, cons_ids)}
+
+def process_edges(graph_filename='output.txt', edges_filename='edges.txt',
+                  occur_filename='occurrences.txt', doc_terms=None):
+    """
+    Returns a dictionary of the confidence, jweight, occurs_in and graph
+    fields of each (ante, cons) edge in the apriori output, see
+    :func:`edge_table()`.
+    """
+    table = edge_table(graph_filename, edges_filename, occur_filename,
+                       doc_terms)
+    fields = ['confidence', 'jweight', 'occurs_in', 'graph']
+    columns = [table[field].tolist() for field in fields]
+
+    edges = defaultdict(dict)
+    for ante, cons, values in izip(table['ante'], table['cons'],
+                                   izip(*columns)):
+        edges[(ante,cons)] = dict(zip(fields, values))
     return edges
 
 def occurs_in(occur_filename='occurrences.txt', doc_terms=None):
-    occurrences = defaultdict(lambda: defaultdict(int))
-    with open(occur_filename) as f:
-        for line in f:
-            lterms = line.split()
-            article = lterms[0]
+    """
+    Returns a dictionary of dictionaries of the sentence occurrences of each
+    term per article, or per document term if doc_terms is given.
+    """
+    return occurrence_counts(occur_filename, doc_terms).to_dict()
 
-            if doc_terms:
-                for term in lterms[1:]:
-                    for doc in doc_terms[article]:
-                        occurrences[str(doc.ID)][term] += 1
-            else:
-                for term in lterms[1:]:
-                    occurrences[article][term] += 1
+def edge_arrays(edges):
+    """
+    Returns the edges of :func:`process_edges()` as parallel lists of the
+    (ante, cons) keys and arrays of their confidence and jweight.
+    """
+    keys = edges.keys()
+    properties = edges.values()
+    confidences = np.fromiter(imap(itemgetter('confidence'), properties),
+                              dtype=np.float64, count=len(properties))
+    jweights = np.fromiter(imap(itemgetter('jweight'), properties),
+                           dtype=np.float64, count=len(properties))
+    return keys, confidences, jweights
+
+def node_entropy(antes, confidences):
+    """
+    Returns the sorted array of antecedent nodes and the array of their
+    entropies, the entropy of a node being that of the confidences of its
+    edges, normalized to sum to 1.
+    """
+    nodes, index = np.unique(np.asarray(antes), return_inverse=True)
+    confidences = np.asarray(confidences, dtype=np.float64)
 
-    return occurrences
+    totals = np.bincount(index, weights=confidences)
+    probs = confidences / totals[index]
+    entropies = -np.bincount(index, weights=probs * (np.log(probs) / log(2)),
+                             minlength=len(nodes))
+    return nodes, entropies
 
-from math import log
-def calculate_node_entropy(edges):
-    probabilities = defaultdict(lambda: defaultdict(float))
-    for edge,properties in edges.iteritems():
-        ante,cons = edge
-        probabilities[ante][cons] = properties['confidence']
-    
+def _node_values(nodes, values, keys):
+    """
+    Returns the values of the given keys in the sorted nodes array, 0 for the
+    keys which are not nodes.
+    """
+    keys = np.asarray(keys)
+    found = np.zeros(len(keys), dtype=np.float64)
+    if not len(nodes):
+        return found
+
+    index = np.searchsorted(nodes, keys)
+    index[index >= len(nodes)] = 0
+    valid = nodes[index] == keys
+    found[valid] = values[index[valid]]
+    return found
+
+def edge_weights(antes, conses, jweights, nodes, entropies):
+    """
+    Returns the array of edge weights, the jweight of each edge scaled by the
+    entropy difference of its nodes over the maximum entropy. Nodes without
+    an entropy in nodes and entropies have entropy 0. If every entropy is 0,
+    every weight is 0.
+    """
+    jweights = np.asarray(jweights, dtype=np.float64)
+    max_entropy = entropies.max() if len(entropies) else 0.0
+    if not max_entropy:
+        if len(jweights):
+            logging.warning("all node entropies are 0, edge weights set to 0")
+        return np.zeros(len(jweights), dtype=np.float64)
+
+    entropy_diff = (_node_values(nodes, entropies, antes) -
+                    _node_values(nodes, entropies, conses))
+    return jweights * (entropy_diff / max_entropy)
+
+def entropy_dict(nodes, entropies, conses=()):
+    """
+    Returns a dictionary of the entropy of each node. The consequents in
+    conses which are not nodes have entropy 0.
+    """
     ents = defaultdict(float)
-    for ante,conses in probabilities.iteritems():
-        total_prob = sum(conses.values())
-        normalized_probs = [x / total_prob for x in conses.values()]
-
-        Hx = sum([x * (log(x) / log(2)) for x in normalized_probs])
-
-        ents[ante] = -Hx
-
+    ents.update(izip(nodes.tolist(), entropies.tolist()))
+    for cons in set(conses).difference(ents):
+        ents[cons] = 0.0
     return ents
 
+def calculate_node_entropy(edges):
+    """
+    Returns a dictionary of the entropy of each antecedent in edges, see
+    :func:`node_entropy()`.
+    """
+    keys, confidences, jweights = edge_arrays(edges)
+    nodes, entropies = node_entropy([ante for ante, cons in keys],
+                                    confidences)
+    return entropy_dict(nodes, entropies)
+
 def calculate_edge_weight(edges, ents):
-    weights = defaultdict(float)
+    """
+    Sets the weight of each edge from the entropies in ents, see
+    :func:`edge_weights()`, and returns the edges. Consequents without an
+    entropy are added to ents with entropy 0.
+    """
     if ents:
-        max_entropy = max(ents.values())
-        for edge, properties in edges.iteritems():
-            ante,cons = edge
-            entropy_diff = ents[ante] - ents[cons]
-            entropy_norm = entropy_diff / max_entropy
-            properties['weight'] = properties['jweight'] * entropy_norm
+        keys, confidences, jweights = edge_arrays(edges)
+        antes = [ante for ante, cons in keys]
+        conses = [cons for ante, cons in keys]
+
+        nodes = sorted(ents)
+        entropies = np.array([ents[node] for node in nodes], dtype=np.float64)
+        weights = edge_weights(antes, conses, jweights, np.array(nodes),
+                               entropies)
+
+        for properties, weight in izip(edges.itervalues(), weights.tolist()):
+            properties['weight'] = weight
+
+        for cons in set(conses).difference(ents):
+            ents[cons] = 0.0
     else:
         print "ERROR PROCESSING EDGES. NO ENTROPY VALUES."
 
-    return edges    
+    return edges
@@ -0,0 +1,244 @@
+"""
+Module generating synthetic SEP corpora for benchmarking the InPhO data mining
+process.
+
+A :class:`SyntheticCorpus` lays out a seeded, reproducible imitation of the
+SEP database in a directory:
+
+    corpus/<sep_dir>/index.html     articles, with the body in the aueditable
+                                    div, followed by a Bibliography section
+    db/entries.txt                  sep_dir, title, author and category of
+                                    every entry
+    db/pubpending.txt               sep_dirs of the unpublished entries
+    logs/<sep_dir>                  article logs, with '::' status codes
+
+The text of the articles is drawn from the labels of a synthetic term list,
+see :func:`make_terms()`, whose search patterns include multiword, ` * `
+wildcard and alternation patterns, so that every matching path of
+:class:`inpho.corpus.matcher.TermMatcher` is exercised. Each article is on a
+topic, a few labels drawn from a Zipfian distribution over the term list, see
+:func:`make_topic()`, so that the co-occurrence graph grows with the corpus
+rather than being complete after a few articles.
+"""
+
+from bisect import bisect
+import os
+import os.path
+import random
+
+from inpho.corpus.patterns import CompiledPatterns
+from inpho.corpus.terms import Term, make_patterns
+
+# words of the term labels
+WORDS = ['mind', 'body', 'free', 'will', 'knowledge', 'truth', 'virtue',
+         'ethics', 'logic', 'modal', 'causation', 'identity', 'personal',
+         'moral', 'realism', 'skepticism', 'perception', 'language',
+         'meaning', 'reference', 'justice', 'consciousness', 'time', 'space',
+         'necessity', 'substance', 'property', 'event', 'action', 'reason',
+         'belief', 'desire', 'value', 'number', 'set', 'proof', 'god', 'evil',
+         'beauty', 'art', 'science', 'explanation', 'law', 'nature', 'self',
+         'democracy', 'liberty', 'equality', 'rights', 'duty', 'courage',
+         'happiness', 'pleasure', 'pain', 'emotion', 'memory', 'imagination',
+         'intention', 'agency', 'responsibility', 'punishment', 'authority',
+         'sovereignty', 'community', 'friendship', 'love', 'death',
+         'existence', 'essence', 'universals', 'particulars', 'tropes',
+         'possibility', 'counterfactuals', 'conditionals', 'vagueness',
+         'paradox', 'infinity', 'continuum', 'mereology', 'composition',
+         'persistence', 'change', 'becoming', 'determinism', 'chance',
+         'probability', 'induction', 'deduction', 'abduction', 'evidence',
+         'testimony', 'justification', 'certainty', 'doubt', 'intuition',
+         'concepts', 'content', 'representation', 'intentionality', 'qualia',
+         'supervenience', 'emergence', 'reduction', 'physicalism', 'dualism',
+         'idealism', 'materialism', 'monism', 'pluralism', 'relativism',
+         'pragmatism', 'empiricism', 'rationalism', 'naturalism', 'holism',
+         'atomism', 'functionalism', 'behaviorism', 'computation', 'semantics',
+         'syntax', 'pragmatics', 'metaphor', 'fiction', 'interpretation',
+         'understanding', 'rationality', 'normativity', 'obligation',
+         'permission', 'consent', 'contract', 'welfare', 'utility', 'harm',
+         'autonomy', 'dignity', 'character', 'wisdom', 'honesty', 'piety',
+         'faith', 'revelation', 'miracles', 'soul', 'afterlife', 'creation',
+         'providence', 'sublime', 'taste', 'form', 'matter', 'motion', 'force',
+         'energy', 'gravity', 'quantum', 'relativity', 'evolution', 'species',
+         'function', 'organism', 'gene', 'information', 'entropy', 'symmetry']
+# words of the text between them
+FILLER = ['the', 'of', 'a', 'and', 'is', 'in', 'that', 'which', 'on', 'as',
+          'for', 'theory', 'argument', 'view', 'account', 'problem', 'claim',
+          'some', 'philosophers', 'hold', 'argue', 'deny', 'this']
+CATEGORIES = ['Metaphysics', 'Epistemology', 'Ethics', 'Logic',
+              'Philosophy of Mind', 'Philosophy of Language', 'Aesthetics']
+
+def make_terms(n_terms, seed=0, typeID=1):
+    """
+    Returns a list of n_terms :class:`inpho.corpus.terms.Term` records with
+    distinct labels of one to three words. About a third of the terms have a
+    wildcard search pattern and a tenth an alternation pattern.
+    """
+    rng = random.Random(seed)
+    labels = set()
+    terms = []
+    while len(terms) < n_terms:
+        label = ' '.join(rng.sample(WORDS, rng.choice([1, 2, 2, 3])))
+        if label in labels:
+            continue
+        labels.add(label)
+
+        searchpatterns = []
+        if rng.random() < 0.3:
+            searchpatterns.append(' * '.join(rng.sample(WORDS, 2)))
+        if rng.random() < 0.1:
+            searchpatterns.append('(%s)|(%s)' % tuple(rng.sample(WORDS, 2)))
+
+        ID = len(terms) + 1
+        patterns = make_patterns(label, searchpatterns)
+        terms.append(Term(ID, label, typeID,
+                          CompiledPatterns(patterns, label, ID=ID)))
+
+    return terms
+
+def make_topic(rng, labels, size=15, exponent=1.0):
+    """
+    Returns size distinct labels, drawn with a probability proportional to
+    rank ** -exponent, so that the first labels are common to many topics and
+    the last rare.
+    """
+    cumulative = []
+    total = 0.0
+    for rank in range(1, len(labels) + 1):
+        total += rank ** -exponent
+        cumulative.append(total)
+
+    topic = set()
+    while len(topic) < min(size, len(labels)):
+        topic.add(labels[bisect(cumulative, rng.random() * total)])
+    return sorted(topic)
+
+def make_sentence(rng, labels, length=16):
+    """ Returns a sentence of filler words and term labels. """
+    words = []
+    for i in range(rng.randint(length // 2, length)):
+        if rng.random() < 0.2:
+            words.append(rng.choice(labels))
+        else:
+            words.append(rng.choice(FILLER))
+
+    sentence = ' '.join(words)
+    return sentence[0].upper() + sentence[1:] + '.'
+
+def make_article(title, rng, labels, sections=4, paragraphs=3, sentences=6,
+                 topic_size=15):
+    """
+    Returns the HTML of an article with the given title, its body drawn from
+    a topic of topic_size term labels, see :func:`make_topic()`.
+    """
+    labels = make_topic(rng, labels, topic_size)
+    html = ['<!DOCTYPE html>',
+            '<html><head>',
+            '<meta http-equiv="Content-Type" content="text/html; '
+                'charset=utf-8">',
+            '<title>%s (Stanford Encyclopedia of Philosophy)</title>' % title,
+            '</head><body>',
+            '<div id="aueditable">',
+            '<h1>%s</h1>' % title,
+            '<div id="preamble"><p>%s</p></div>' %
+                make_sentence(rng, labels)]
+
+    for section in range(1, sections + 1):
+        html.append('<h2><a name="%d">%d. %s</a></h2>' %
+                    (section, section, make_sentence(rng, labels, 4)[:-1]))
+        for i in range(paragraphs):
+            html.append('<p>%s</p>' % ' '.join(
+                make_sentence(rng, labels) for j in range(sentences)))
+        # escaped characters and inline markup
+        html.append('<p>See <em>%s</em> &amp; <a href="#%d">section %d</a>, '
+                    'pp. 12&ndash;34.</p>' %
+                    (rng.choice(labels), section, section))
+
+    html.append('<h2><a name="Bib">Bibliography</a></h2>')
+    html.append('<ul class="hanging">')
+    for i in range(rng.randint(5, 15)):
+        html.append('<li>Author, A., %d, <em>%s</em>, Oxford: Clarendon.</li>'
+                    % (rng.randint(1900, 2012), make_sentence(rng, labels, 6)))
+    html.append('</ul>')
+    html.append('<h2><a name="Oth">Other Internet Resources</a></h2>')
+    html.append('<ul><li><a href="http://plato.stanford.edu/">SEP</a></li>'
+                '</ul>')
+    html.append('</div>')
+    html.append('</body></html>')
+    return '\n'.join(html)
+
+class SyntheticCorpus(object):
+    """
+    Synthetic SEP corpus of n_articles articles in the directory root, one
+    article on each of the first terms, see the module documentation. The
+    corpus is written by :meth:`generate`.
+    """
+    def __init__(self, root, n_articles, terms, seed=0):
+        self.root = root
+        self.n_articles = n_articles
+        self.terms = terms
+        self.seed = seed
+
+        self.corpus_root = os.path.join(root, 'corpus')
+        self.db_root = os.path.join(root, 'db')
+        self.log_root = os.path.join(root, 'logs')
+
+        self.sep_dirs = ['entry%05d' % i for i in range(n_articles)]
+
+    def path(self, sep_dir):
+        """ Returns the filename of the article at sep_dir. """
+        return os.path.join(self.corpus_root, sep_dir, 'index.html')
+
+    def paths(self):
+        return [self.path(sep_dir) for sep_dir in self.sep_dirs]
+
+    def title(self, i):
+        return self.terms[i % len(self.terms)].label.title()
+
+    def doc_terms(self):
+        """
+        Returns the dictionary of the document terms of each article, the
+        term the article is on, like :func:`inpho.corpus.terms.select_doc_terms()`.
+        """
+        doc_terms = {}
+        for i, sep_dir in enumerate(self.sep_dirs):
+            term = self.terms[i % len(self.terms)]
+            doc_terms[sep_dir] = [Term(term.ID, term.label, term.typeID, None)]
+        return doc_terms
+
+    def generate(self):
+        """ Writes the articles, the database files and the logs. """
+        rng = random.Random(self.seed)
+        labels = [term.label for term in self.terms]
+
+        for name in (self.corpus_root, self.db_root, self.log_root):
+            if not os.path.isdir(name):
+                os.makedirs(name)
+
+        entries = open(os.path.join(self.db_root, 'entries.txt'), 'w')
+        pending = open(os.path.join(self.db_root, 'pubpending.txt'), 'w')
+        for i, sep_dir in enumerate(self.sep_dirs):
+            title = self.title(i)
+            article_dir = os.path.join(self.corpus_root, sep_dir)
+            if not os.path.isdir(article_dir):
+                os.mkdir(article_dir)
+            with open(self.path(sep_dir), 'w') as f:
+                f.write(make_article(title, rng, labels))
+
+            entries.write('%s::%s::Author, A.::%s::2010-01-01::2012-01-01\n' %
+                          (sep_dir, title, rng.choice(CATEGORIES)))
+
+            # published, copy edited or pending, and some without logs
+            status = rng.random()
+            if status < 0.9:
+                with open(os.path.join(self.log_root, sep_dir), 'w') as log:
+                    log.write('2010-01-01 12:00::ea::submitted\n')
+                    if status < 0.85:
+                        log.write('2010-02-01 12:00::eq::copy edited\n')
+                    if status < 0.8:
+                        log.write('2010-03-01 12:00::eP::published\n')
+                    else:
+                        pending.write(sep_dir + '\n')
+        entries.close()
+        pending.close()
+
+        return self
@@ -0,0 +1,138 @@
+"""
+Module containing the term records of the InPhO data mining process.
+
+The mining only needs the ID, label, type and search patterns of each term.
+Rather than loading full ORM entities with their search pattern relations, and
+pickling them into every worker process, :func:`select_terms()` builds
+lightweight :class:`Term` records from a single column-level query over the
+entity and searchpatterns tables. Records can be saved to disk with
+:func:`save_terms()`, so that a run can be repeated without the database.
+"""
+
+import cPickle as pickle
+from collections import defaultdict
+from itertools import groupby
+
+from sqlalchemy import and_, select
+
+from inpho.corpus.patterns import CompiledPatterns
+
+class Term(object):
+    """
+    Snapshot of an entity for the data mining process, holding its ID,
+    label, typeID and :class:`inpho.corpus.patterns.CompiledPatterns`. Terms
+    can be used wherever the mining functions accept entities.
+    """
+    __slots__ = ('ID', 'label', 'typeID', 'compiled_patterns')
+
+    def __init__(self, ID, label, typeID, compiled_patterns):
+        self.ID = ID
+        self.label = label
+        self.typeID = typeID
+        self.compiled_patterns = compiled_patterns
+
+    def __getstate__(self):
+        return (self.ID, self.label, self.typeID, self.compiled_patterns)
+
+    def __setstate__(self, state):
+        self.ID, self.label, self.typeID, self.compiled_patterns = state
+
+    def __repr__(self):
+        return '<Term %s: %s>' % (self.ID, self.label.encode('utf-8'))
+
+    @property
+    def patterns(self):
+        """ Returns the search patterns of the term, see Entity.patterns. """
+        return self.compiled_patterns.patterns
+
+def make_patterns(label, searchpatterns):
+    """
+    Returns the regular expression patterns of a term with the given label and
+    search patterns, as Entity.patterns does.
+    """
+    patterns = ['\\b%s\\b' % pattern.replace(' * ', '( |.+ )')
+                    for pattern in searchpatterns]
+    patterns.append('\\b%s\\b' % label)
+    return patterns
+
+def select_terms(entity_type=None):
+    """
+    Returns a list of :class:`Term` records of all terms of a given entity
+    type, defaulting to Idea, ordered by ID. Nodes and Journals are never
+    selected.
+    """
+    from inpho.model import Idea, Entity, Session
+    from inpho.model import entity_table, searchpatterns_table
+    from sqlalchemy.orm import class_mapper
+
+    if entity_type is None:
+        entity_type = Idea
+
+    typeID = entity_table.c.typeID
+    query = select([entity_table.c.ID, entity_table.c.label, typeID,
+                    searchpatterns_table.c.searchpattern],
+                   from_obj=[entity_table.outerjoin(searchpatterns_table)])
+
+    # do not process Nodes or Journals
+    if entity_type is Entity:
+        query = query.where(and_(typeID!=2, typeID!=4))
+    else:
+        query = query.where(
+            typeID==class_mapper(entity_type).polymorphic_identity)
+    query = query.order_by(entity_table.c.ID)
+
+    def entity_key(row):
+        return (row[0], row[1], row[2])
+
+    terms = []
+    rows = Session.execute(query)
+    for (ID, label, type_id), group in groupby(rows, entity_key):
+        searchpatterns = [row[3] for row in group if row[3] is not None]
+        patterns = make_patterns(label, searchpatterns)
+        compiled = CompiledPatterns(patterns, label, ID=ID)
+        terms.append(Term(ID, label, type_id, compiled))
+
+    return terms
+
+def select_doc_terms():
+    """
+    Returns a dictionary of the :class:`Term` records of the entities with
+    each sep_dir, without search patterns, like
+    :func:`inpho.corpus.sep.doc_terms_list()`.
+    """
+    from inpho.model import Session, entity_table
+
+    sep_dir = entity_table.c.sep_dir
+    query = select([entity_table.c.ID, entity_table.c.label,
+                    entity_table.c.typeID, sep_dir],
+                   and_(sep_dir!=None, sep_dir!=''))
+    query = query.order_by(entity_table.c.ID)
+
+    doc_terms = defaultdict(list)
+    for ID, label, type_id, article in Session.execute(query):
+        doc_terms[article].append(Term(ID, label, type_id, None))
+
+    return doc_terms
+
+def save_terms(terms, filename):
+    """ Pickles a list of :class:`Term` records to filename. """
+    with open(filename, 'wb') as f:
+        pickle.dump(list(terms), f, pickle.HIGHEST_PROTOCOL)
+
+def load_terms(filename):
+    """ Loads a list of :class:`Term` records saved by :func:`save_terms()`. """
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+def save_doc_terms(doc_terms, filename):
+    """
+    Pickles a dictionary of :class:`Term` records by sep_dir to filename, in
+    sep_dir order so that equal dictionaries give equal files.
+    """
+    with open(filename, 'wb') as f:
+        pickle.dump(sorted(doc_terms.iteritems()), f, pickle.HIGHEST_PROTOCOL)
+
+def load_doc_terms(filename):
+    """ Loads a dictionary saved by :func:`save_doc_terms()`. """
+    with open(filename, 'rb') as f:
+        return defaultdict(list, pickle.load(f))
@@ -1,22 +1,243 @@
 """
 Provides a simple interface to legacy PHP code, such as fuzzymatch.
+
+By default, every snippet is run by a new ``php`` interpreter, which requires
+the prefix again. Passing workers to :class:`PHP` instead runs the snippets
+in a :class:`WorkerPool` of long-lived interpreters, which evaluate the prefix
+once and then read requests as JSON lines on stdin::
+
+    {"code": ["<snippet>", ...]}
+
+answering each with a JSON line on stdout, holding the base64-encoded output
+and error message, or null, of every snippet of the request::
+
+    {"output": ["<base64>", ...], "error": [null, "<base64>", ...]}
+
+Each snippet is evaluated in the scope of a function, so its variables are
+local to the snippet, as they are not with the one-shot interpreter, and
+must be declared global to persist across snippets.
+
+A request may hold many snippets, see :meth:`PHP.get_raw_many()`, so that a
+batch of fuzzy_match() calls takes a single round trip. A worker which does
+not answer within the timeout is killed, and a worker which exits, for
+instance on a fatal error, is restarted and the request retried once.
 """
+import base64
+import errno
+import json
+import os
+import select
 import subprocess
+import time
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
+
+# request loop of a worker, run with php -r
+WORKER = r"""
+ob_start();
+eval(json_decode(fgets(STDIN), true));
+ob_end_clean();
+
+// snippets run in their own scope, so they cannot clobber the loop
+function __inpho_run($__code) {
+    eval($__code);
+}
+
+while (($line = fgets(STDIN)) !== false) {
+    $request = json_decode($line, true);
+    $response = array('output' => array(), 'error' => array());
+    foreach ($request['code'] as $code) {
+        $error = null;
+        ob_start();
+        try {
+            __inpho_run($code);
+        } catch (Exception $e) {
+            $error = base64_encode($e->getMessage());
+        } catch (Throwable $e) {
+            $error = base64_encode($e->getMessage());
+        }
+        $response['output'][] = base64_encode(ob_get_clean());
+        $response['error'][] = $error;
+    }
+    echo json_encode($response), "\n";
+    flush();
+}
+"""
+
+class PHPError(Exception):
+    """ Raised when a PHP snippet fails or a worker exits. """
+    pass
+
+class PHPTimeout(PHPError):
+    """ Raised when a worker does not answer within its timeout. """
+    pass
+
+class Worker(object):
+    """
+    Long-lived PHP interpreter evaluating snippets after the prefix, see the
+    module documentation. The interpreter is started on the first request.
+    """
+    def __init__(self, prefix="", postfix="", timeout=None, executable="php"):
+        self.prefix = prefix
+        self.postfix = postfix
+        self.timeout = timeout
+        self.executable = executable
+        self.process = None
+        self.buffer = ''
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        self.process = subprocess.Popen([self.executable, '-r', WORKER],
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        close_fds=True)
+        self.buffer = ''
+        self._write(self.prefix)
+
+    def stop(self):
+        """ Kills the interpreter, if running. """
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process.wait()
+            self.process.stdin.close()
+            self.process.stdout.close()
+        self.process = None
+
+    def _write(self, value):
+        try:
+            self.process.stdin.write(json.dumps(value) + '\n')
+            self.process.stdin.flush()
+        except IOError, e:
+            if e.errno != errno.EPIPE:
+                raise
+
+    def _readline(self):
+        """
+        Returns the next line written by the interpreter, or '' if it has
+        exited. Raises PHPTimeout if no line is written within the timeout.
+        """
+        fd = self.process.stdout.fileno()
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+
+        while '\n' not in self.buffer:
+            if self.timeout is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0 or\
+                        not select.select([fd], [], [], remaining)[0]:
+                    raise PHPTimeout("PHP worker timed out after %s s" %
+                                     self.timeout)
+            data = os.read(fd, 1 << 16)
+            if not data:
+                return ''
+            self.buffer += data
+
+        line, self.buffer = self.buffer.split('\n', 1)
+        return line
+
+    def _request(self, codes):
+        if not self.alive:
+            self.start()
+        self._write({'code': [code + '\n' + self.postfix for code in codes]})
+        try:
+            return self._readline()
+        except PHPTimeout:
+            self.stop()
+            raise
+
+    def run(self, codes):
+        """
+        Evaluates each snippet of codes, returning the list of their outputs.
+        Raises PHPError if a snippet throws an exception, or if the worker
+        exits on this request twice.
+        """
+        line = self._request(codes)
+        if not line:
+            # the worker crashed, possibly on an earlier request
+            self.stop()
+            line = self._request(codes)
+            if not line:
+                self.stop()
+                raise PHPError("PHP worker exited")
+
+        response = json.loads(line)
+        for error in response['error']:
+            if error is not None:
+                raise PHPError(base64.b64decode(error))
+        return [base64.b64decode(output) for output in response['output']]
+
+class WorkerPool(object):
+    """
+    Pool of size :class:`Worker` objects, sending snippets to the idle
+    workers in batches of at most batch_size snippets.
+    """
+    def __init__(self, prefix="", postfix="", size=2, timeout=None,
+                 batch_size=100, executable="php"):
+        self.workers = [Worker(prefix, postfix, timeout, executable)
+                            for i in range(size)]
+        self.batch_size = batch_size
+        self.idle = Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+        self.threads = None
+
+    def _run_batch(self, codes):
+        worker = self.idle.get()
+        try:
+            return worker.run(codes)
+        finally:
+            self.idle.put(worker)
+
+    def run(self, codes):
+        """ Evaluates each snippet of codes, returning their outputs. """
+        codes = list(codes)
+        batches = [codes[i:i + self.batch_size]
+                       for i in range(0, len(codes), self.batch_size)]
+        if len(batches) <= 1:
+            return self._run_batch(codes) if codes else []
+
+        if self.threads is None:
+            self.threads = ThreadPool(len(self.workers))
+        outputs = []
+        for batch in self.threads.imap(self._run_batch, batches):
+            outputs.extend(batch)
+        return outputs
+
+    def close(self):
+        """ Stops every worker. """
+        if self.threads is not None:
+            self.threads.close()
+            self.threads = None
+        for worker in self.workers:
+            worker.stop()
 
 class PHP:
     """This class provides a simple interface to PHP programming."""
 
-    def __init__(self, prefix="", postfix=""):
+    def __init__(self, prefix="", postfix="", workers=0, timeout=None,
+                 batch_size=100):
         """prefix = optional prefix for all code (usually require statements)
         postfix = optional postfix for all code
+        workers = number of long-lived interpreters, if any, see WorkerPool
+        timeout = seconds a worker may take to answer a request
         Semicolons are not added automatically, so you'll need to make sure to put them in!"""
 
         self.prefix = prefix
         self.postfix = postfix
 
+        if workers:
+            self.pool = WorkerPool(prefix, postfix, workers, timeout,
+                                   batch_size)
+        else:
+            self.pool = None
+
     def __submit(self, code):
         """Sends code to the PHP interpreter, returning the output."""
-        p = subprocess.Popen("php", shell=True, stdin=subprocess.PIPE, 
+        p = subprocess.Popen(["php"], stdin=subprocess.PIPE,
                              stdout=subprocess.PIPE, close_fds=True)
         (out, inp) = (p.stdout, p.stdin)
         print >>inp, "<?php "
@@ -27,27 +248,46 @@ class PHP:
         inp.close()
         return out
 
+    def close(self):
+        """Stops the workers, if any."""
+        if self.pool is not None:
+            self.pool.close()
+
     def get_raw(self, code):
         """Given a code block, invoke the code and return the raw result."""
+        if self.pool is not None:
+            return self.pool.run([code])[0]
+
         out = self.__submit(code)
         return out.read()
 
+    def get_raw_many(self, codes):
+        """
+        Given a list of code blocks, invoke each and return the list of raw
+        results. With workers, the code blocks are sent in batches.
+        """
+        if self.pool is not None:
+            return self.pool.run(codes)
+        return [self.get_raw(code) for code in codes]
+
     def get(self, code):
         """
-        Given a code block that emits json, invoke the code and return the 
+        Given a code block that emits json, invoke the code and return the
         result as a native Python dictionary.
         """
 
-        out = self.__submit(code)
-        return json.loads(out.read())
+        return json.loads(self.get_raw(code))
 
     def get_one(self, code):
         """
-        Given a code block that emits multiple json values (one per line), 
+        Given a code block that emits multiple json values (one per line),
         yield the next value.
         """
 
-        out = self.__submit(code)
+        if self.pool is not None:
+            out = self.get_raw(code).splitlines()
+        else:
+            out = self.__submit(code)
         for line in out:
             line = line.strip()
             if line:
@@ -13,7 +13,25 @@ engine = create_engine(url, echo=False, pool_recycle=30)
 Session = scoped_session(sessionmaker())
 Session.configure(bind=engine)
 
-metadata = MetaData()
+# declare the tables from the cached schema, if any, rather than reflecting
+# them, and SQLite databases from the declared schema, see inpho.schema
+from inpho import schema
+metadata, schema_dialect = schema.load_metadata(schema.cache_filename(), engine)
+schema_source = 'cached'
+if metadata is None and engine.dialect.name == 'sqlite':
+    metadata, schema_dialect = schema.declared_metadata(), 'generic'
+    schema_source = 'declared'
+elif metadata is None:
+    metadata = MetaData()
+
+def _table(name, *args, **kwargs):
+    """
+    Returns the named table of the cached or declared schema, or declares it
+    with the given columns, reflecting the others if autoload is set.
+    """
+    if schema_dialect is not None:
+        return schema.table(metadata, name, schema_source)
+    return Table(name, metadata, *args, **kwargs)
 
 from inpho.model.date import *
 from inpho.model.entity import *
@@ -30,51 +48,51 @@ from inpho.model.work import *
 
 
 # entity table
-entity_table = Table('entity', metadata,
+entity_table = _table('entity',
     Column('ID', Integer, primary_key=True),
     Column('label', Unicode),
     Column('wiki', Unicode),
     Column('searchstring', Unicode),
     autoload=True, autoload_with=engine)
 
-searchpatterns_table = Table('searchpatterns', metadata,
+searchpatterns_table = _table('searchpatterns',
     Column('searchpattern', Unicode, primary_key=True),
     Column('target_id', ForeignKey('entity.ID', ondelete='CASCADE'), primary_key=True),
     autoload=True, autoload_with=engine)
 
 #define idea tables
-idea_table = Table('idea', metadata,
+idea_table = _table('idea',
     Column('ID', ForeignKey('entity.ID'), primary_key=True),
     autoload=True, autoload_with=engine)
 
-idea_link_to_table = Table('idea_link_to', metadata,
+idea_link_to_table = _table('idea_link_to',
     Column('source_id', ForeignKey('idea.ID')),
     Column('target_id', ForeignKey('idea.ID')),
     autoload=True, autoload_with=engine)
 
-idea_instance_of_table = Table('idea_instance_of', metadata,
+idea_instance_of_table = _table('idea_instance_of',
     Column('instance_id', ForeignKey('idea.ID')),
     Column('class_id', ForeignKey('idea.ID')),
     autoload=True, autoload_with=engine)
 
-idea_graph_edges_table = Table('idea_graph_edges', metadata,
+idea_graph_edges_table = _table('idea_graph_edges',
     Column('ID', Integer, primary_key=True),
     Column('ante_id', ForeignKey('idea.ID')),
     Column('cons_id', ForeignKey('idea.ID')),
     autoload=True, autoload_with=engine)
 
-idea_thinker_graph_edges_table = Table('idea_thinker_graph_edges', metadata,
+idea_thinker_graph_edges_table = _table('idea_thinker_graph_edges',
     Column('ID', Integer, primary_key=True),
     Column('ante_id', ForeignKey('entity.ID')),
     Column('cons_id', ForeignKey('entity.ID')),
     autoload=True, autoload_with=engine)
 
-thinker_graph_edges_table = Table('thinker_graph_edges', metadata,
+thinker_graph_edges_table = _table('thinker_graph_edges',
     Column('ante_id', ForeignKey('thinker.ID'), primary_key=True),
     Column('cons_id', ForeignKey('thinker.ID'), primary_key=True),
     autoload=True, autoload_with=engine)
 
-ontotree_table = Table('ontotree', metadata,
+ontotree_table = _table('ontotree',
     Column('ID', ForeignKey('entity.ID'), primary_key=True),
     Column('concept_id', ForeignKey('idea.ID')),
     Column('area_id', ForeignKey('idea.ID')),
@@ -83,14 +101,14 @@ ontotree_table = Table('ontotree', metadata,
     autoload=True, autoload_with=engine)
 
 # note - when moving to new schema, will need to change this table's ORM
-idea_evaluation_table = Table('idea_evaluation', metadata,
+idea_evaluation_table = _table('idea_evaluation',
     Column('ID', Integer, primary_key=True),
     Column('cons_id', ForeignKey('idea.ID')),
     Column('ante_id', ForeignKey('idea.ID')),
     Column('uid', ForeignKey('inpho_user.ID')),
     autoload=True, useexisting=True, autoload_with=engine)
 
-anon_evaluation_table = Table('anon_eval', metadata,
+anon_evaluation_table = _table('anon_eval',
     Column('ip', String, primary_key=True),
     Column('cons_id', ForeignKey('idea.ID'), primary_key=True),
     Column('ante_id', ForeignKey('idea.ID'), primary_key=True),
@@ -98,102 +116,102 @@ anon_evaluation_table = Table('anon_eval', metadata,
 
 
 #define thinker tables
-thinker_table = Table('thinker', metadata,
+thinker_table = _table('thinker',
     Column('ID', ForeignKey('entity.ID'), primary_key=True),
     autoload=True, autoload_with=engine, useexisting=True)
 
-nationality_table = Table('nationality', metadata,
+nationality_table = _table('nationality',
     Column('ID', Integer, primary_key=True),
     autoload=True, autoload_with=engine)
 
-thinker_has_nationality_table = Table('thinker_has_nationality', metadata,
+thinker_has_nationality_table = _table('thinker_has_nationality',
     Column('thinker_id', ForeignKey('thinker.ID')),
     Column('value', ForeignKey('nationality.ID')),
     autoload=True, autoload_with=engine)
 
-profession_table = Table('profession', metadata,
+profession_table = _table('profession',
     Column('id', Integer, primary_key=True),
     autoload=True, autoload_with=engine)
 
-thinker_has_profession_table = Table('thinker_has_profession', metadata,
+thinker_has_profession_table = _table('thinker_has_profession',
     Column('thinker_id', ForeignKey('thinker.ID')),
     Column('value', ForeignKey('profession.id')),
     autoload=True, autoload_with=engine)
 
-alias_table = Table('alias', metadata,
+alias_table = _table('alias',
     Column('thinker_id', ForeignKey('entity.ID'), primary_key=True),
     Column('value', Integer, primary_key=True),
     autoload=True, autoload_with=engine)
 
-thinker_has_influenced_table = Table('thinker_has_influenced', metadata,
+thinker_has_influenced_table = _table('thinker_has_influenced',
     Column('thinker1_id', ForeignKey('thinker.ID'), primary_key=True),
     Column('thinker2_id', ForeignKey('thinker.ID'), primary_key=True),
     Column('uid', ForeignKey('inpho_user.ID'), primary_key=True),
     autoload=True, autoload_with=engine)
 
-thinker_teacher_of_table = Table('thinker_teacher_of', metadata,
+thinker_teacher_of_table = _table('thinker_teacher_of',
     Column('thinker1_id', ForeignKey('thinker.ID'), primary_key=True),
     Column('thinker2_id', ForeignKey('thinker.ID'), primary_key=True),
     Column('uid', ForeignKey('inpho_user.ID'), primary_key=True),
     autoload=True, autoload_with=engine)
 
-date_table = Table('date', metadata,
+date_table = _table('date',
     Column('entity_id', ForeignKey('entity.ID', ondelete='CASCADE'), primary_key=True),
     autoload=True, autoload_with=engine, useexisting=True)
 
 # Journal tables
-journal_table = Table('journal', metadata,
+journal_table = _table('journal',
     Column('ID', ForeignKey('entity.ID'), primary_key=True),
     autoload=True, autoload_with=engine)
 
-journal_abbr_table = Table('journal_abbr', metadata,
+journal_abbr_table = _table('journal_abbr',
     Column('id', Integer, primary_key=True),
     Column('journal_id', ForeignKey('journal.ID')),
     autoload=True, autoload_with=engine)
 
-journal_search_query_table = Table('journal_search_query', metadata,
+journal_search_query_table = _table('journal_search_query',
     Column('id', Integer, primary_key=True),
     Column('journal_id', ForeignKey('journal.ID')),
     Column('value', String),
     autoload=True, autoload_with=engine)
 
 # Group tables
-school_of_thought_table = Table('school_of_thought', metadata,
+school_of_thought_table = _table('school_of_thought',
     Column('ID', ForeignKey('entity.ID'), primary_key=True),
     autoload=True, autoload_with=engine)
 
 # Work tables
-work_table = Table('work', metadata,
+work_table = _table('work',
     Column('ID', ForeignKey('entity.ID'), primary_key=True),
     autoload=True, autoload_with=engine)
 
 # User tables
-user_table = Table('inpho_user', metadata,
+user_table = _table('inpho_user',
     Column('ID', Integer, primary_key=True),
     Column('first_area_concept_id', ForeignKey('idea.ID')),
     Column('second_area_concept_id', ForeignKey('idea.ID')),
     Column("group_uid", ForeignKey("groups.uid")),
     autoload=True, autoload_with=engine)
 
-groups_table = Table("groups", metadata,
+groups_table = _table("groups",
     Column("uid", Integer, primary_key=True),
     Column("name", String, unique=True, nullable=False))
 
-roles_table = Table("roles", metadata,
+roles_table = _table("roles",
     Column("uid", Integer, primary_key=True),
     Column("name", String, unique=True, nullable=False))
 
-users_roles_table = Table("users_roles", metadata,
+users_roles_table = _table("users_roles",
     Column("user_uid", ForeignKey("inpho_user.ID")),
     Column("role_uid", ForeignKey("roles.uid")))
 
 #SEP Tables
-sep_area_table = Table('sep_areas', metadata,
+sep_area_table = _table('sep_areas',
     Column('id', Integer, primary_key=True),
     Column('concept_id', ForeignKey('idea.ID')),
     autoload=True, autoload_with=engine)
 
-sepentries_table = Table('sepentries', metadata,
+sepentries_table = _table('sepentries',
     Column('sep_dir', String, unique=True, nullable=False, primary_key=True),
     Column('title', String, unique=True, nullable=False),
     Column('published', Boolean, nullable=False),
@@ -201,14 +219,20 @@ sepentries_table = Table('sepentries', metadata,
     autoload=True, autoload_with=engine
 )
 
-fuzzymatches_table = Table('fuzzymatches', metadata,
+fuzzymatches_table = _table('fuzzymatches',
     Column('sep_dir', ForeignKey('sepentries.sep_dir'), primary_key=True),
     Column('entityID', ForeignKey('entity.ID'), primary_key=True),
     Column('strength', Numeric),
     Column('edits', Numeric),
     autoload=True, autoload_with=engine)
 
-metadata.create_all(engine)
+# missing tables are created when reflecting, in a database declared from the
+# schema cached from another dialect or the declared schema, and in local
+# SQLite files, where checking for every table costs no round trips to a server
+if schema_dialect != engine.dialect.name or engine.dialect.name == 'sqlite':
+    metadata.create_all(engine)
+if schema_dialect is None and schema.cache_filename():
+    schema.save_metadata(schema.cache_filename(), metadata, engine)
 
 # Entity mappings
 mapper(Entity, entity_table, 
@@ -219,7 +243,8 @@ mapper(Entity, entity_table,
                cascade="all,delete-orphan", passive_deletes=True),
            #'spatterns':relation(Searchpattern),
            '_spatterns':relation(Searchpattern, backref='entity',
-               cascade="all,delete-orphan", passive_deletes=True)
+               cascade="all,delete-orphan", passive_deletes=True,
+               extension=SearchpatternExtension())
       })
 mapper(Searchpattern, searchpatterns_table,
        properties={
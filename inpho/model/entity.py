@@ -1,3 +1,4 @@
+from itertools import product
 import re
 import os.path
 import string
@@ -5,11 +6,54 @@ from urllib import quote_plus
 
 import inpho.helpers
 from inpho.helpers import ExtJsonEncoder
+from inpho.corpus.patterns import CompiledPatterns
 
 from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.orm.interfaces import AttributeExtension
 import inflect
 p = inflect.engine()
 
+# words which are never pluralized
+PLURAL_STOPLIST = frozenset(['in', 'of', 'or', 'and', 'for', 'on', 'about',
+                             'to'])
+
+# word -> tuple of the word and its plural, shared by every entity
+_plurals = {}
+
+def plural_forms(word):
+    """
+    Returns the tuple of the forms of a word used in pluralizations: the word
+    itself, followed by its plural unless it is in the stoplist.
+    """
+    forms = _plurals.get(word)
+    if forms is None:
+        if word in PLURAL_STOPLIST:
+            forms = (word,)
+        else:
+            forms = (word, unicode(p.plural(word)))
+        _plurals[word] = forms
+    return forms
+
+def pluralizations(label):
+    """
+    Generates every combination of the forms of the words of a label, see
+    :func:`plural_forms()`.
+    """
+    forms = [plural_forms(word) for word in label.split()]
+    return (u' '.join(combination) for combination in product(*forms))
+
+def pluralize_labels(labels):
+    """
+    Returns the list of (label, pluralizations) pairs of the given labels,
+    the pluralizations being generated lazily. The plurals of every distinct
+    word are computed once for the whole batch.
+    """
+    labels = list(labels)
+    for label in labels:
+        for word in label.split():
+            plural_forms(word)
+    return [(label, pluralizations(label)) for label in labels]
+
 class Searchpattern(object):
     def __init__(self, id, searchpattern):
         self.target_id = id
@@ -18,6 +62,24 @@ class Searchpattern(object):
 def create_searchpattern(searchpattern):
     return Searchpattern(None, searchpattern)
 
+class SearchpatternExtension(AttributeExtension):
+    """
+    Invalidates the cached :class:`CompiledPatterns` of an entity whenever its
+    search patterns are changed.
+    """
+    active_history = False
+
+    def append(self, state, value, initiator):
+        state.obj().__dict__.pop('_compiled_patterns', None)
+        return value
+
+    def remove(self, state, value, initiator):
+        state.obj().__dict__.pop('_compiled_patterns', None)
+
+    def set(self, state, value, oldvalue, initiator):
+        state.obj().__dict__.pop('_compiled_patterns', None)
+        return value
+
 class Entity(object):
     def url(self, filetype='html', action='view', id2=None):
         return inpho.helpers.url(controller="entity", id=self.ID, 
@@ -67,6 +129,23 @@ class Entity(object):
                             for pattern in self.searchpatterns]
         newpatterns.append('\\b%s\\b' % self.label)
         return newpatterns
+
+    @property
+    def compiled_patterns(self):
+        """
+        Returns the :class:`CompiledPatterns` of the entity's search patterns.
+        The bundle is cached on the entity, so it is built once per mining run,
+        and rebuilt only if the label or search patterns change.
+        """
+        compiled = self.__dict__.get('_compiled_patterns')
+        spatterns = self._spatterns
+        if compiled is None or compiled.label != self.label or\
+            (compiled.source is not None and compiled.source is not spatterns):
+            compiled = CompiledPatterns(self.patterns, self.label, spatterns, 
+                                        self.ID)
+            self.__dict__['_compiled_patterns'] = compiled
+
+        return compiled
         
     @property
     def google_url(self):
@@ -76,31 +155,14 @@ class Entity(object):
 
     def pluralize(self):
         """
-        Returns a list of all possible pluralizations
+        Generates all possible pluralizations of the label. Use
+        :func:`pluralize_labels()` for many entities at once.
 
-        >>> Session.query(Entity).get(2428)
-        >>> entity.new_pluralize()
+        >>> entity = Session.query(Entity).get(2428)
+        >>> list(entity.pluralize())
         ['philosophy of law', 'philosophy of laws', 'philosophies of law', 'philosophies of laws']
         """
-        combinations = list()
-        plurals = dict()
-
-        words = self.label.split()
-
-        # build up a dictionary of pluralizations to reuse - this way p.plural()
-        # isn't being called multiple times per word.
-        for word in words:
-            wordtemp = word
-            # process stoplist
-            if word in ['in', 'of', 'or', 'and', 'for', 'on', 'about', 'to']:
-                plurals[wordtemp] = [word]
-            else:
-                # singularize the words
-                re.sub('ies$','y', word) or re.search('descartes$', word) or re.sub('ypes$', 'ype', word) or re.search('tus$', word) or re.sub('([ea])nges$', '\1nge', word) or re.sub('([aeiou])cles$', '\1cle', word) or re.sub('bles$', 'ble', word) or re.sub('ues$', 'ue', word) or re.sub('nces$', 'nce', word) or re.search('ous$', word) or re.search('sis$', word) or re.sub('xes$', 'x', word) or re.sub('([aeiou])(.)es$', '\1\2e', word) or re.sub('ces$', 'ce', word) or re.sub('es$', '', word) or re.search('ss$', word) or re.search('s$', '', word)
-                plurals[wordtemp] = [word]
-                plurals[wordtemp].append(p.plural(word))
-
-        return inpho.helpers.make_combinations("", words, 0, plurals, combinations)
+        return pluralizations(self.label)
     
     def setup_SPL(self):
         #code to generate search pattern list to disambiguate ands to intersections or unions
@@ -0,0 +1,394 @@
+"""
+inpho.schema caches the reflected schema of the InPhO database, declares the
+schema of local databases and loads fixtures into them. It does not import
+inpho.model, which uses it to declare its tables.
+
+Reflecting every table at import time takes a round trip per table to the
+MySQL server. If the ``schema_cache`` option of the ``[sqlalchemy]`` section
+is set, the reflected :class:`MetaData` is pickled to that file the first time
+inpho.model is imported, and later imports declare the tables from the pickle
+without connecting. Delete the file to reflect the schema again after a
+migration.
+
+The cached schema can also create the tables of another database, such as a
+local SQLite file for the benchmark and regression suites. Types specific to
+the dialect the schema was reflected from are then replaced by their generic
+forms, see :func:`portable()`. Missing tables are created when the cached
+schema comes from another dialect, or when the database is SQLite, but not
+in a new MySQL database, which must be loaded with the schema first.
+
+A SQLite database without a cached schema is declared from the generic schema
+of :func:`declared_metadata()`, which holds the columns used by inpho.model and
+the data mining, so that a local database can be created without a MySQL
+server. SQLite databases are never reflected.
+
+A local database is filled from a JSON fixture file, holding a list of row
+dictionaries per table::
+
+    python -m inpho.schema dump fixtures.json entity idea searchpatterns
+    python -m inpho.schema load fixtures.json
+"""
+import cPickle as pickle
+from collections import defaultdict
+from datetime import date, datetime, time
+from decimal import Decimal
+import json
+import logging
+import os
+import os.path
+
+from sqlalchemy import types
+from sqlalchemy.schema import Column, ForeignKey, MetaData, Table
+from sqlalchemy.types import Boolean, Float, Integer, Numeric, String,\
+    Unicode
+
+import inpho
+
+class SchemaError(Exception):
+    """ Raised when a table is missing from a cached or declared schema. """
+    pass
+
+def cache_filename():
+    """ Returns the schema_cache option of the configuration, or None. """
+    if inpho.config.config.has_option('sqlalchemy', 'schema_cache'):
+        return inpho.config.get('sqlalchemy', 'schema_cache')
+
+def load_metadata(filename, engine):
+    """
+    Returns the :class:`MetaData` pickled to filename, made portable to the
+    dialect of engine if needed, and the name of the dialect it was reflected
+    from. Returns (None, None) if there is no cached schema.
+    """
+    if not filename or not os.path.exists(filename):
+        return None, None
+
+    with open(filename, 'rb') as f:
+        dialect_name, tables = pickle.load(f)
+    logging.debug("loaded %s schema from %s" % (dialect_name, filename))
+
+    metadata = MetaData()
+    for table in tables.itervalues():
+        table.metadata = metadata
+    metadata.tables.update(tables)
+
+    if dialect_name != engine.dialect.name:
+        portable(metadata)
+    return metadata, dialect_name
+
+def save_metadata(filename, metadata, engine):
+    """ Pickles the reflected metadata, with the dialect of engine. """
+    tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+    with open(tmp_filename, 'wb') as f:
+        pickle.dump((engine.dialect.name, metadata.tables), f,
+                    pickle.HIGHEST_PROTOCOL)
+    os.rename(tmp_filename, filename)
+
+def declared_metadata():
+    """
+    Returns the :class:`MetaData` of the generic schema of the InPhO database,
+    declaring the columns used by inpho.model and the data mining, but not
+    every column of the production schema.
+    """
+    metadata = MetaData()
+
+    # entities
+    Table('entity', metadata,
+        Column('ID', Integer, primary_key=True),
+        Column('typeID', Integer, nullable=False, default=0),
+        Column('label', Unicode(255)),
+        Column('searchstring', Unicode(2048)),
+        Column('sep_dir', String(255)),
+        Column('wiki', Unicode(255)))
+    Table('searchpatterns', metadata,
+        Column('searchpattern', Unicode(255), primary_key=True),
+        Column('target_id', Integer,
+               ForeignKey('entity.ID', ondelete='CASCADE'), primary_key=True))
+    Table('date', metadata,
+        Column('entity_id', Integer,
+               ForeignKey('entity.ID', ondelete='CASCADE'), primary_key=True),
+        Column('relation_id', Integer, primary_key=True),
+        Column('year', Integer),
+        Column('month', Integer),
+        Column('day', Integer),
+        Column('year_end', Integer),
+        Column('month_end', Integer),
+        Column('day_end', Integer))
+
+    # ideas and the taxonomy
+    Table('idea', metadata,
+        Column('ID', Integer, ForeignKey('entity.ID'), primary_key=True),
+        Column('entropy', Float))
+    for name, columns in [('idea_link_to', ('source_id', 'target_id')),
+                          ('idea_instance_of', ('instance_id', 'class_id'))]:
+        Table(name, metadata, *[
+            Column(column, Integer, ForeignKey('idea.ID'), primary_key=True)
+                for column in columns])
+    Table('ontotree', metadata,
+        Column('ID', Integer, ForeignKey('entity.ID'), primary_key=True),
+        Column('concept_id', Integer, ForeignKey('idea.ID')),
+        Column('area_id', Integer, ForeignKey('idea.ID')),
+        Column('parent_concept_id', Integer, ForeignKey('idea.ID')),
+        Column('parent_id', Integer, ForeignKey('ontotree.ID')))
+    Table('sep_areas', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('concept_id', Integer, ForeignKey('idea.ID')))
+
+    # co-occurrence graphs, see inpho.corpus.sep.update_graph
+    def edge_columns(node, primary_key):
+        return [Column('ante_id', Integer, ForeignKey(node + '.ID'),
+                       primary_key=primary_key),
+                Column('cons_id', Integer, ForeignKey(node + '.ID'),
+                       primary_key=primary_key),
+                Column('confidence', Float),
+                Column('jweight', Float),
+                Column('weight', Float),
+                Column('occurs_in', Integer)]
+    Table('idea_graph_edges', metadata,
+        Column('ID', Integer, primary_key=True),
+        *edge_columns('idea', False))
+    Table('idea_thinker_graph_edges', metadata,
+        Column('ID', Integer, primary_key=True),
+        *edge_columns('entity', False))
+    Table('thinker_graph_edges', metadata, *edge_columns('thinker', True))
+
+    # thinkers
+    Table('thinker', metadata,
+        Column('ID', Integer, ForeignKey('entity.ID'), primary_key=True),
+        *[Column('%s_%s' % (event, part), Integer)
+              for event in ('birth', 'death')
+              for part in ('year', 'month', 'day')])
+    Table('nationality', metadata,
+        Column('ID', Integer, primary_key=True),
+        Column('name', Unicode(255)))
+    Table('profession', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('name', Unicode(255)))
+    Table('thinker_has_nationality', metadata,
+        Column('thinker_id', Integer, ForeignKey('thinker.ID'),
+               primary_key=True),
+        Column('value', Integer, ForeignKey('nationality.ID'),
+               primary_key=True))
+    Table('thinker_has_profession', metadata,
+        Column('thinker_id', Integer, ForeignKey('thinker.ID'),
+               primary_key=True),
+        Column('value', Integer, ForeignKey('profession.id'),
+               primary_key=True))
+    Table('alias', metadata,
+        Column('thinker_id', Integer, ForeignKey('entity.ID'),
+               primary_key=True),
+        Column('value', Integer, primary_key=True))
+    for name in ('thinker_has_influenced', 'thinker_teacher_of'):
+        Table(name, metadata,
+            Column('thinker1_id', Integer, ForeignKey('thinker.ID'),
+                   primary_key=True),
+            Column('thinker2_id', Integer, ForeignKey('thinker.ID'),
+                   primary_key=True),
+            Column('uid', Integer, ForeignKey('inpho_user.ID'),
+                   primary_key=True),
+            Column('degree', Integer))
+
+    # journals, schools of thought and works
+    Table('journal', metadata,
+        Column('ID', Integer, ForeignKey('entity.ID'), primary_key=True),
+        Column('URL', String(255)),
+        Column('last_accessed', Float),
+        Column('language', String(255)),
+        Column('openAccess', Boolean),
+        Column('active', Boolean),
+        Column('student', Boolean),
+        Column('ISSN', String(32)))
+    for name in ('journal_abbr', 'journal_search_query'):
+        Table(name, metadata,
+            Column('id', Integer, primary_key=True),
+            Column('journal_id', Integer, ForeignKey('journal.ID')),
+            Column('value', String(255)))
+    for name in ('school_of_thought', 'work'):
+        Table(name, metadata,
+            Column('ID', Integer, ForeignKey('entity.ID'), primary_key=True))
+
+    # users and evaluations
+    Table('inpho_user', metadata,
+        Column('ID', Integer, primary_key=True),
+        Column('username', String(255), unique=True, nullable=False),
+        Column('passwd', String(255)),
+        Column('fullname', Unicode(255)),
+        Column('email', String(255)),
+        Column('group_uid', Integer, ForeignKey('groups.uid')),
+        Column('first_area_concept_id', Integer, ForeignKey('idea.ID')),
+        Column('first_area_level', Integer),
+        Column('second_area_concept_id', Integer, ForeignKey('idea.ID')),
+        Column('second_area_level', Integer))
+    for name in ('groups', 'roles'):
+        Table(name, metadata,
+            Column('uid', Integer, primary_key=True),
+            Column('name', String(255), unique=True, nullable=False))
+    Table('users_roles', metadata,
+        Column('user_uid', Integer, ForeignKey('inpho_user.ID'),
+               primary_key=True),
+        Column('role_uid', Integer, ForeignKey('roles.uid'),
+               primary_key=True))
+    def rank_columns():
+        return [Column(name, Integer, nullable=False, default=-1)
+                    for name in ('relatedness', 'generality', 'hyperrank',
+                                 'hyporank')]
+    Table('idea_evaluation', metadata,
+        Column('ID', Integer, primary_key=True),
+        Column('ante_id', Integer, ForeignKey('idea.ID')),
+        Column('cons_id', Integer, ForeignKey('idea.ID')),
+        Column('uid', Integer, ForeignKey('inpho_user.ID')),
+        *rank_columns())
+    Table('anon_eval', metadata,
+        Column('ip', String(64), primary_key=True),
+        Column('ante_id', Integer, ForeignKey('idea.ID'), primary_key=True),
+        Column('cons_id', Integer, ForeignKey('idea.ID'), primary_key=True),
+        *rank_columns())
+
+    # SEP entries
+    Table('sepentries', metadata,
+        Column('sep_dir', String(255), primary_key=True),
+        Column('title', Unicode(255), unique=True, nullable=False),
+        Column('published', Boolean, nullable=False, default=False),
+        Column('status', String(255), nullable=False, default='Unknown'))
+    Table('fuzzymatches', metadata,
+        Column('sep_dir', String(255), ForeignKey('sepentries.sep_dir'),
+               primary_key=True),
+        Column('entityID', Integer, ForeignKey('entity.ID'),
+               primary_key=True),
+        Column('strength', Numeric),
+        Column('edits', Numeric))
+
+    return metadata
+
+def table(metadata, name, source):
+    """
+    Returns the named table of a cached or declared schema. Raises
+    SchemaError if the schema has no such table.
+    """
+    try:
+        return metadata.tables[name]
+    except KeyError:
+        raise SchemaError("table %s is missing from the %s schema" %
+                          (name, source))
+
+def generic_type(type_):
+    """
+    Returns the generic SQLAlchemy type of a dialect specific type, such as
+    Integer for mysql.TINYINT.
+    """
+    for cls in type_.__class__.__mro__:
+        if cls.__module__ == types.__name__ and cls is not types.TypeEngine\
+                and issubclass(cls, types.TypeEngine)\
+                and not cls.__name__.startswith('_'):
+            return type_.adapt(cls)
+
+    # types without a generic form, such as BIT, YEAR and the BLOBs
+    if isinstance(type_, types._Binary):
+        return types.LargeBinary()
+    return types.Integer()
+
+def portable(metadata):
+    """
+    Replaces the dialect specific types of the columns in metadata by their
+    generic forms, and prefixes index names with their table name, as index
+    names are per table in MySQL but per database elsewhere.
+    """
+    for table in metadata.tables.itervalues():
+        for column in table.c:
+            type_ = column.type
+            # foreign key columns declared without a type take the type of
+            # the column they reference
+            if isinstance(type_, types.NullType) and column.foreign_keys:
+                type_ = iter(column.foreign_keys).next().column.type
+            if type_.__class__.__module__ != types.__name__:
+                type_ = generic_type(type_)
+            column.type = type_
+
+        for index in table.indexes:
+            if not index.name.startswith(table.name + '_'):
+                index.name = '%s_%s' % (table.name, index.name)
+
+    return metadata
+
+def _json_value(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def _parse_value(column, value):
+    """ Parses a fixture value of a date or time column. """
+    if not isinstance(value, basestring):
+        return value
+
+    type_ = column.type
+    if isinstance(type_, types.DateTime):
+        return datetime.strptime(value.replace('T', ' ').split('.')[0],
+                                 '%Y-%m-%d %H:%M:%S')
+    if isinstance(type_, types.Date):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    if isinstance(type_, types.Time):
+        return datetime.strptime(value.split('.')[0], '%H:%M:%S').time()
+    return value
+
+def dump_fixtures(filename, metadata, engine, table_names):
+    """ Writes every row of the named tables to a JSON fixture file. """
+    fixtures = {}
+    for name in table_names:
+        table = metadata.tables[name]
+        rows = engine.execute(table.select())
+        fixtures[name] = [dict((key, _json_value(value))
+                               for key, value in row.items())
+                          for row in rows]
+
+    with open(filename, 'w') as f:
+        json.dump(fixtures, f, indent=1, sort_keys=True)
+
+def load_fixtures(filename, metadata, engine):
+    """
+    Inserts the rows of a JSON fixture file, replacing the rows of the tables
+    it holds. Tables are filled in dependency order.
+    """
+    with open(filename) as f:
+        fixtures = json.load(f)
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    try:
+        tables = [table for table in metadata.sorted_tables
+                      if table.name in fixtures]
+        for table in reversed(tables):
+            connection.execute(table.delete())
+        for table in tables:
+            # rows are inserted in batches of rows with the same columns
+            batches = defaultdict(list)
+            for row in fixtures[table.name]:
+                batches[tuple(sorted(row))].append(
+                    dict((key, _parse_value(table.c[key], value))
+                         for key, value in row.iteritems()))
+            for rows in batches.itervalues():
+                connection.execute(table.insert(), rows)
+        transaction.commit()
+    except:
+        transaction.rollback()
+        raise
+    finally:
+        connection.close()
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+    from inpho.model import metadata, engine
+
+    parser = ArgumentParser(description="load or dump fixtures of the "
+                                        "configured database")
+    parser.add_argument("command", choices=['load', 'dump'])
+    parser.add_argument("filename", help="JSON fixture file")
+    parser.add_argument("tables", nargs='*',
+                        help="tables to dump [default: all]")
+    args = parser.parse_args()
+
+    if args.command == 'load':
+        load_fixtures(args.filename, metadata, engine)
+    else:
+        dump_fixtures(args.filename, metadata, engine,
+                      args.tables or sorted(metadata.tables))
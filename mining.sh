@@ -1,14 +1,6 @@
 #!/bin/sh
-echo "mining corpus"
-python inpho/corpus/sep.py --all --occur
-
-echo "processing Idea-Thinker graph edges"
-python inpho/corpus/sep.py --all --entropy
-
-echo "processing Idea-Idea graph edges"
-python inpho/corpus/sep.py --idea
-
-echo "processing Thinker-Thinker graph edges"
-python inpho/corpus/sep.py --thinker
+echo "mining the Idea-Thinker, Idea-Idea and Thinker-Thinker graphs"
+python inpho/corpus/sep.py --all-graphs --with-occur --ordered --entropy \
+    --binary --save-counts
 
 exit 0
@@ -29,7 +29,9 @@ setup(
         "SQLAlchemy>=0.6.0,<=0.6.99",
         "inflect>=0.2.0,<=0.2.99",
         "BeautifulSoup>=3.2.0,<=3.2.99",
-        "rdflib>=3.2.0,<=3.2.99"
+        "rdflib>=3.2.0,<=3.2.99",
+        "numpy",
+        "scipy"
     ],
 
     long_description = """\
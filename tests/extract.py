@@ -0,0 +1,70 @@
+import os
+import tempfile
+
+import unittest2 as unittest
+from inpho.corpus.extract import extract_body, extract_body_soup
+
+HEAD = '<html><head><title>Entry</title>%s</head><body>'
+META = '<meta http-equiv="Content-Type" content="text/html; charset=%s">'
+
+FIXTURES = {
+    'entities': HEAD % '' +
+        '<div id="aueditable"><h1>Kant &amp; Hume</h1>'
+        '<p>&ldquo;Ideas&rdquo; &eacute;t&eacute; AT&T &lt;b&gt;</p>'
+        '<p><a href="a&amp;b">link</a></p></div></body></html>',
+    'charrefs': HEAD % '' +
+        '<div id="aueditable"><p>caf&#233; &#x41;&#66; &#8220;q&#8221; '
+        '&#99999;</p></div></body></html>',
+    'meta charset': HEAD % META % 'iso-8859-1' +
+        '<div id="aueditable"><p>caf\xe9 \x93quoted\x94</p></div>'
+        '</body></html>',
+    'comments and cdata': HEAD % '<script>if (a < b) { x(); }</script>' +
+        '<div id="aueditable"><!-- a comment --><p>before</p>'
+        '<![CDATA[some <data>]]><p>after</p><?xml version="1.0"?></div>'
+        '</body></html>',
+    'nested bibliography': HEAD % '' +
+        '<div id="aueditable"><div id="main"><h2>1. Text</h2><p>body</p>'
+        '<h2><a name="Bib"><b>Bibliography</b></a></h2>'
+        '<ul class="hanging"><li>Ref, 2001</li></ul>stray text'
+        '<h2>Academic Tools</h2><p>tools</p></div><p>end</p></div>'
+        '</body></html>',
+    'bibliography twice': HEAD % '' +
+        '<div id="aueditable"><h2>1. The Bibliography</h2><p>one</p>'
+        '<h2>Bibliography</h2><ul><li>Ref</li></ul>'
+        '<h2><a name="Bib">Bibliography</a></h2><ul><li>Ref</li></ul>'
+        '<h2>Other Internet Resources</h2></div></body></html>',
+}
+
+
+class ExtractTestFunctions(unittest.TestCase):
+    def setUp(self):
+        self.filenames = {}
+        for name, doc in FIXTURES.iteritems():
+            fd, filename = tempfile.mkstemp(suffix='.html')
+            os.write(fd, doc)
+            os.close(fd)
+            self.filenames[name] = filename
+
+    def tearDown(self):
+        for filename in self.filenames.itervalues():
+            os.remove(filename)
+
+    def test_identical(self):
+        for name, filename in sorted(self.filenames.iteritems()):
+            self.assertEqual(extract_body(filename),
+                             extract_body_soup(filename), name)
+
+    def test_bibliography(self):
+        body = extract_body(self.filenames['nested bibliography'])
+        self.assertIn(u'body', body)
+        self.assertNotIn(u'Ref', body)
+        self.assertNotIn(u'tools', body)
+        self.assertIn(u'stray text', body)
+        self.assertIn(u'end', body)
+
+        # only the last Bibliography header is removed
+        body = extract_body(self.filenames['bibliography twice'])
+        self.assertEqual(body, u'1. The BibliographyoneBibliographyRef')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import random
+from distutils.spawn import find_executable
+
+import unittest2 as unittest
+from inpho.corpus.fuzzymatch import fuzzymatch, fuzzy_match, regularize,\
+    fuzzy_word_match, php_fuzzymatch_many, CandidateIndex
+
+WORDS = ["extended", "embodied", "mind", "the", "and", "of", "philosophy",
+         "doesn't", "kant's", "physical", "chemistry", "physics", "logic",
+         "a", "on", "free", "will", "abelard", "signification", "worlds"]
+
+def mutate(word, rng):
+    """ Returns the word with up to three random edits. """
+    word = list(word)
+    for i in range(rng.randint(0, 3)):
+        if not word:
+            break
+        k = rng.randrange(len(word))
+        edit = rng.choice(['substitute', 'insert', 'delete', 'transpose'])
+        if edit == 'substitute':
+            word[k] = rng.choice('aeiourstn')
+        elif edit == 'insert':
+            word.insert(k, rng.choice('aeiourstn'))
+        elif edit == 'delete':
+            del word[k]
+        elif k + 1 < len(word):
+            word[k], word[k + 1] = word[k + 1], word[k]
+    return ''.join(word)
+
+def random_title(rng):
+    title = [mutate(rng.choice(WORDS), rng)
+                 for i in range(rng.randint(1, 5))]
+    return rng.choice([' ', '  ', ': ', ', ']).join(title).title()
+
+
+class FuzzymatchTestFunctions(unittest.TestCase):
+    def test_examples(self):
+        self.assertEqual(fuzzy_match("The Extended Mind",
+                                     "Extended and Embodied Mind"),
+                         (0.66666666666667, 0.0))
+        self.assertEqual(fuzzy_match("extended", "ex tended"), (0.5, 2.0))
+        self.assertEqual(fuzzy_match("doesn't", "does not"), (1.0, 0.0))
+        self.assertEqual(fuzzy_match("apples", "oranges"), (0.0, 0.0))
+
+    def test_regularize(self):
+        self.assertEqual(regularize("The Philosophy of Mind: an Intro!"),
+                         "Mind Intro")
+        self.assertEqual(regularize("Kant's Ethics"), "Kants Ethics")
+
+    def test_word_match(self):
+        self.assertEqual(fuzzy_word_match("extended", "extended"), 1)
+        self.assertEqual(fuzzy_word_match("extended", "etxnded"), 3)
+        self.assertEqual(fuzzy_word_match("apples", "grapefruit"), 0)
+
+    def test_unicode(self):
+        self.assertEqual(fuzzymatch(u"Caf\xe9 Society", "Caf\xc3\xa9"),
+                         (0.5, 0.0))
+
+    def test_index(self):
+        rng = random.Random(0)
+        labels = dict((ID, random_title(rng)) for ID in range(1, 301))
+        titles = [random_title(rng) for i in range(50)]
+
+        index = CandidateIndex()
+        index.sync(labels.items())
+        for title in titles:
+            expected = []
+            for ID in sorted(labels):
+                confidence, distance = fuzzymatch(title, labels[ID])
+                if confidence >= 0.5:
+                    expected.append((ID, confidence))
+            self.assertEqual(index.match(title), expected, title)
+
+        # incremental updates give the same index as a rebuild
+        for ID in range(1, 301, 7):
+            labels[ID] = random_title(rng)
+        for ID in range(2, 301, 11):
+            del labels[ID]
+        labels[301] = random_title(rng)
+        index.sync(labels.items())
+
+        rebuilt = CandidateIndex()
+        rebuilt.sync(labels.items())
+        self.assertEqual(index.words, rebuilt.words)
+        self.assertEqual(index.postings, rebuilt.postings)
+        self.assertEqual(index.variants, rebuilt.variants)
+
+    @unittest.skipUnless(find_executable('php'), "php is not installed")
+    def test_php_parity(self):
+        rng = random.Random(0)
+        pairs = [(random_title(rng), random_title(rng)) for i in range(500)]
+
+        results = php_fuzzymatch_many(pairs)
+
+        for (s1, s2), expected in zip(pairs, results):
+            self.assertEqual(fuzzymatch(s1, s2), expected,
+                             "%r vs. %r" % (s1, s2))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import os.path
+import random
+import shutil
+import tempfile
+
+import numpy as np
+import unittest2 as unittest
+from inpho.corpus.incremental import MiningCounts, contributions
+from inpho.corpus.terms import Term
+
+TERMS = [Term(ID, 'term %d' % ID, 1, None) for ID in range(1, 21)]
+
+def write_occurrences(filename, n_articles=12, seed=0):
+    """
+    Writes a text occurrence file of random sentences, some without terms,
+    and returns the document terms of its articles.
+    """
+    rng = random.Random(seed)
+    doc_terms = {}
+    with open(filename, 'w') as f:
+        for i in range(n_articles):
+            article = 'entry%02d' % i
+            doc_terms[article] = [TERMS[i % len(TERMS)]]
+            for j in range(rng.randint(1, 10)):
+                ids = [rng.choice(TERMS).ID for k in range(rng.randint(0, 4))]
+                f.write('%s %s\n' % (article, ' '.join(map(str, ids))))
+    return doc_terms
+
+
+class MiningCountsTestFunctions(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.occur_filename = os.path.join(self.root, 'occurrences.txt')
+        doc_terms = write_occurrences(self.occur_filename)
+        self.contributions = contributions(self.occur_filename, TERMS,
+                                           doc_terms)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def assertCountsEqual(self, counts, expected):
+        self.assertEqual(counts.n_baskets, expected.n_baskets)
+        self.assertTrue(np.array_equal(counts.pairs.toarray(),
+                                       expected.pairs.toarray()))
+        self.assertTrue(np.array_equal(counts.occurs.toarray(),
+                                       expected.occurs.toarray()))
+        self.assertTrue(np.allclose(counts.entropies, expected.entropies))
+
+        terms = np.arange(expected.size)
+        edges, expected_edges = counts.edges(terms), expected.edges(terms)
+        self.assertEqual(edges['ante'], expected_edges['ante'])
+        self.assertEqual(edges['cons'], expected_edges['cons'])
+        for field in ('confidence', 'jweight', 'weight', 'occurs_in'):
+            self.assertTrue(np.allclose(edges[field], expected_edges[field]))
+
+    def test_update_article(self):
+        full = MiningCounts.from_contributions(self.contributions)
+        for article in sorted(self.contributions):
+            others = dict(self.contributions)
+            contribution = others.pop(article)
+
+            # adding an article to the counts of the others
+            counts = MiningCounts.from_contributions(others)
+            counts.update_article(article, contribution)
+            self.assertCountsEqual(counts, full)
+
+            # and removing it again
+            counts.update_article(article, None)
+            self.assertCountsEqual(counts,
+                                   MiningCounts.from_contributions(others))
+
+    def test_empty(self):
+        counts = MiningCounts.from_contributions({})
+        self.assertEqual(counts.size, 0)
+        self.assertEqual(counts.edges([])['ante'], [])
+
+        # a single pair of terms has no entropy, hence weight 0
+        contribution = self.contributions['entry00']
+        contribution.baskets = [(1, 2), (1, 2)]
+        counts.update_article('entry00', contribution)
+        edges = counts.edges([1, 2])
+        self.assertEqual(edges['ante'], ['1', '2'])
+        self.assertEqual(edges['weight'].tolist(), [0.0, 0.0])
+
+if __name__ == '__main__':
+    unittest.main()
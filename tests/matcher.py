@@ -0,0 +1,56 @@
+import random
+
+import unittest2 as unittest
+from inpho.corpus.matcher import TermMatcher
+from inpho.corpus.stats import get_sentence_occurrences
+from inpho.corpus.synthetic import make_sentence, make_terms
+from inpho.corpus.terms import Term
+from inpho.corpus.patterns import CompiledPatterns
+
+def make_document(rng, labels, n_sentences=40):
+    """
+    Returns a document of synthetic sentences and their spans, which exclude
+    the space between sentences. Some sentences lack their final period, so
+    that terms end at the last character of their sentence.
+    """
+    document = u''
+    spans = []
+    for i in range(n_sentences):
+        sentence = make_sentence(rng, labels)
+        if rng.random() < 0.3:
+            sentence = sentence[:-1]
+        start = len(document)
+        document += sentence + u' '
+        spans.append((start, start + len(sentence)))
+    return document, spans
+
+
+class MatcherTestFunctions(unittest.TestCase):
+    def setUp(self):
+        self.terms = make_terms(80, seed=1)
+        # a literal without word breaks and a regex of several words
+        for ID, patterns in [(81, ['ism']),
+                             (82, ['\\bfree\\b|\\bgod\\b', '(evil)'])]:
+            self.terms.append(Term(ID, patterns[0], 1,
+                                   CompiledPatterns(patterns, ID=ID)))
+        self.matcher = TermMatcher(self.terms)
+
+    def test_single_pass(self):
+        rng = random.Random(0)
+        labels = [term.label for term in self.terms[:80]] + [u'realism']
+        for i in range(10):
+            document, spans = make_document(rng, labels)
+            # the rescan reports the terms of a sentence in set order
+            expected = [sorted(term.ID for term in sentence)
+                for sentence in get_sentence_occurrences(
+                    document, self.terms, matcher=self.matcher, spans=spans)]
+            self.assertTrue(any(expected))
+
+            single_pass = get_sentence_occurrences(
+                document, self.terms, matcher=self.matcher, single_pass=True,
+                spans=spans)
+            self.assertEqual([sorted(term.ID for term in sentence)
+                                  for sentence in single_pass], expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import os.path
+import shutil
+import tempfile
+
+import unittest2 as unittest
+from inpho.corpus.occurrences import OccurrenceReader, OccurrenceWriter,\
+    convert, is_binary
+from inpho.corpus.stats import occurs_in, prepare_apriori_input
+from inpho.corpus.terms import Term
+
+TERMS = [Term(ID, 'term %d' % ID, 1, None) for ID in range(1, 8)]
+
+# sentences in the format written by OccurrenceReader.export, with a term
+# repeated in a sentence, sentences without terms, a term which is not in
+# TERMS and a non-ASCII sep_dir
+SENTENCES = ['kant 1 2 3\n',
+             'kant 2 2 4\n',
+             'kant \n',
+             'caf\xc3\xa9 \n',
+             'caf\xc3\xa9 \n',
+             'hume 5 9 1\n',
+             'hume 3\n',
+             'hume 1 6 7 3\n',
+             'locke 4 5\n']
+
+DOC_TERMS = {'kant': [TERMS[0]], 'hume': [TERMS[0], TERMS[5]],
+             'locke': [TERMS[6]]}
+
+
+class OccurrencesTestFunctions(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.text_filename = os.path.join(self.root, 'occurrences.txt')
+        with open(self.text_filename, 'w') as f:
+            f.writelines(SENTENCES)
+        self.binary_filename = os.path.join(self.root, 'occurrences.bin')
+        convert(self.text_filename, self.binary_filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_round_trip(self):
+        self.assertFalse(is_binary(self.text_filename))
+        self.assertTrue(is_binary(self.binary_filename))
+
+        reader = OccurrenceReader(self.binary_filename)
+        self.assertEqual(reader.articles, ['kant', 'caf\xc3\xa9', 'hume',
+                                           'locke'])
+        self.assertEqual(len(reader.terms), 16)
+        self.assertEqual(reader.article_offsets.tolist(), [0, 3, 5, 8, 9])
+        ids, offsets = reader.article_terms(2)
+        self.assertEqual(ids.tolist(), [5, 9, 1, 3, 1, 6, 7, 3])
+        self.assertEqual(offsets.tolist(), [0, 3, 4, 8])
+
+        export_filename = os.path.join(self.root, 'export.txt')
+        reader.export(export_filename)
+        with open(export_filename) as f:
+            self.assertEqual(f.readlines(), SENTENCES)
+
+    def test_empty_article(self):
+        # articles without sentences have no lines in the text format
+        with OccurrenceWriter(self.binary_filename) as writer:
+            writer.write_article('kant', [[1, 2], []])
+            writer.write_article('caf\xc3\xa9', [])
+            writer.write_article('hume', [[3]])
+
+        reader = OccurrenceReader(self.binary_filename)
+        self.assertEqual(len(reader), 3)
+        ids, offsets = reader.article_terms(1)
+        self.assertEqual((ids.tolist(), offsets.tolist()), ([], [0]))
+        self.assertEqual([(article, sentence.tolist())
+                              for article, sentence in reader],
+                         [('kant', [1, 2]), ('kant', []), ('hume', [3])])
+
+        export_filename = os.path.join(self.root, 'export.txt')
+        reader.export(export_filename)
+        with open(export_filename) as f:
+            self.assertEqual(f.read(), 'kant 1 2\nkant \nhume 3\n')
+
+    def test_empty_file(self):
+        open(self.text_filename, 'w').close()
+        convert(self.text_filename, self.binary_filename)
+        reader = OccurrenceReader(self.binary_filename)
+        self.assertEqual((reader.articles, list(reader)), ([], []))
+
+    def test_binary_parity(self):
+        for doc_terms in (None, DOC_TERMS):
+            self.assertEqual(
+                prepare_apriori_input(self.binary_filename, TERMS, doc_terms),
+                prepare_apriori_input(self.text_filename, TERMS, doc_terms))
+            self.assertEqual(occurs_in(self.binary_filename, doc_terms),
+                             occurs_in(self.text_filename, doc_terms))
+
+        # term 9 is not kept, and doc terms are added to the sentences with
+        # terms which do not hold them, followed by the summary of each
+        # article, empty for the article without terms
+        lines = prepare_apriori_input(self.binary_filename, TERMS, DOC_TERMS)
+        self.assertEqual(lines[:6], ['1 2 3 \n', '2 2 4 1 \n', '5 1 6 \n',
+                                     '3 1 6 \n', '1 6 7 3 \n', '4 5 7 \n'])
+        self.assertEqual(sorted(sorted(line.split()) for line in lines[6:]),
+                         [[], ['1', '2', '3', '4'], ['1', '3', '5', '6', '7'],
+                          ['4', '5', '7']])
+
+if __name__ == '__main__':
+    unittest.main()
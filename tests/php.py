@@ -0,0 +1,47 @@
+from distutils.spawn import find_executable
+
+import unittest2 as unittest
+from inpho.lib.php import PHP, PHPError, PHPTimeout
+
+
+@unittest.skipUnless(find_executable('php'), "php is not installed")
+class PHPTestFunctions(unittest.TestCase):
+    def setUp(self):
+        self.php = PHP("function square($x) { return $x * $x; }",
+                       workers=2, timeout=1, batch_size=3)
+
+    def tearDown(self):
+        self.php.close()
+
+    def test_one_shot(self):
+        php = PHP("function square($x) { return $x * $x; }")
+        self.assertEqual(php.get_raw("print square(3);"), "9")
+        self.assertEqual(php.get('print json_encode(array(1, 2));'), [1, 2])
+
+    def test_batch(self):
+        codes = ["print square(%d);" % i for i in range(10)]
+        self.assertEqual(self.php.get_raw_many(codes),
+                         [str(i * i) for i in range(10)])
+        self.assertEqual(list(self.php.get_one(
+            'print json_encode(1) . "\\n" . json_encode("a");')), [1, "a"])
+
+    def test_scope(self):
+        codes = ['$response = null; $code = "x"; print 1;',
+                 '$line = false; $request = null; print 2;',
+                 '$error = "error"; print 3;']
+        self.assertEqual(self.php.get_raw_many(codes), ["1", "2", "3"])
+
+    def test_errors(self):
+        self.assertRaises(PHPError, self.php.get_raw,
+                          "throw new Exception('error');")
+        self.assertRaises(PHPError, self.php.get_raw,
+                          "throw new Exception(\"\\xe9t\\xe9\");")
+        self.assertRaises(PHPError, self.php.get_raw, "exit(1);")
+        self.assertRaises(PHPTimeout, self.php.get_raw, "sleep(5);")
+
+        # the workers are restarted
+        self.assertEqual(self.php.get_raw_many(["print square(2);"] * 4),
+                         ["4"] * 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import cPickle as pickle
+from datetime import datetime
+import os
+import os.path
+import shutil
+import tempfile
+
+import unittest2 as unittest
+from sqlalchemy import create_engine, types
+from sqlalchemy.dialects import mysql
+from sqlalchemy.schema import Column, ForeignKey, Index, MetaData, Table
+from inpho.schema import declared_metadata, load_metadata, save_metadata,\
+    portable, dump_fixtures, load_fixtures
+
+def mysql_metadata():
+    """ Returns a small schema as reflected from MySQL. """
+    metadata = MetaData()
+    entity = Table('entity', metadata,
+        Column('ID', mysql.INTEGER(display_width=11), primary_key=True),
+        Column('label', mysql.VARCHAR(255, charset='utf8')),
+        Column('flag', mysql.TINYINT(display_width=1)),
+        Column('created', mysql.DATETIME()))
+    Index('label', entity.c.label)
+    Table('searchpatterns', metadata,
+        Column('searchpattern', mysql.VARCHAR(255), primary_key=True),
+        Column('target_id', ForeignKey('entity.ID'), primary_key=True))
+    return metadata
+
+ROWS = {'entity': [{'ID': 1, 'label': u'kant', 'flag': 1,
+                    'created': datetime(2012, 4, 17, 12, 30)},
+                   {'ID': 2, 'label': u'caf\xe9', 'flag': 0,
+                    'created': None}],
+        'searchpatterns': [{'searchpattern': u'kantian', 'target_id': 1}]}
+
+
+class SchemaTestFunctions(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_portable(self):
+        metadata = portable(mysql_metadata())
+        entity = metadata.tables['entity']
+        self.assertIsInstance(entity.c.label.type, types.VARCHAR)
+        self.assertIsInstance(entity.c.flag.type, types.Integer)
+        self.assertIsInstance(
+            metadata.tables['searchpatterns'].c.target_id.type, types.Integer)
+        self.assertEqual([index.name for index in entity.indexes],
+                         ['entity_label'])
+
+        engine = create_engine('sqlite://')
+        metadata.create_all(engine)
+        self.assertEqual(sorted(engine.table_names()),
+                         ['entity', 'searchpatterns'])
+
+    def test_fixtures(self):
+        # a schema cached from MySQL declares the tables of a SQLite file
+        cache_filename = os.path.join(self.root, 'schema.pickle')
+        with open(cache_filename, 'wb') as f:
+            pickle.dump(('mysql', mysql_metadata().tables), f)
+
+        engine = create_engine('sqlite:///%s' %
+                               os.path.join(self.root, 'a.db'))
+        metadata, dialect_name = load_metadata(cache_filename, engine)
+        self.assertEqual(dialect_name, 'mysql')
+        metadata.create_all(engine)
+        for name in ['entity', 'searchpatterns']:
+            engine.execute(metadata.tables[name].insert(), ROWS[name])
+
+        fixture_filename = os.path.join(self.root, 'fixtures.json')
+        dump_fixtures(fixture_filename, metadata, engine,
+                      ['entity', 'searchpatterns'])
+
+        copy = create_engine('sqlite:///%s' % os.path.join(self.root, 'b.db'))
+        metadata.create_all(copy)
+        # loading twice replaces the rows
+        load_fixtures(fixture_filename, metadata, copy)
+        load_fixtures(fixture_filename, metadata, copy)
+
+        for name in ['entity', 'searchpatterns']:
+            table = metadata.tables[name]
+            query = table.select().order_by(*table.primary_key.columns)
+            self.assertEqual(map(dict, copy.execute(query)),
+                             map(dict, engine.execute(query)))
+
+    def test_declared(self):
+        # the declared schema creates a local database, and can be cached
+        cache_filename = os.path.join(self.root, 'schema.pickle')
+        engine = create_engine('sqlite:///%s' %
+                               os.path.join(self.root, 'a.db'))
+        save_metadata(cache_filename, declared_metadata(), engine)
+        metadata, dialect_name = load_metadata(cache_filename, engine)
+        self.assertEqual(dialect_name, 'sqlite')
+        metadata.create_all(engine)
+        self.assertEqual(sorted(engine.table_names()),
+                         sorted(metadata.tables))
+
+        engine.execute(metadata.tables['entity'].insert(),
+                       {'ID': 1, 'label': u'kant', 'typeID': 3})
+        engine.execute(metadata.tables['thinker'].insert(), {'ID': 1})
+        engine.execute(metadata.tables['thinker_graph_edges'].insert(),
+                       {'ante_id': 1, 'cons_id': 1, 'jweight': 0.5})
+        edge = engine.execute(
+            metadata.tables['thinker_graph_edges'].select()).fetchone()
+        self.assertEqual((edge.ante_id, edge.jweight, edge.weight),
+                         (1, 0.5, None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+from collections import defaultdict
+from ConfigParser import Error as ConfigError
+from math import log
+import os
+import os.path
+import shutil
+import tempfile
+
+import numpy as np
+import unittest2 as unittest
+from inpho import config
+from inpho.corpus.stats import apriori, mine_pairs, edge_weights,\
+    process_edges, occurs_in
+from inpho.corpus.terms import Term
+
+# baskets of an apriori input file, the empty one not being counted
+BASKETS = ["1 2 3", "1 2", "2 3", "1 2", "", "3"]
+
+def apriori_bin():
+    try:
+        return config.get('corpus', 'apriori_bin')
+    except ConfigError:
+        return None
+
+def read_rules(filename):
+    with open(filename) as f:
+        return [(int(ante), int(cons), float(confidence), float(jweight))
+                    for ante, cons, confidence, jweight in
+                        (line.split() for line in f)]
+
+def jmeasure(union, supp_a, supp_b, n=5.0):
+    """ J-measure of the rule A -> B, as computed by apriori. """
+    confidence = float(union) / supp_a
+    p_a, p_b = supp_a / n, supp_b / n
+    j = confidence * log(confidence / p_b)
+    if confidence < 1:
+        j += (1 - confidence) * log((1 - confidence) / (1 - p_b))
+    return p_a * j
+
+def reference_process_edges(graph_filename, edges_filename, occur_filename,
+                            doc_terms=None):
+    """ The nested dictionary implementation of process_edges. """
+    graph = defaultdict(lambda: defaultdict(int))
+    with open(graph_filename) as f:
+        for line in f:
+            ids = line.split()
+            for ante in ids:
+                for cons in ids:
+                    graph[ante][cons] += 1
+
+    occurrences = defaultdict(lambda: defaultdict(int))
+    with open(occur_filename) as f:
+        for line in f:
+            lterms = line.split()
+            article = lterms[0]
+            if doc_terms:
+                for term in lterms[1:]:
+                    for doc in doc_terms[article]:
+                        occurrences[str(doc.ID)][term] += 1
+            else:
+                for term in lterms[1:]:
+                    occurrences[article][term] += 1
+
+    edges = {}
+    with open(edges_filename) as f:
+        for line in f:
+            ante, cons, confidence, jweight = line.split()
+            edges[(ante, cons)] = {'confidence': float(confidence),
+                                   'jweight': float(jweight),
+                                   'occurs_in': occurrences[ante][cons],
+                                   'graph': graph[ante][cons]}
+    return edges
+
+
+class MinePairsTestFunctions(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.graph_filename = os.path.join(self.root, 'graph.txt')
+        with open(self.graph_filename, 'w') as f:
+            f.write('\n'.join(BASKETS) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_rules(self):
+        edges_filename = os.path.join(self.root, 'edges.txt')
+        mine_pairs(self.graph_filename, edges_filename)
+        rules = read_rules(edges_filename)
+
+        # supports are 3, 4 and 3 of 5 baskets, and 1 and 3 occur together
+        # only once, so their rules are dropped. Terms are ordered by support
+        # then ID: 1, 3, 2.
+        expected = [(1, 2, 1.0, jmeasure(3, 3, 4)),
+                    (2, 1, 0.75, jmeasure(3, 4, 3)),
+                    (3, 2, 2 / 3.0, jmeasure(2, 3, 4)),
+                    (2, 3, 0.5, jmeasure(2, 4, 3))]
+        self.assertEqual([rule[:2] for rule in rules],
+                         [rule[:2] for rule in expected])
+        for rule, expected_rule in zip(rules, expected):
+            self.assertAlmostEqual(rule[2], expected_rule[2], places=5)
+            self.assertAlmostEqual(rule[3], expected_rule[3], places=5)
+
+    @unittest.skipUnless(apriori_bin() and os.path.exists(apriori_bin()),
+                         "apriori is not installed")
+    def test_apriori_parity(self):
+        edges_filename = os.path.join(self.root, 'edges.txt')
+        apriori_filename = os.path.join(self.root, 'apriori.txt')
+        mine_pairs(self.graph_filename, edges_filename)
+        apriori(self.graph_filename, apriori_filename)
+
+        with open(edges_filename) as f, open(apriori_filename) as g:
+            self.assertEqual(f.read(), g.read())
+
+class ProcessEdgesTestFunctions(unittest.TestCase):
+    # term 2 is repeated in a basket and a sentence, and term 4 is in no
+    # basket
+    GRAPH = ["1 2 3", "1 2 2", "2 3", "3"]
+    EDGES = ["1 2 0.5 0.25", "2 1 0.4 0.2", "2 3 0.3 0.1", "1 3 0.2 0.1",
+             "3 1 0.1 0.05", "1 4 0.1 0.01"]
+    OCCURRENCES = ["kant 1 2", "kant 2 2 3", "hume 3 1", "locke 4"]
+    DOC_TERMS = {'kant': [Term(1, 'term 1', 1, None)],
+                 'hume': [Term(3, 'term 3', 1, None),
+                          Term(1, 'term 1', 1, None)],
+                 'locke': []}
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.filenames = []
+        for name in ('graph', 'edges', 'occurrences'):
+            filename = os.path.join(self.root, name + '.txt')
+            with open(filename, 'w') as f:
+                f.write('\n'.join(getattr(self, name.upper())) + '\n')
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def values(self, edges, field):
+        return dict((key, properties[field])
+                    for key, properties in edges.iteritems())
+
+    def test_graph(self):
+        # pairs of terms in a basket count once per occurrence of each term
+        edges = process_edges(*self.filenames)
+        self.assertEqual(self.values(edges, 'graph'),
+                         {('1', '2'): 3, ('2', '1'): 3, ('2', '3'): 2,
+                          ('1', '3'): 1, ('3', '1'): 1, ('1', '4'): 0})
+        self.assertEqual(edges[('1', '2')]['confidence'], 0.5)
+        self.assertEqual(edges[('1', '2')]['jweight'], 0.25)
+
+    def test_occurs_in(self):
+        self.assertEqual(occurs_in(self.filenames[2]),
+                         {'kant': {'1': 1, '2': 3, '3': 1},
+                          'hume': {'1': 1, '3': 1},
+                          'locke': {'4': 1}})
+        self.assertEqual(occurs_in(self.filenames[2], self.DOC_TERMS),
+                         {'1': {'1': 2, '2': 3, '3': 2},
+                          '3': {'1': 1, '3': 1}})
+
+        # without doc terms, the rows are articles rather than terms
+        edges = process_edges(*self.filenames)
+        self.assertEqual(set(self.values(edges, 'occurs_in').values()),
+                         set([0]))
+
+        edges = process_edges(*self.filenames, doc_terms=self.DOC_TERMS)
+        self.assertEqual(self.values(edges, 'occurs_in'),
+                         {('1', '2'): 3, ('2', '1'): 0, ('2', '3'): 0,
+                          ('1', '3'): 2, ('3', '1'): 1, ('1', '4'): 0})
+
+    def test_reference(self):
+        for doc_terms in (None, self.DOC_TERMS):
+            self.assertEqual(
+                process_edges(*self.filenames, doc_terms=doc_terms),
+                reference_process_edges(*self.filenames, doc_terms=doc_terms))
+
+class EdgeWeightsTestFunctions(unittest.TestCase):
+    def test_weights(self):
+        # term 3 has no entropy
+        nodes, entropies = np.array([1, 2]), np.array([2.0, 0.5])
+        weights = edge_weights([1, 2, 3], [2, 3, 1], [0.4, 0.2, 0.1],
+                               nodes, entropies)
+        self.assertTrue(np.allclose(weights, [0.4 * 0.75, 0.2 * 0.25,
+                                              0.1 * -1.0]))
+
+    def test_zero_entropy(self):
+        weights = edge_weights([1, 2], [2, 1], [0.4, 0.2], np.array([1, 2]),
+                               np.zeros(2))
+        self.assertEqual(weights.tolist(), [0.0, 0.0])
+        weights = edge_weights([], [], [], np.array([]), np.array([]))
+        self.assertEqual(weights.tolist(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,230 @@
+#!/usr/bin/python2
+"""
+Benchmark of the InPhO data mining path on synthetic SEP corpora of several
+sizes, see :mod:`inpho.corpus.synthetic`.
+
+Each step of the mining is timed at every corpus size, and the results are
+appended as JSON lines, tagged with the git commit, to the output file. The
+printed table gives the seconds of each step per size, and its scaling
+exponent, the slope of log(seconds) over log(articles) between the smallest
+and largest sizes. Passing the output file of another commit to --compare
+prints the ratio of the times of both commits.
+
+The number of edges and the edge density, the fraction of the ordered pairs
+of terms which are edges, are recorded with the timings, as the times of the
+later steps depend on them rather than on the number of articles alone.
+
+The body extraction is timed with inpho.corpus.extract.extract_body, which
+inpho.corpus.sep.extract_article_body delegates to, as the sep module needs
+the database.
+"""
+import json
+import logging
+from math import log
+import os
+import os.path
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from inpho.corpus import metrics
+from inpho.corpus.extract import extract_body
+from inpho.corpus.matcher import TermMatcher
+from inpho.corpus.sentences import sentence_spans, train_tokenizer
+from inpho.corpus.stats import get_document_occurrences,\
+    get_sentence_occurrences, prepare_apriori_input, mine_pairs,\
+    process_edges, calculate_node_entropy, calculate_edge_weight
+from inpho.corpus.synthetic import SyntheticCorpus, make_terms
+
+STEPS = ['extract_article_body', 'sentence_spans', 'get_document_occurrences',
+         'get_sentence_occurrences', 'prepare_apriori_input', 'mine_pairs',
+         'process_edges', 'entropy']
+
+def git_commit():
+    """ Returns the abbreviated commit of the working tree, or None. """
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_size(corpus, tokenizer, timings):
+    """
+    Runs the mining steps on a corpus, adding the seconds of each step to
+    the timings dictionary. Returns the number of edges.
+    """
+    def timed(step, func, *args, **kwargs):
+        start = time.time()
+        result = func(*args, **kwargs)
+        timings[step] = time.time() - start
+        return result
+
+    terms = corpus.terms
+    doc_terms = corpus.doc_terms()
+    root = corpus.root
+
+    documents = timed('extract_article_body', lambda:
+        [extract_body(path) for path in corpus.paths()])
+    spans = timed('sentence_spans', lambda:
+        [sentence_spans(document, tokenizer) for document in documents])
+
+    matcher = TermMatcher(terms)
+    present = timed('get_document_occurrences', lambda:
+        [set(get_document_occurrences(document, terms, matcher))
+             for document in documents])
+
+    occur_filename = os.path.join(root, 'occurrences.txt')
+    def sentence_occurrences():
+        with open(occur_filename, 'w') as f:
+            for sep_dir, document, terms_present, document_spans in\
+                    zip(corpus.sep_dirs, documents, present, spans):
+                for sentence in get_sentence_occurrences(
+                        document, terms, terms_present=terms_present,
+                        remove_duplicates=True, matcher=matcher,
+                        spans=document_spans):
+                    f.write('%s %s\n' % (sep_dir, ' '.join(
+                        str(term.ID) for term in sentence)))
+    timed('get_sentence_occurrences', sentence_occurrences)
+
+    graph_filename = os.path.join(root, 'graph.txt')
+    lines = timed('prepare_apriori_input', prepare_apriori_input,
+                  occur_filename, terms, doc_terms)
+    with open(graph_filename, 'w') as f:
+        f.writelines(lines)
+
+    edges_filename = os.path.join(root, 'edges.txt')
+    timed('mine_pairs', mine_pairs, graph_filename, edges_filename)
+    edges = timed('process_edges', process_edges, graph_filename,
+                  edges_filename, occur_filename, doc_terms)
+
+    def entropy():
+        ents = calculate_node_entropy(edges)
+        calculate_edge_weight(edges, ents)
+    timed('entropy', entropy)
+
+    return len(edges)
+
+def benchmark(sizes, n_terms=500, repeat=1, seed=0):
+    """
+    Benchmarks the mining steps at each corpus size, recording the best of
+    repeat runs of each step with :func:`inpho.corpus.metrics.record()`.
+    Returns the records.
+    """
+    commit = git_commit()
+    terms = make_terms(n_terms, seed)
+    results = []
+
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix='inpho-benchmark-')
+        try:
+            corpus = SyntheticCorpus(root, size, terms, seed).generate()
+            documents = [extract_body(path) for path in corpus.paths()[:50]]
+            tokenizer = train_tokenizer(documents,
+                                        os.path.join(root, 'punkt.pickle'))
+
+            best = {}
+            for i in range(repeat):
+                timings = {}
+                n_edges = run_size(corpus, tokenizer, timings)
+                for step, seconds in timings.iteritems():
+                    best[step] = min(seconds, best.get(step, seconds))
+        finally:
+            shutil.rmtree(root)
+
+        density = n_edges / float(n_terms * (n_terms - 1))
+        for step in STEPS:
+            metrics.record('benchmark', commit=commit, step=step,
+                           articles=size, terms=n_terms, edges=n_edges,
+                           density=density, seconds=best[step])
+            results.append(dict(commit=commit, step=step, articles=size,
+                                seconds=best[step]))
+        print "%d articles: %d edges (density %.3f), %.2f s" %\
+            (size, n_edges, density, sum(best.values()))
+
+    return results
+
+def load_results(filename):
+    """ Returns the benchmark records of a JSON-lines metrics file. """
+    results = []
+    with open(filename) as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get('event') == 'benchmark':
+                results.append(record)
+    return results
+
+def scaling(results):
+    """
+    Returns a dictionary of the seconds of each (step, articles) pair, the
+    last record winning, and the sorted list of sizes.
+    """
+    seconds = {}
+    for record in results:
+        seconds[(record['step'], record['articles'])] = record['seconds']
+    sizes = sorted(set(articles for step, articles in seconds))
+    return seconds, sizes
+
+def print_table(results, baseline=None, out=sys.stdout):
+    """
+    Prints the seconds of each step per size and its scaling exponent, and
+    the ratio to the baseline results if given.
+    """
+    seconds, sizes = scaling(results)
+    if baseline:
+        base_seconds, base_sizes = scaling(baseline)
+
+    out.write("%-26s" % 'step' + ''.join("%10d" % size for size in sizes) +
+              "%8s\n" % 'slope')
+    for step in STEPS:
+        row = [seconds.get((step, size)) for size in sizes]
+        out.write("%-26s" % step + ''.join(
+            "%10.3f" % s if s is not None else "%10s" % '-' for s in row))
+
+        first, last = row[0], row[-1]
+        if len(sizes) > 1 and first and last:
+            out.write("%8.2f" % (log(last / first) /
+                                 log(float(sizes[-1]) / sizes[0])))
+        out.write("\n")
+
+        if baseline:
+            ratios = []
+            for size, s in zip(sizes, row):
+                base = base_seconds.get((step, size))
+                ratios.append("%9.2fx" % (s / base) if s and base
+                              else "%10s" % '-')
+            out.write("%-26s" % '  vs baseline' + ''.join(ratios) + "\n")
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="benchmark the data mining steps "
+                                        "on synthetic corpora")
+    parser.add_argument("-s", "--sizes", default="50,100,200,400",
+                        help="comma-separated numbers of articles "
+                             "[default: %(default)s]")
+    parser.add_argument("-n", "--terms", type=int, default=500,
+                        help="number of terms [default: %(default)s]")
+    parser.add_argument("-r", "--repeat", type=int, default=1,
+                        help="runs per size, keeping the best time of "
+                             "each step [default: %(default)s]")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the synthetic corpus")
+    parser.add_argument("-o", "--output", default="benchmark.jsonl",
+                        help="JSON-lines file the results are appended to "
+                             "[default: %(default)s]")
+    parser.add_argument("--compare",
+                        help="JSON-lines results of another commit")
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    metrics.configure(args.output)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = benchmark(sizes, args.terms, args.repeat, args.seed)
+
+    baseline = load_results(args.compare) if args.compare else None
+    print
+    print_table(results, baseline)